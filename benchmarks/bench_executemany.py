@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+CursorWrapper.executemany with row by row execution versus parameter
+arrays (fast_executemany) on a fake driver with per-round-trip latency.
+
+    python benchmarks/bench_executemany.py [--rows 20000] [--latency 0.0002]
+
+Importing django_pyodbc.base needs pyodbc to be installed.
+"""
+import datetime
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from django_pyodbc.base import CursorWrapper
+from fakedriver import FakeCursor
+
+
+def run(rows, options, fast):
+    cursor = CursorWrapper(FakeCursor(latency=options.latency), 'utf-8')
+    cursor.fast_executemany = fast
+    cursor.executemany_batch_rows = options.batch
+    start = time.time()
+    cursor.executemany(u'INSERT INTO "BENCH" ("ID", "NAME", "CREATED") VALUES (%s, %s, %s)', iter(rows))
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=20000)
+    parser.add_option('--batch', type='int', default=5000)
+    parser.add_option('--latency', type='float', default=0.0002)
+    options, args = parser.parse_args()
+
+    now = datetime.datetime(2016, 5, 4, 12, 0, 0)
+    rows = [(i, u'name %d' % i, now) for i in range(options.rows)]
+
+    row_by_row = run(rows, options, False)
+    arrays = run(rows, options, True)
+    print('row by row:        %9.0f rows/s' % (options.rows / row_by_row))
+    print('parameter arrays:  %9.0f rows/s' % (options.rows / arrays))
+    print('speedup:           %9.2fx' % (row_by_row / arrays))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Microbenchmark of CursorWrapper.format_sql: translation of a few hundred
+statement shapes executed over and over, with and without the cache.
+
+    python benchmarks/bench_format_sql.py [--shapes 300] [--calls 200000]
+
+Importing django_pyodbc.base needs pyodbc to be installed.
+"""
+import optparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from django_pyodbc.base import CursorWrapper
+
+
+def make_statements(shapes):
+    statements = []
+    for i in range(shapes):
+        n_params = i % 8 + 1
+        where = ' AND '.join('"COL_%d" = %%s' % j for j in range(n_params))
+        statements.append((u'SELECT "ID", "NAME", "CREATED" FROM "TABLE_%d" WHERE %s' % (i, where), n_params))
+    return statements
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--shapes', type='int', default=300)
+    parser.add_option('--calls', type='int', default=200000)
+    options, args = parser.parse_args()
+
+    statements = make_statements(options.shapes)
+    workload = [statements[i % len(statements)] for i in range(options.calls)]
+    cursor = CursorWrapper(None, 'utf-8')
+
+    def cached():
+        for sql, n_params in workload:
+            cursor.format_sql(sql, n_params)
+
+    def uncached():
+        for sql, n_params in workload:
+            cursor._format_sql(sql, n_params)
+
+    cached()    # warm the cache
+    t_uncached = min(timeit.repeat(uncached, number=1, repeat=3))
+    t_cached = min(timeit.repeat(cached, number=1, repeat=3))
+
+    per_call = lambda t: t / options.calls * 1e6
+    print('uncached: %.3f us/execute' % per_call(t_uncached))
+    print('cached:   %.3f us/execute' % per_call(t_cached))
+    print('saving:   %.3f us/execute (%.1fx)' % (per_call(t_uncached - t_cached), t_uncached / t_cached))
+    print('cache:    %r' % CursorWrapper.format_sql_cache.info())
+
+
+if __name__ == '__main__':
+    main()
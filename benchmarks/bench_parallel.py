@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Wall time of a dashboard of independent aggregate queries run one after
+another on a single connection, and with connection.run_parallel().
+
+    python benchmarks/bench_parallel.py [--queries 20] [--workers 8] [--latency 0.05]
+
+Every query is one round trip of `latency` seconds to the fake driver.
+Importing django_pyodbc.base needs pyodbc to be installed.
+"""
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure(DATABASES={
+        'default': {
+            'ENGINE': 'django_pyodbc',
+            'NAME': 'bench',
+            'USER': 'bench',
+            'PASSWORD': 'bench',
+            'OPTIONS': {'driver': 'EXASolution Driver', 'extra_params': 'EXAHOST=localhost:8563'},
+        },
+    })
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django.db import connection, connections
+from django_pyodbc import base
+from fakedriver import FakeConnection
+
+DESCRIPTION = [('TOTAL', int, None, 10, 10, 0, False)]
+
+
+def query(i):
+    def run():
+        cursor = connections['default'].cursor()
+        cursor.execute('SELECT SUM("AMOUNT") FROM "ORDERS" WHERE "REGION" = %s', [i])
+        return cursor.fetchall()
+    return run
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--queries', type='int', default=20)
+    parser.add_option('--workers', type='int', default=8)
+    parser.add_option('--latency', type='float', default=0.05)
+    options, args = parser.parse_args()
+
+    # one round trip for execute, one for fetchall
+    latency = options.latency / 2
+    base.Database.connect = lambda *args, **kwargs: FakeConnection([(42,)], DESCRIPTION, latency,
+                                                                   autocommit=kwargs.get('autocommit', False))
+    queries = [query(i) for i in range(options.queries)]
+
+    start = time.time()
+    serial = [run() for run in queries]
+    serial_time = time.time() - start
+
+    start = time.time()
+    parallel = connection.run_parallel(queries, max_workers=options.workers)
+    parallel_time = time.time() - start
+    assert parallel == serial
+
+    print('serial:     %8.3f s' % serial_time)
+    print('parallel:   %8.3f s' % parallel_time)
+    print('slowest:    %8.3f s' % options.latency)
+    print('speedup:    %8.2fx' % (serial_time / parallel_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Throughput of iterating over a large result set on a high-latency driver,
+with and without the read-ahead thread of CursorWrapper.
+
+    python benchmarks/bench_prefetch.py [--rows 200000] [--batch 1000] [--latency 0.005]
+
+Importing django_pyodbc.base needs pyodbc to be installed.
+"""
+import datetime
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure(USE_TZ=True)
+
+from django_pyodbc.base import CursorWrapper
+from fakedriver import FakeCursor
+
+
+def run(rows, description, options, prefetch):
+    cursor = CursorWrapper(FakeCursor(rows, description, options.latency), 'utf-8')
+    cursor.fetch_batch_size = options.batch
+    cursor.prefetch = prefetch
+    cursor.execute('SELECT * FROM "BENCH"')
+    start = time.time()
+    count = 0
+    for row in cursor:
+        count += 1
+    cursor.close()
+    assert count == len(rows)
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=200000)
+    parser.add_option('--batch', type='int', default=1000)
+    parser.add_option('--latency', type='float', default=0.005)
+    options, args = parser.parse_args()
+
+    now = datetime.datetime(2016, 5, 4, 12, 0, 0)
+    description = [('ID', int, None, 10, 10, 0, False),
+                   ('NAME', str, None, 50, 50, 0, True),
+                   ('CREATED', datetime.datetime, None, 26, 26, 0, True)]
+    rows = [(i, 'name %d' % i, now) for i in range(options.rows)]
+
+    plain = run(rows, description, options, False)
+    prefetched = run(rows, description, options, True)
+    print('plain:      %9.0f rows/s' % (options.rows / plain))
+    print('prefetch:   %9.0f rows/s' % (options.rows / prefetched))
+    print('speedup:    %9.2fx' % (plain / prefetched))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Time the backend against a trace captured with the 'capture' option, with no
+database: the statements of the log are run through CursorWrapper on a
+ReplayConnection and their rows fetched.
+
+    python benchmarks/bench_replay.py CAPTURE_LOG [--speed 0] [--paced] [--repeat 3]
+
+With --speed 0 the recorded execution times are not waited for, so that only
+the time spent in the backend is measured. Results are written as JSON.
+Importing django_pyodbc.base needs pyodbc to be installed.
+"""
+import json
+import optparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure(USE_TZ=True)
+
+from django_pyodbc.replay import replay
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog CAPTURE_LOG [options]')
+    parser.add_option('--speed', type='float', default=0.0,
+                      help='replay speed relative to the recorded times, 0 to not wait')
+    parser.add_option('--paced', action='store_true', default=False,
+                      help='start the statements at their recorded times')
+    parser.add_option('--repeat', type='int', default=3)
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('the path of a capture log is required')
+
+    runs = [replay(args[0], options.speed, options.paced) for i in range(options.repeat)]
+    best = min(runs, key=lambda stats: stats['seconds'])
+    best['per_second'] = best['statements'] / best['seconds'] if best['seconds'] else None
+    print(json.dumps(best, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
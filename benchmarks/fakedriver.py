@@ -0,0 +1,129 @@
+"""
+In-process stand-ins for pyodbc connections and cursors, and synthetic
+workloads, used by the benchmarks.
+"""
+import datetime
+import time
+
+
+class FakeCursor(object):
+    """
+    Serves `rows` described by `description`. Every round trip to the
+    "server" sleeps for `latency` seconds, which releases the GIL the way
+    pyodbc does while it waits on the network.
+    """
+    fast_executemany = False
+
+    def __init__(self, rows=(), description=None, latency=0.0):
+        self.rows = list(rows)
+        self.description = description
+        self.latency = latency
+        self.position = 0
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def execute(self, sql, params=()):
+        self._round_trip()
+        self.position = 0
+        return self
+
+    def executemany(self, sql, params_list):
+        if self.fast_executemany:
+            # parameter arrays: the whole batch in a single round trip
+            self._round_trip()
+        else:
+            for params in params_list:
+                self._round_trip()
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        if rows:
+            return rows[0]
+        return None
+
+    def fetchmany(self, size=1):
+        self._round_trip()
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        self._round_trip()
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    """
+    Hands out FakeCursors serving the same `rows` with `latency` seconds
+    per round trip. Opening the connection takes `connect_latency`.
+    """
+    def __init__(self, rows=(), description=None, latency=0.0, connect_latency=0.0, autocommit=False):
+        if connect_latency:
+            time.sleep(connect_latency)
+        self.autocommit = autocommit
+        self.rows = rows
+        self.description = description
+        self.latency = latency
+
+    def cursor(self):
+        return FakeCursor(self.rows, self.description, self.latency)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Synthetic row shapes: (Python type reported in cursor.description, value
+# of column `c` in row `i`). Text columns hold native str like pyodbc does
+# without unicode_results: UTF-8 bytes on Python 2.
+def _int_value(i, c, width):
+    return i * 31 + c
+
+
+def _text_value(i, c, width):
+    value = (u'\xe9t\xe9 %d-%d ' % (i, c) * width)[:width]
+    if str is bytes:
+        return value.encode('utf-8')
+    return value
+
+
+def _datetime_value(i, c, width):
+    return datetime.datetime(2016, 1, 1) + datetime.timedelta(seconds=i * 61 + c)
+
+
+SHAPES = {
+    'narrow_int': (int, _int_value),
+    'wide_unicode': (str, _text_value),
+    'datetime_heavy': (datetime.datetime, _datetime_value),
+}
+
+
+def make_workload(shape, rows, columns, width=64):
+    """
+    Return (rows, description, params) for `rows` rows of `columns` columns
+    of the given shape; `params` is one row of query parameters of the same
+    types, as the ORM would pass them.
+    """
+    type_code, value = SHAPES[shape]
+    description = [('COL_%d' % c, type_code, None, width, width, 0, True) for c in range(columns)]
+    data = [tuple(value(i, c, width) for c in range(columns)) for i in range(rows)]
+    params = list(data[0]) if data else []
+    if type_code is str:
+        # the ORM hands text to the backend as unicode
+        params = [p.decode('utf-8') if isinstance(p, bytes) else p for p in params]
+    return data, description, params
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Throughput of the CursorWrapper hot paths (execute, executemany and
+fetching) on the fake driver, for narrow integer rows, wide unicode rows and
+datetime-heavy rows. Results are written as JSON, so that runs before and
+after a change can be compared.
+
+    python benchmarks/suite.py [--rows 20000] [--columns 8] [--width 64]
+                               [--latency 0] [--repeat 3] [--output results.json]
+                               [--shape narrow_int] [--path fetch]
+
+Each measurement is the best of --repeat runs. Importing django_pyodbc.base
+needs pyodbc to be installed.
+"""
+import json
+import optparse
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure(USE_TZ=True)
+
+import django
+from django_pyodbc.base import CursorWrapper
+from fakedriver import SHAPES, FakeCursor, make_workload
+
+PATHS = ('execute', 'executemany', 'fetch')
+
+
+def bench_execute(workload, options):
+    rows, description, params = workload
+    sql = u'SELECT %s FROM "BENCH" WHERE %s' % (
+        ', '.join('"COL_%d"' % c for c in range(options.columns)),
+        ' AND '.join('"COL_%d" = %%s' % c for c in range(options.columns)))
+    cursor = CursorWrapper(FakeCursor(latency=options.latency), 'utf-8')
+    calls = options.rows
+    start = time.time()
+    for i in range(calls):
+        cursor.execute(sql, params)
+    return time.time() - start, calls
+
+
+def bench_executemany(workload, options):
+    rows, description, params = workload
+    sql = u'INSERT INTO "BENCH" (%s) VALUES (%s)' % (
+        ', '.join('"COL_%d"' % c for c in range(options.columns)),
+        ', '.join(['%s'] * options.columns))
+    params_list = [params] * options.rows
+    cursor = CursorWrapper(FakeCursor(latency=options.latency), 'utf-8')
+    cursor.fast_executemany = True
+    start = time.time()
+    cursor.executemany(sql, params_list)
+    return time.time() - start, len(params_list)
+
+
+def bench_fetch(workload, options):
+    rows, description, params = workload
+    cursor = CursorWrapper(FakeCursor(rows, description, options.latency), 'utf-8')
+    cursor.execute('SELECT * FROM "BENCH"')
+    count = 0
+    start = time.time()
+    for row in cursor:
+        count += 1
+    elapsed = time.time() - start
+    assert count == len(rows)
+    return elapsed, count
+
+
+BENCHMARKS = {
+    'execute': bench_execute,
+    'executemany': bench_executemany,
+    'fetch': bench_fetch,
+}
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=20000,
+                      help='rows fetched or inserted, and number of execute() calls')
+    parser.add_option('--columns', type='int', default=8)
+    parser.add_option('--width', type='int', default=64, help='characters of the text columns')
+    parser.add_option('--latency', type='float', default=0.0, help='seconds per round trip')
+    parser.add_option('--repeat', type='int', default=3)
+    parser.add_option('--shape', action='append', choices=sorted(SHAPES),
+                      help='workload to run, can be repeated (default: all)')
+    parser.add_option('--path', action='append', choices=PATHS,
+                      help='code path to run, can be repeated (default: all)')
+    parser.add_option('--output', help='file to write the JSON results to (default: stdout)')
+    options, args = parser.parse_args()
+
+    results = []
+    for shape in options.shape or sorted(SHAPES):
+        workload = make_workload(shape, options.rows, options.columns, options.width)
+        for path in options.path or PATHS:
+            timings = [BENCHMARKS[path](workload, options) for i in range(options.repeat)]
+            elapsed, operations = min(timings)
+            results.append({
+                'shape': shape,
+                'path': path,
+                'operations': operations,
+                'seconds': elapsed,
+                'per_second': operations / elapsed if elapsed else None,
+            })
+
+    report = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'parameters': {
+            'rows': options.rows,
+            'columns': options.columns,
+            'width': options.width,
+            'latency': options.latency,
+            'repeat': options.repeat,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
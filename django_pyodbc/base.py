@@ -1,9 +1,15 @@
 """
 MS SQL Server database backend for Django.
 """
+import codecs
 import datetime
+import functools
+import logging
 import re
 import sys
+import time
+import weakref
+from collections import OrderedDict
 
 from django.core.exceptions import ImproperlyConfigured
 
@@ -56,12 +62,138 @@ from django_pyodbc.client import DatabaseClient
 from django_pyodbc.compat import binary_type, text_type, timezone
 from django_pyodbc.creation import DatabaseCreation
 from django_pyodbc.introspection import DatabaseIntrospection
+from django_pyodbc.fingerprint import fingerprint, get_trackers
+from django_pyodbc.lru import LRUCache
+from django_pyodbc.metrics import ConnectionMetrics, statement_kind
+from django_pyodbc.pool import get_pool
+from django_pyodbc.prefetch import Prefetcher
+from django_pyodbc.querycache import get_query_cache
+from django_pyodbc.statements import StatementCache
+from django_pyodbc import tracing
+from django_pyodbc.tracing import end_span, get_tracer, start_span
 
 DatabaseError = Database.Error
 IntegrityError = Database.IntegrityError
 
+# ODBC connection strings by database alias and settings, built on first connect
+connection_strings = {}
+
+# Conversions applied to query parameters before they are handed to pyodbc,
+# keyed by the exact type of the parameter. Subclasses of a registered type
+# use the converter of their closest registered base class.
+param_converters = {
+    text_type: lambda value: value.encode('utf-8'),
+    bool: int,
+}
+_param_converter_maps = {}
+
+def register_param_converter(type_, converter):
+    """
+    Register `converter` for query parameters of type `type_`, e.g.
+    register_param_converter(uuid.UUID, str). A converter of None makes the
+    type pass through unchanged.
+    """
+    param_converters[type_] = converter
+    # the maps are held by the open cursors, so they are reset in place
+    for converters in list(_param_converter_maps.values()):
+        converters.reset()
+
+class ParamConverterMap(dict):
+    """
+    Converters by parameter type for one client encoding. Types that are not
+    registered are resolved through their MRO on first use and remembered,
+    mapping to None when the value needs no conversion.
+    """
+    def __init__(self, encoding):
+        super(ParamConverterMap, self).__init__()
+        self.encoding = encoding
+        self.reset()
+
+    def reset(self):
+        encoding = self.encoding
+        registry = dict(param_converters)
+        if binary_type not in registry:
+            try:
+                is_utf8 = codecs.lookup(encoding).name == 'utf-8'
+            except LookupError:
+                is_utf8 = False
+            if not is_utf8:
+                registry[binary_type] = lambda value: value.decode(encoding).encode('utf-8')
+        self.registry = registry
+        self.clear()
+        self.update(registry)
+
+    def __missing__(self, type_):
+        converter = None
+        for klass in getattr(type_, '__mro__', ()):
+            if klass in self.registry:
+                converter = self.registry[klass]
+                break
+        self[type_] = converter
+        return converter
+
+def params_size(params):
+    """
+    Rough number of bytes sent to the server for a row of parameters.
+    """
+    size = 0
+    for p in params:
+        if p is None:
+            continue
+        if isinstance(p, (binary_type, text_type, bytearray)):
+            size += len(p)
+        else:
+            size += 8
+    return size
+
+logger = logging.getLogger('django_pyodbc')
+
+# whether the warning that fast_executemany can't be used was logged
+_fast_executemany_warned = False
+
+
+def warn_fast_executemany(reason):
+    """
+    Log once per process that OPTIONS['fast_executemany'] is set but rows
+    are bound one by one, because of `reason`.
+    """
+    global _fast_executemany_warned
+    if not _fast_executemany_warned:
+        _fast_executemany_warned = True
+        logger.warning("OPTIONS['fast_executemany'] is set but %s: executemany() binds the rows "
+                       "one by one.", reason)
+
+
+# aliases of the databases whose OPTIONS['autocommit'] was warned about
+_autocommit_warned = set()
+
+
+def warn_autocommit(alias, autocommit):
+    """
+    Log once per database that OPTIONS['autocommit'] is overridden by the
+    AUTOCOMMIT setting, which connect() sets on every checkout.
+    """
+    if alias not in _autocommit_warned:
+        _autocommit_warned.add(alias)
+        logger.warning("OPTIONS['autocommit'] of database '%s' only sets the mode connections are "
+                       "opened in: Django sets them to the AUTOCOMMIT setting (%s) when they are "
+                       "checked out.", alias, autocommit)
+
+
+# SQLSTATEs of drivers rejecting array parameter binding
+ARRAY_BINDING_REJECTED = ('HYC00', 'HY092', 'HY024', 'IM001')
+
+def get_param_converters(encoding):
+    converters = _param_converter_maps.get(encoding)
+    if converters is None:
+        converters = _param_converter_maps[encoding] = ParamConverterMap(encoding)
+    return converters
+
 class DatabaseFeatures(BaseDatabaseFeatures):
-    can_use_chunked_reads = False
+    # QuerySet.iterator() streams the result set while other statements may
+    # run on the same connection, which SQL Server only allows with MARS;
+    # OPTIONS['chunked_reads'] = False buffers whole result sets instead
+    can_use_chunked_reads = True
     can_return_id_from_insert = True
     supports_microsecond_precision = False
     supports_regex_backreferencing = False
@@ -71,7 +203,7 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     allow_sliced_subqueries = False
     supports_paramstyle_pyformat = False
 
-    #has_bulk_insert = False
+    has_bulk_insert = True
     # DateTimeField doesn't support timezones, only DateTimeOffsetField
     supports_timezones = False
     supports_sequence_reset = False
@@ -91,6 +223,36 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     datefirst = 7
     Database = Database
     limit_table_list = False
+    pool = None
+    pool_options = None
+    fetch_batch_size = 1000
+    prefetch = False
+    prefetch_depth = 2
+    fast_executemany = False
+    executemany_batch_rows = 10000
+    executemany_batch_bytes = 16 * 1024 * 1024
+    format_sql_cache_max_length = 8192
+    # rows of one VALUES list, which SQL Server limits to 1000
+    bulk_max_rows = 1000
+    bulk_max_params = 2000
+    bulk_max_statement_length = 1000000
+    # how bulk_create() of PyodbcQuerySet gets the new primary keys: None,
+    # 'output' or 'identity', see DatabaseOperations.bulk_insert_returning_ids
+    bulk_return_ids = None
+    # times bulk_create() starts over after a transaction collision
+    bulk_collision_retries = 3
+    ping_query = 'SELECT 1'
+    statement_cache_size = 0
+    statement_cache = None
+    metrics = None
+    slow_query_threshold = None
+    slow_query_profile = False
+    tracer = None
+    capture = None
+    replay = None
+    query_cache = None
+    # read from the connection since Django 1.8
+    data_types = DatabaseCreation.data_types
 
     # Collations:       http://msdn2.microsoft.com/en-us/library/ms184391.aspx
     #                   http://msdn2.microsoft.com/en-us/library/ms179886.aspx
@@ -128,6 +290,9 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
     def __init__(self, *args, **kwargs):
         super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        # cursors whose result set is read ahead in a helper thread, which
+        # has to let go of the connection before anything else uses it
+        self.prefetching = weakref.WeakSet()
 
         options = self.settings_dict.get('OPTIONS', None)
 
@@ -137,6 +302,43 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             self.encoding = options.get('encoding', 'utf-8')
             self.driver_needs_utf8 = options.get('driver_needs_utf8', None)
             self.limit_table_list = options.get('limit_table_list', False)
+            self.fetch_batch_size = options.get('fetch_batch_size', self.fetch_batch_size)
+            self.prefetch = options.get('prefetch', False)
+            self.prefetch_depth = options.get('prefetch_depth', self.prefetch_depth)
+            self.fast_executemany = options.get('fast_executemany', False)
+            if self.fast_executemany and pyodbc_ver < (4, 0, 19):
+                warn_fast_executemany("pyodbc %s has no Cursor.fast_executemany, install "
+                                      "django-pyodbc[fast] (pyodbc 4.0.19 or later)" % Database.version)
+                self.fast_executemany = False
+            if ('autocommit' in options and 'AUTOCOMMIT' in self.settings_dict and
+                    bool(options['autocommit']) != bool(self.settings_dict['AUTOCOMMIT'])):
+                warn_autocommit(self.alias, self.settings_dict['AUTOCOMMIT'])
+            self.executemany_batch_rows = options.get('executemany_batch_rows', self.executemany_batch_rows)
+            self.executemany_batch_bytes = options.get('executemany_batch_bytes', self.executemany_batch_bytes)
+            self.bulk_max_rows = options.get('bulk_max_rows', self.bulk_max_rows)
+            self.bulk_max_params = options.get('bulk_max_params', self.bulk_max_params)
+            self.bulk_max_statement_length = options.get('bulk_max_statement_length', self.bulk_max_statement_length)
+            self.bulk_return_ids = options.get('bulk_return_ids', None)
+            self.bulk_collision_retries = options.get('bulk_collision_retries', self.bulk_collision_retries)
+            self.ping_query = options.get('ping_query', self.ping_query)
+            self.statement_cache_size = options.get('statement_cache_size', 0)
+            if 'format_sql_cache_size' in options:
+                # the cache is shared by the cursors of every database
+                CursorWrapper.format_sql_cache.maxsize = options['format_sql_cache_size']
+            self.format_sql_cache_max_length = options.get('format_sql_cache_max_length',
+                                                           self.format_sql_cache_max_length)
+            if options.get('metrics'):
+                self.metrics = ConnectionMetrics(self.alias)
+            if options.get('query_cache_size'):
+                self.query_cache = get_query_cache(self.alias, options['query_cache_size'], self.metrics)
+            self.slow_query_threshold = options.get('slow_query_threshold', None)
+            self.slow_query_profile = options.get('slow_query_profile', False)
+            self.tracer = get_tracer(options.get('tracer'))
+            if options.get('capture'):
+                from django_pyodbc.replay import get_capture_log
+                self.capture = get_capture_log(options['capture'])
+            self.replay = options.get('replay')
+            self.pool_options = options.get('pool')
 
             # make lookup operators to be collation-sensitive if needed
             self.collation = options.get('collation', None)
@@ -155,6 +357,10 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             self.features = DatabaseFeatures(self)
         else:
             self.features = DatabaseFeatures()
+        if options and not options.get('chunked_reads', True):
+            # buffer whole result sets, e.g. for drivers that allow a single
+            # active statement per connection
+            self.features.can_use_chunked_reads = False
         self.ops = DatabaseOperations(self)
         self.client = DatabaseClient(self)
         self.creation = DatabaseCreation(self)
@@ -187,22 +393,94 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         return conn_params
 
     def get_new_connection(self, conn_params=None):
-        # assert False, "JAMI: I think this method is never used" # bad assumption
-        assert conn_params is None, "JAMI: We don't use conn_params that come from outside... should we?"
-        connstr = self._get_connection_string()
-        options = self.settings_dict['OPTIONS']
-        autocommit = options.get('autocommit', False)
-        if self.unicode_results:
-            connection = Database.connect(connstr, autocommit=autocommit, unicode_results='True')
-        else:
-            connection = Database.connect(connstr, autocommit=autocommit)
+        # conn_params from get_connection_params() are not used: the ODBC
+        # connection string is built once per alias from the settings.
+        span = None
+        tracer = self.tracer or tracing.tracer
+        if tracer is not None:
+            span = start_span(tracer, 'db.connect', {'db.alias': self.alias,
+                                                     'db.pooled': self.pool_options is not None})
+        try:
+            if self.pool_options is not None:
+                # looked up on every connect, as the test runner changes
+                # NAME; closing a pooled connection hands it back to the pool
+                self.pool = get_pool(self._connection_key(), self._get_connect(), self.pool_options)
+                connection = self.pool.acquire()
+            else:
+                connection = self._connect()
+        except Exception:
+            if span is not None:
+                end_span(span, sys.exc_info()[1])
+            raise
+        if span is not None:
+            end_span(span)
         return connection
 
+    def _connection_key(self):
+        # the test runner changes NAME, so the key includes the settings used
+        settings_dict = self.settings_dict
+        options = settings_dict['OPTIONS']
+        return (self.alias, settings_dict['NAME'], settings_dict['USER'], settings_dict['PASSWORD'],
+                settings_dict['HOST'], settings_dict['PORT'],
+                options.get('dsn'), options.get('driver'), options.get('extra_params'),
+                options.get('autocommit', False), self.unicode_results, bool(self.replay))
+
+    def _get_connect(self):
+        """
+        Return a callable opening a connection with the current settings,
+        which keeps doing so after the settings change.
+        """
+        if self.replay:
+            return functools.partial(self._connect_replay, self.replay)
+        key = self._connection_key()
+        connstr = connection_strings.get(key)
+        if connstr is None:
+            connstr = connection_strings[key] = self._get_connection_string()
+        autocommit = self.settings_dict['OPTIONS'].get('autocommit', False)
+        if self.unicode_results:
+            return functools.partial(Database.connect, connstr, autocommit=autocommit, unicode_results='True')
+        return functools.partial(Database.connect, connstr, autocommit=autocommit)
+
+    def _connect(self):
+        return self._get_connect()()
+
+    def _connect_replay(self, replay):
+        # a stand-in answering the statements of a capture log, see replay
+        from django_pyodbc.replay import ReplayConnection
+        if not isinstance(replay, dict):
+            replay = {'path': replay}
+        return ReplayConnection(replay['path'], replay.get('speed', 1.0))
+
     def init_connection_state(self):
+        # nothing is set per session; autocommit is set by _set_autocommit()
         pass
 
+    def is_usable(self):
+        """
+        Checks that the connection still works with a round trip that does
+        not touch any table. Called by Django to decide whether a persistent
+        connection (CONN_MAX_AGE) can be kept after an error.
+        """
+        try:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except (Database.Error, utils.InterfaceError):
+            # utils.InterfaceError: a pooled connection already given back
+            return False
+        return True
+
     def _set_autocommit(self, autocommit):
-        pass
+        # called by connect() with settings AUTOCOMMIT on every checkout,
+        # so that a pooled connection gets it back whatever mode it was
+        # given back in; OPTIONS['autocommit'] is only the mode pyodbc
+        # opens the connection in
+        with self.wrap_database_errors:
+            if self.connection.autocommit != autocommit:
+                self.connection.autocommit = autocommit
 
     def _get_connection_string(self):
         settings_dict = self.settings_dict
@@ -228,7 +506,7 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             raise ImproperlyConfigured('You need to specify NAME in your Django settings file.')
 
         # parse extra params connection string into a dict of keys and values
-        extra_params = {k:v for k,v in [param.split('=') for param in options.get('extra_params','').split(';')]}
+        extra_params = OrderedDict(param.split('=', 1) for param in options.get('extra_params', '').split(';') if param)
 
         if 'dsn' in options:
             cstr_parts.append('DSN=%s' % options['dsn'])
@@ -264,12 +542,82 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
     def _cursor(self):
         if self.connection is None:
-            self.connection = self.get_new_connection()
-            # JAMI: shouldn't we send the signal from within get_new_connection() ?
-            connection_created.send(sender=self.__class__, connection=self)
+            if hasattr(self, 'ensure_connection'):
+                # Django >= 1.6: connect() also resets the transaction state
+                # and the CONN_MAX_AGE deadline of persistent connections
+                self.ensure_connection()
+            else:
+                self.connection = self.get_new_connection()
+                connection_created.send(sender=self.__class__, connection=self)
+        if self.statement_cache is not None and self.statement_cache.connection is not self.connection:
+            # the cursors belong to a connection closed without _close()
+            # (close() of Django < 1.8 doesn't call it) or otherwise replaced
+            self.statement_cache.close()
+            self.statement_cache = None
+        if self.statement_cache is None and self.statement_cache_size:
+            self.statement_cache = StatementCache(self.statement_cache_size, self.connection)
 
-        cursor = self.connection.cursor()
-        return CursorWrapper(cursor, self.encoding)
+        cursor = CursorWrapper(self.connection.cursor(), self.encoding, self)
+        # lets another thread cancel the statement in progress, see parallel
+        self.last_cursor = weakref.ref(cursor)
+        return cursor
+
+    def detach_prefetchers(self, cursor=None):
+        """
+        Stop the helper threads reading result sets ahead on the connection,
+        except the one of `cursor`: pyodbc connections can't be used by two
+        threads at once. The rows already read are kept, the rest is read
+        by the cursors themselves.
+        """
+        for other in list(self.prefetching):
+            if other is not cursor:
+                self.prefetching.discard(other)
+                if other.prefetcher is not None:
+                    other.prefetcher.detach()
+
+    def _commit(self):
+        if self.prefetching:
+            self.detach_prefetchers()
+        return super(DatabaseWrapper, self)._commit()
+
+    def _rollback(self):
+        if self.prefetching:
+            self.detach_prefetchers()
+        return super(DatabaseWrapper, self)._rollback()
+
+    def _close(self):
+        if self.prefetching:
+            self.detach_prefetchers()
+        if self.statement_cache is not None:
+            self.statement_cache.close()
+            self.statement_cache = None
+        return super(DatabaseWrapper, self)._close()
+
+    def run_parallel(self, queries, max_workers=None, timeout=None):
+        """
+        Evaluates the QuerySets (or calls the callables) in `queries` at the
+        same time on separate connections and returns their results in
+        order; see django_pyodbc.parallel. max_workers defaults to
+        OPTIONS['parallel_workers'] (4), and is limited by the threads of
+        DJANGO_PYODBC_PARALLEL_THREADS (8) shared by every database.
+        """
+        from django_pyodbc.parallel import run_parallel
+        if max_workers is None:
+            options = self.settings_dict.get('OPTIONS') or {}
+            max_workers = options.get('parallel_workers', 4)
+        return run_parallel(queries, max_workers, timeout)
+
+    def run_async(self, queries, max_workers=None, timeout=None):
+        """
+        Starts the queries like run_parallel() and returns at once with a
+        handle whose result() waits for the results; see
+        django_pyodbc.parallel.
+        """
+        from django_pyodbc.parallel import run_async
+        if max_workers is None:
+            options = self.settings_dict.get('OPTIONS') or {}
+            max_workers = options.get('parallel_workers', 4)
+        return run_async(queries, max_workers, timeout)
 
     def _execute_foreach(self, sql, table_names=None):
         cursor = self.cursor()
@@ -298,27 +646,135 @@ class CursorWrapper(object):
     A wrapper around the pyodbc's cursor that takes in account a) some pyodbc
     DB-API 2.0 implementation and b) some common ODBC driver particularities.
     """
-    def __init__(self, cursor, encoding=""):
+    # translated SQL shared by all cursors, keyed on (sql, n_params), of
+    # the statements with parameters up to this many characters: the others
+    # (EXPORT and IMPORT statements, SQL with inlined literals) rarely repeat
+    format_sql_cache = LRUCache(1024)
+    format_sql_cache_max_length = 8192
+    # rows fetched per round trip when iterating over the cursor
+    fetch_batch_size = 1000
+    # read large result sets ahead in a helper thread
+    prefetch = False
+    prefetch_depth = 2
+    # executemany() with parameter arrays, in batches of rows / bytes
+    fast_executemany = False
+    executemany_batch_rows = 10000
+    executemany_batch_bytes = 16 * 1024 * 1024
+    # log statements slower than this many seconds, see slowlog
+    slow_query_threshold = None
+    slow_query_profile = False
+
+    def __init__(self, cursor, encoding="", db=None):
         self.cursor = cursor
+        self.db = db
+        if db is not None:
+            self.fetch_batch_size = db.fetch_batch_size
+            self.prefetch = db.prefetch
+            self.prefetch_depth = db.prefetch_depth
+            self.fast_executemany = db.fast_executemany
+            self.executemany_batch_rows = db.executemany_batch_rows
+            self.executemany_batch_bytes = db.executemany_batch_bytes
+            self.format_sql_cache_max_length = db.format_sql_cache_max_length
+            self.slow_query_threshold = db.slow_query_threshold
+            self.slow_query_profile = db.slow_query_profile
+        self.prefetcher = None
+        # rows of the result set fetched without the prefetcher, which
+        # starts once they reach fetch_batch_size
+        self.unprefetched_rows = 0
+        # prepared statements of the connection, and the SQL prepared on
+        # self.cursor when it belongs to them
+        self.statements = db.statement_cache if db is not None else None
+        self.statement_sql = None
+        # metrics recorder of the connection, and the kind of the statement
+        # whose rows are being fetched
+        self.metrics = db.metrics if db is not None else None
+        self.last_kind = 'other'
+        self.tracer = db.tracer if db is not None else None
+        if self.tracer is None:
+            self.tracer = tracing.tracer
+        # span of the result set being fetched, None once it is exhausted
+        self.fetch_span = None
+        self.fetch_exhausted = False
+        # capture log of the connection, and the entry of the result set
+        # being fetched, written once it is exhausted
+        self.capture = db.capture if db is not None else None
+        self.capture_entry = None
+        # slow SELECT logged once its rows are counted, see slowlog
+        self.slow_query = None
+        # fetches are counted for the metrics, tracing, the capture log or
+        # the slow query log, and statements are timed for them
+        self.observed = (self.metrics is not None or self.tracer is not None or
+                         self.capture is not None or self.slow_query_threshold is not None)
+        self.measured = self.observed
         self.last_sql = ''
         self.last_params = ()
         self.encoding = encoding
+        self.param_converters = get_param_converters(encoding)
+        # (index, converter) pairs for the columns of the current result set
+        self.row_converters = None
 
     def close(self):
+        self.stop_prefetch()
+        self.end_result_set()
+        if self.statement_sql is not None:
+            # keep the prepared statement for the next execution of the SQL
+            self.statements.checkin(self.statement_sql, self.cursor)
+            self.statement_sql = None
+            return
         try:
             self.cursor.close()
         except Database.ProgrammingError:
             pass
 
+    def use_prepared(self, sql):
+        """
+        Switch to the cached cursor on which `sql` is already prepared, if
+        there is one, and keep the current cursor for its own statement.
+        """
+        statements = self.statements
+        if sql == self.statement_sql:
+            # pyodbc skips the prepare when a cursor repeats its statement
+            statements.prepares_avoided += 1
+            return
+        cursor = statements.checkout(sql)
+        if cursor is not None:
+            statements.prepares_avoided += 1
+        else:
+            statements.prepares += 1
+            if self.statement_sql is None:
+                # the cursor is not a cached one: prepare the SQL on it
+                self.statement_sql = sql
+                return
+            cursor = self.db.connection.cursor()
+        if self.statement_sql is not None:
+            statements.checkin(self.statement_sql, self.cursor)
+        else:
+            self.cursor.close()
+        self.cursor = cursor
+        self.statement_sql = sql
+
     def format_sql(self, sql, n_params=None):
+        # The same statement shapes are executed over and over again, so the
+        # translated SQL is cached on (sql, n_params).
+        if n_params == 0 or len(sql) > self.format_sql_cache_max_length:
+            return self._format_sql(sql, n_params)
+        key = (sql, n_params)
+        formatted = self.format_sql_cache.get(key)
+        if formatted is None:
+            formatted = self._format_sql(sql, n_params)
+            self.format_sql_cache.set(key, formatted)
+        return formatted
+
+    def _format_sql(self, sql, n_params=None):
         if isinstance(sql, text_type):
             sql = sql.encode('utf-8')
         # pyodbc uses '?' instead of '%s' as parameter placeholder.
         if n_params is not None:
             try:
                 sql = sql % tuple('?' * n_params)
-            except:
-                #Todo checkout whats happening here
+            except (TypeError, ValueError, KeyError):
+                # The SQL contains a literal '%' that is not a placeholder
+                # (e.g. "LIKE 'a%'" in a raw query): send it unchanged.
                 pass
         else:
             if '%s' in sql:
@@ -326,19 +782,20 @@ class CursorWrapper(object):
         return sql
 
     def format_params(self, params):
+        converters = self.param_converters
+        for p in params:
+            if converters[type(p)] is not None:
+                break
+        else:
+            # nothing to convert: hand the parameters to pyodbc as they are
+            return params
         fp = []
         for p in params:
-            if isinstance(p, text_type):        # unicode
-                fp.append(p.encode('utf-8'))
-            elif isinstance(p, binary_type):    # str
-                fp.append(p.decode(self.encoding).encode('utf-8'))
-            elif isinstance(p, type(True)):
-                if p:
-                    fp.append(1)
-                else:
-                    fp.append(0)
-            else:
+            convert = converters[type(p)]
+            if convert is None:
                 fp.append(p)
+            else:
+                fp.append(convert(p))
         return tuple(fp)
 
     def execute(self, sql, params=()):
@@ -355,10 +812,26 @@ class CursorWrapper(object):
         # print "sql=", compiled_sql
 
         self.last_sql = sql
+        self.stop_prefetch()
+        if self.db is not None and self.db.prefetching:
+            self.db.detach_prefetchers()
+        self.end_result_set()
+        self.fetch_exhausted = False
+        self.row_converters = None
+        if self.measured:
+            self.last_kind = statement_kind(sql)
         sql = self.format_sql(sql, len(params))
+        if self.statements is not None:
+            if params:
+                self.use_prepared(sql)
+            else:
+                # executed directly: nothing stays prepared on the cursor
+                self.statement_sql = None
         params = self.format_params(params)
         self.last_params = params
         try:
+            if self.measured or get_trackers():
+                return self.measure(self.cursor.execute, sql, params, params_size(params))
             return self.cursor.execute(sql, params)
         except IntegrityError:
             e = sys.exc_info()[1]
@@ -368,17 +841,38 @@ class CursorWrapper(object):
             raise utils.DatabaseError(*e.args)
 
     def executemany(self, sql, params_list):
+        self.last_sql = sql
+        self.stop_prefetch()
+        if self.db is not None and self.db.prefetching:
+            self.db.detach_prefetchers()
+        self.end_result_set()
+        self.fetch_exhausted = False
+        self.row_converters = None
+        self.statement_sql = None
+        if self.measured:
+            self.last_kind = statement_kind(sql)
         sql = self.format_sql(sql)
-        # pyodbc's cursor.executemany() doesn't support an empty param_list
-        if not params_list:
-            if '?' in sql:
-                return
-        else:
-            raw_pll = params_list
-            params_list = [self.format_params(p) for p in raw_pll]
-
         try:
-            return self.cursor.executemany(sql, params_list)
+            # pyodbc's cursor.executemany() doesn't support an empty param_list
+            if not params_list:
+                if '?' in sql:
+                    return
+                return self.cursor.executemany(sql, params_list)
+            result = None
+            trackers = get_trackers()
+            start = time.time()
+            for batch in self.executemany_batches(params_list):
+                if self.measured:
+                    result = self.measure(self._executemany, sql, batch,
+                                          sum(params_size(params) for params in batch), 1)
+                else:
+                    result = self._executemany(sql, batch)
+            if trackers:
+                # the batches of one call count as one query
+                duration = time.time() - start
+                for tracker in trackers:
+                    tracker.record(self.last_sql, duration)
+            return result
         except IntegrityError:
             e = sys.exc_info()[1]
             raise utils.IntegrityError(*e.args)
@@ -386,32 +880,254 @@ class CursorWrapper(object):
             e = sys.exc_info()[1]
             raise utils.DatabaseError(*e.args)
 
-    def format_results(self, rows):
+    def measure(self, method, sql, params, param_bytes, batches=0):
+        """
+        Call method(sql, params) and record its time, or its error, in the
+        metrics of the connection, the slow query log and the query trackers
+        of the thread.
+        """
+        kind = self.last_kind
+        span = None
+        if self.tracer is not None:
+            attributes = {'db.alias': self.db and self.db.alias, 'db.statement.fingerprint': fingerprint(self.last_sql)}
+            if batches:
+                attributes['db.rows'] = len(params)
+            else:
+                attributes['db.params'] = len(params)
+            span = start_span(self.tracer, batches and 'db.executemany' or 'db.execute', attributes)
+        start = time.time()
+        try:
+            result = method(sql, params)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.failed(kind, sys.exc_info()[1])
+            if span is not None:
+                end_span(span, sys.exc_info()[1])
+            if self.capture is not None:
+                self.capture.write(self.capture.entry(self, start, time.time() - start, params, batches,
+                                                      sys.exc_info()[1]))
+            raise
+        duration = time.time() - start
+        if self.capture is not None:
+            entry = self.capture.entry(self, start, duration, params, batches)
+            if batches or not getattr(self.cursor, 'description', None):
+                self.capture.write(entry)
+            else:
+                # written with its row count at the end of the result set
+                self.capture_entry = entry
+        if span is not None:
+            end_span(span, **{'db.rowcount': getattr(self.cursor, 'rowcount', None)})
+        if self.metrics is not None:
+            self.metrics.executed(kind, duration, param_bytes, batches)
+        if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+            from django_pyodbc.slowlog import SlowQuery, log_slow_query
+            if batches:
+                log_slow_query(SlowQuery(self, sql, '<%d parameter rows>' % len(params), duration))
+            elif getattr(self.cursor, 'description', None):
+                # logged with its row count at the end of the result set
+                self.slow_query = SlowQuery(self, sql, params, duration, self.slow_query_profile)
+            else:
+                log_slow_query(SlowQuery(self, sql, params, duration, self.slow_query_profile))
+        if not batches:
+            # executemany() records the whole call
+            for tracker in get_trackers() or ():
+                tracker.record(self.last_sql, duration)
+        return result
+
+    def executemany_batches(self, params_list):
+        """
+        Format the rows of params_list and group them in batches of at most
+        executemany_batch_rows rows or about executemany_batch_bytes bytes
+        of parameters, so that params_list can be an iterator.
+        """
+        max_rows = self.executemany_batch_rows
+        max_bytes = self.executemany_batch_bytes
+        batch, size = [], 0
+        for params in params_list:
+            params = self.format_params(params)
+            batch.append(params)
+            if max_bytes:
+                size += params_size(params)
+            if len(batch) >= max_rows or (max_bytes and size >= max_bytes):
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    def _executemany(self, sql, params_list):
+        if self.fast_executemany:
+            try:
+                # bind the whole batch as parameter arrays in one round trip
+                self.cursor.fast_executemany = True
+                return self.cursor.executemany(sql, params_list)
+            except (AttributeError, DatabaseError):
+                e = sys.exc_info()[1]
+                if isinstance(e, DatabaseError) and (e.args or (None,))[0] not in ARRAY_BINDING_REJECTED:
+                    raise
+                # pyodbc < 4.0.19 or a driver without array binding: fall
+                # back to row by row execution for this connection
+                if isinstance(e, AttributeError):
+                    warn_fast_executemany("pyodbc %s has no Cursor.fast_executemany" % Database.version)
+                else:
+                    warn_fast_executemany("the driver rejected array binding (%s)" % e.args[0])
+                self.fast_executemany = False
+                if self.db is not None:
+                    self.db.fast_executemany = False
+                try:
+                    self.cursor.fast_executemany = False
+                except AttributeError:
+                    pass
+        return self.cursor.executemany(sql, params_list)
+
+    def get_row_converters(self, description):
+        """
+        Return (index, converter) pairs for the columns of a result set that
+        need decoding or a timezone. The decision is taken once from the
+        column types in cursor.description; the other columns are skipped.
+        """
+        encoding = self.encoding
+        needs_utc = _DJANGO_VERSION >= 14 and settings.USE_TZ
+
+        def decode(value):
+            if isinstance(value, binary_type):
+                return value.decode(encoding)
+            return value
+
+        def make_aware(value):
+            if value is not None:
+                return value.replace(tzinfo=timezone.utc)
+            return value
+
+        converters = []
+        for i, column in enumerate(description or ()):
+            type_code = column[1]
+            if type_code is binary_type:
+                converters.append((i, decode))
+            elif needs_utc and type_code is datetime.datetime:
+                converters.append((i, make_aware))
+        return converters
+
+    def format_results(self, row):
         """
         Decode data coming from the database if needed and convert rows to tuples
         (pyodbc Rows are not sliceable).
         """
-        needs_utc = _DJANGO_VERSION >= 14 and settings.USE_TZ
-        fr = []
-        for row in rows:
-            if isinstance(row, binary_type):
-                row = row.decode(self.encoding)
-            elif needs_utc and isinstance(row, datetime.datetime):
-                row = row.replace(tzinfo=timezone.utc)
-            fr.append(row)
-        return tuple(fr)
+        converters = self.row_converters
+        if converters is None:
+            converters = self.row_converters = self.get_row_converters(self.cursor.description)
+        if not converters:
+            return tuple(row)
+        row = list(row)
+        for i, convert in converters:
+            row[i] = convert(row[i])
+        return tuple(row)
 
     def fetchone(self):
-        row = self.cursor.fetchone()
+        row = (self.prefetcher or self.cursor).fetchone()
+        if self.observed:
+            self.fetched(int(row is not None), 1)
         if row is not None:
             return self.format_results(row)
         return []
 
-    def fetchmany(self, chunk):
-        return [self.format_results(row) for row in self.cursor.fetchmany(chunk)]
+    def fetchmany(self, chunk=None):
+        return [self.format_results(row) for row in self.fetchmany_raw(chunk)]
+
+    def fetchmany_raw(self, chunk=None):
+        """
+        Fetch the next rows as pyodbc returns them, without format_results.
+        """
+        if chunk is None:
+            chunk = self.fetch_batch_size
+        if self.prefetcher is not None:
+            rows = self.prefetcher.fetchmany(chunk)
+            if self.observed:
+                self.fetched(len(rows), chunk)
+            return rows
+        rows = self.cursor.fetchmany(chunk)
+        if self.observed:
+            self.fetched(len(rows), chunk)
+        if self.prefetch:
+            self.unprefetched_rows += len(rows)
+            if len(rows) == chunk and self.unprefetched_rows >= self.fetch_batch_size:
+                # a large result set: fetch the rest ahead in a helper thread
+                self.prefetcher = Prefetcher(self.cursor, self.fetch_batch_size, self.prefetch_depth)
+                if self.db is not None:
+                    self.db.prefetching.add(self)
+        return rows
 
     def fetchall(self):
-        return [self.format_results(row) for row in self.cursor.fetchall()]
+        rows = (self.prefetcher or self.cursor).fetchall()
+        if self.observed:
+            self.fetched(len(rows))
+        return [self.format_results(row) for row in rows]
+
+    def fetched(self, rows, requested=None):
+        """
+        Count `rows` fetched in one round trip in the metrics, the span and
+        the capture entry of the result set, and end the result set once it
+        is exhausted.
+        """
+        if self.fetch_exhausted:
+            return
+        if self.metrics is not None:
+            self.metrics.fetched(self.last_kind, rows)
+        if self.tracer is not None:
+            if self.fetch_span is None:
+                self.fetch_span = start_span(self.tracer, 'db.fetch', {
+                    'db.alias': self.db and self.db.alias,
+                    'db.statement.fingerprint': fingerprint(self.last_sql),
+                    'db.batch_size': requested,
+                })
+                self.fetch_rows = self.fetch_batches = 0
+            self.fetch_rows += rows
+            self.fetch_batches += 1
+        if self.capture_entry is not None:
+            self.capture_entry['rows'] += rows
+        if self.slow_query is not None:
+            self.slow_query.rows += rows
+        if requested is None or rows < requested:
+            self.end_result_set()
+            self.fetch_exhausted = True
+
+    def end_result_set(self):
+        """
+        End the span of the result set, write its capture entry and log it
+        if it was slow.
+        """
+        if self.fetch_span is not None:
+            span, self.fetch_span = self.fetch_span, None
+            end_span(span, **{'db.rows': self.fetch_rows, 'db.batches': self.fetch_batches})
+        if self.capture_entry is not None:
+            entry, self.capture_entry = self.capture_entry, None
+            self.capture.write(entry)
+        if self.slow_query is not None:
+            from django_pyodbc.slowlog import log_slow_query
+            slow, self.slow_query = self.slow_query, None
+            log_slow_query(slow, fetched=True)
+
+    def fetch_columns(self, batch_size=None):
+        """
+        Fetch the remaining rows into one NumPy masked array per column, see
+        django_pyodbc.columnar.
+        """
+        from django_pyodbc.columnar import fetch_columns
+        return fetch_columns(self, batch_size)
+
+    def nextset(self):
+        self.stop_prefetch()
+        self.end_result_set()
+        self.fetch_exhausted = False
+        self.row_converters = None
+        return self.cursor.nextset()
+
+    def stop_prefetch(self):
+        self.unprefetched_rows = 0
+        if self.prefetcher is not None:
+            if self.db is not None:
+                self.db.prefetching.discard(self)
+            self.prefetcher.close()
+            self.prefetcher = None
 
     def __getattr__(self, attr):
         if attr in self.__dict__:
@@ -419,7 +1135,18 @@ class CursorWrapper(object):
         return getattr(self.cursor, attr)
 
     def __iter__(self):
-        return iter(self.cursor)
+        # Stream the result set in fetch_batch_size batches so that memory
+        # stays flat however many rows the query returns.
+        try:
+            while True:
+                rows = self.fetchmany(self.fetch_batch_size)
+                for row in rows:
+                    yield row
+                if len(rows) < self.fetch_batch_size:
+                    # a short batch ends the result set
+                    break
+        finally:
+            self.stop_prefetch()
 
 
     # # MS SQL Server doesn't support explicit savepoint commits; savepoints are
@@ -0,0 +1,443 @@
+"""
+Bulk loading and unloading through Exasol's IMPORT and EXPORT statements.
+
+Rows are converted to CSV by a generator pipeline and streamed to the
+server while the IMPORT runs, so memory use does not depend on the number
+of rows; an EXPORT is copied to a file object block by block the same way.
+How the CSV travels is up to a transport; the default HTTPTransport runs a
+small HTTP server in a helper thread and the statement tells Exasol to
+connect to it:
+
+    IMPORT INTO "TABLE" ("A", "B") FROM CSV AT 'http://host:port' FILE '<token>.csv' ...
+    EXPORT (SELECT ...) INTO CSV AT 'http://host:port' FILE '<token>.csv' ...
+
+The server listens only on the local interface that reaches the database
+server, answers only the random file name of the statement and only once.
+The interface, port and the address Exasol connects back to can be set in
+the Django settings file:
+
+    'OPTIONS': {
+        'bulk_transport': {'host': '10.0.0.5', 'address': 'loader.example.com', 'port': 0},
+    }
+
+Any object with import_location(chunks) and export_location(fileobj)
+context managers returning the "AT ... FILE ..." clause can be used as
+transport, e.g. to test against a local stand-in receiver.
+"""
+import binascii
+import contextlib
+import csv
+import datetime
+import numbers
+import os
+import re
+import socket
+import sys
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.core.exceptions import ImproperlyConfigured
+
+from django_pyodbc.compat import _py3, binary_type, reraise, text_type
+
+# bytes of CSV handed to the transport at a time
+CHUNK_SIZE = 64 * 1024
+
+CSV_FORMAT = "ENCODING = 'UTF8' ROW SEPARATOR = 'LF' COLUMN SEPARATOR = ',' COLUMN DELIMITER = '\"'"
+
+
+def format_csv_value(value):
+    """
+    Format a value prepared by Field.get_db_prep_save() the way Exasol
+    parses CSV with its default NLS formats. NULL is an empty field.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime.datetime):
+        return '%s.%03d' % (value.strftime('%Y-%m-%d %H:%M:%S'), value.microsecond // 1000)
+    if isinstance(value, datetime.date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, text_type):
+        return value if _py3 else value.encode('utf-8')
+    if isinstance(value, binary_type):
+        return value.decode('utf-8') if _py3 else value
+    if isinstance(value, float):
+        # str() keeps only 12 significant digits on Python 2
+        return repr(value)
+    return str(value)
+
+
+def field_values(fields, rows, connection):
+    """
+    Yield the values of every row prepared for the database by the model
+    fields. A row is either a model instance or a sequence of values in the
+    order of `fields`.
+    """
+    for row in rows:
+        if hasattr(row, '_meta'):
+            yield [f.get_db_prep_save(f.pre_save(row, True), connection=connection) for f in fields]
+        else:
+            yield [f.get_db_prep_save(value, connection=connection) for f, value in zip(fields, row)]
+
+
+def csv_chunks(values, chunk_size=CHUNK_SIZE):
+    """
+    Encode rows of prepared values as UTF-8 CSV and yield it in chunks of
+    about `chunk_size` bytes.
+    """
+    if _py3:
+        from io import StringIO
+    else:
+        from cStringIO import StringIO
+    buf = StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    for row in values:
+        writer.writerow([format_csv_value(value) for value in row])
+        if buf.tell() >= chunk_size:
+            yield _encode(buf.getvalue())
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield _encode(buf.getvalue())
+
+
+def _encode(data):
+    if isinstance(data, text_type):
+        return data.encode('utf-8')
+    return data
+
+
+class HTTPTransport(object):
+    """
+    Serves the CSV data of an IMPORT over HTTP from a helper thread.
+
+    `host` and `port` are where the server listens (port 0 picks a free
+    port); `address` is the host name Exasol connects to, by default `host`.
+    Without `host`, the server listens on the local interface that reaches
+    `server`, the (host, port) of the database server.
+
+    Every statement gets a random file name, which is the only path the
+    server answers, and only to its first request.
+    """
+    def __init__(self, host=None, port=0, address=None, server=None):
+        self.host = host
+        self.port = port
+        self.address = address
+        self.server = server
+        self.file_name = None
+        self.served = False
+
+    @contextlib.contextmanager
+    def import_location(self, chunks):
+        """
+        Serve `chunks` to the first GET request while the body of the with
+        statement runs the IMPORT. Yields the "AT ... FILE ..." clause.
+        """
+        transport = self
+
+        class Handler(_QuietHandler):
+            def do_GET(self):
+                if not self.claim(transport):
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for chunk in chunks:
+                        self.wfile.write(('%x\r\n' % len(chunk)).encode('ascii'))
+                        self.wfile.write(chunk)
+                        self.wfile.write(b'\r\n')
+                    self.wfile.write(b'0\r\n\r\n')
+                except Exception:
+                    # abort the transfer: the IMPORT fails and the error is
+                    # re-raised once it returns
+                    transport.error = sys.exc_info()
+
+        with self._serve(Handler) as location:
+            yield location
+
+    @contextlib.contextmanager
+    def export_location(self, fileobj):
+        """
+        Write the body of the first PUT request to `fileobj` while the body
+        of the with statement runs the EXPORT. Yields the "AT ... FILE ..."
+        clause.
+        """
+        transport = self
+
+        class Handler(_QuietHandler):
+            def do_PUT(self):
+                if not self.claim(transport):
+                    return
+                self.close_connection = True
+                try:
+                    for block in self.read_body():
+                        fileobj.write(block)
+                except Exception:
+                    transport.error = sys.exc_info()
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+
+            do_POST = do_PUT
+
+        with self._serve(Handler) as location:
+            yield location
+
+    def listen_host(self):
+        if self.host:
+            return self.host
+        if self.server is None:
+            raise ImproperlyConfigured(
+                "The bulk transport can't tell the interface that reaches the database server: "
+                "set OPTIONS['bulk_transport']['host'].")
+        return local_interface(*self.server)
+
+    @contextlib.contextmanager
+    def _serve(self, handler):
+        self.error = None
+        self.served = False
+        self.file_name = '%s.csv' % binascii.hexlify(os.urandom(16)).decode('ascii')
+        host = self.listen_host()
+        server = HTTPServer((host, self.port), handler)
+        thread = threading.Thread(target=server.serve_forever, name='django_pyodbc bulk transport')
+        thread.daemon = True
+        thread.start()
+        try:
+            address = self.address or host
+            yield "AT 'http://%s:%d' FILE '%s'" % (address, server.server_address[1], self.file_name)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            if self.error is not None:
+                # the transport error explains why the statement failed
+                reraise(*self.error)
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def claim(self, transport):
+        """
+        Return whether this is the first request for the file of
+        `transport`; any other request is answered with 404.
+        """
+        # HTTPServer handles one request at a time
+        if transport.served or self.path.split('?')[0] != '/' + transport.file_name:
+            self.close_connection = True
+            self.send_error(404)
+            return False
+        transport.served = True
+        return True
+
+    def read_body(self):
+        """
+        Yield the request body in blocks of at most CHUNK_SIZE bytes.
+        """
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if not size:
+                    # skip the trailer
+                    while self.rfile.readline().strip():
+                        pass
+                    return
+                while size:
+                    block = self.rfile.read(min(size, CHUNK_SIZE))
+                    if not block:
+                        raise IOError("Connection closed in the middle of a chunk")
+                    size -= len(block)
+                    yield block
+                self.rfile.readline()
+        else:
+            length = self.headers.get('Content-Length')
+            remaining = int(length) if length is not None else None
+            while remaining is None or remaining > 0:
+                block = self.rfile.read(CHUNK_SIZE if remaining is None else min(remaining, CHUNK_SIZE))
+                if not block:
+                    return
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+    def log_message(self, format, *args):
+        pass
+
+
+def database_server(connection):
+    """
+    Return the (host, port) of the Exasol server of `connection`, from its
+    HOST and PORT settings or EXAHOST in extra_params, or None for a DSN.
+    The first node of a cluster stands for the others.
+    """
+    settings_dict = connection.settings_dict
+    options = settings_dict.get('OPTIONS') or {}
+    host, port = settings_dict.get('HOST'), settings_dict.get('PORT')
+    if not host:
+        for param in options.get('extra_params', '').split(';'):
+            if param.upper().startswith('EXAHOST='):
+                host = param.split('=', 1)[1].split(',')[0]
+        if not host:
+            return None
+    if ':' in host:
+        host, port = host.rsplit(':', 1)
+    # a range of nodes such as 10.0.0.11..14
+    host = host.split('..')[0]
+    return host, int(port or 8563)
+
+
+def local_interface(host, port):
+    """
+    Return the address of the local interface that reaches host:port.
+    """
+    # connecting a UDP socket only selects the route, nothing is sent
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((host, port))
+        return sock.getsockname()[0]
+    finally:
+        sock.close()
+
+
+def get_transport(connection, transport=None):
+    if transport is None:
+        options = connection.settings_dict.get('OPTIONS') or {}
+        config = dict(options.get('bulk_transport', {}))
+        config.setdefault('server', database_server(connection))
+        transport = HTTPTransport(**config)
+    return transport
+
+
+def default_import_fields(model):
+    """
+    The concrete fields of `model`, without the auto-incremented primary key.
+    """
+    from django.db.models import AutoField
+    return [f for f in model._meta.local_concrete_fields if not isinstance(f, AutoField)]
+
+
+def bulk_import(connection, model, rows, fields=None, transport=None):
+    """
+    Load `rows` into the table of `model` with a single IMPORT statement
+    and return the number of rows imported.
+    """
+    if fields is None:
+        fields = default_import_fields(model)
+    qn = connection.ops.quote_name
+    chunks = csv_chunks(field_values(fields, rows, connection))
+    with get_transport(connection, transport).import_location(chunks) as location:
+        sql = 'IMPORT INTO %s (%s) FROM CSV %s %s' % (
+            qn(model._meta.db_table),
+            ', '.join(qn(f.column) for f in fields),
+            location,
+            CSV_FORMAT,
+        )
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def quote_literal(value):
+    """
+    Return `value` as an SQL literal. EXPORT runs its query on the server
+    without bind parameters, so they are inlined.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float):
+        # str() keeps only 12 significant digits on Python 2
+        return repr(value)
+    if isinstance(value, numbers.Number):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return "TIMESTAMP '%s'" % format_csv_value(value)
+    if isinstance(value, datetime.date):
+        return "DATE '%s'" % format_csv_value(value)
+    if isinstance(value, binary_type):
+        value = value.decode('utf-8')
+    return "'%s'" % text_type(value).replace("'", "''")
+
+
+_placeholder_re = re.compile(r'%%|%s')
+
+
+def inline_params(sql, params):
+    """
+    Replace the %s placeholders of `sql` with the literals of `params`. '%'
+    signs are left escaped for the cursor, which still formats the SQL.
+    """
+    literals = iter(params)
+
+    def replace(match):
+        if match.group() == '%%':
+            return '%%'
+        return quote_literal(next(literals)).replace('%', '%%')
+
+    return _placeholder_re.sub(replace, sql)
+
+
+def result_column_names(compiler):
+    """
+    Return the names Exasol gives the columns selected by `compiler`, once
+    its as_sql() has set up the query.
+    """
+    select = getattr(compiler, 'select', None)
+    if select is not None:
+        # Django >= 1.8: (expression, (sql, params), alias)
+        columns = [alias or sql for expression, (sql, params), alias in select]
+    else:
+        columns = compiler.get_columns()
+    names = []
+    for column in columns:
+        match = re.search(r'"([^"]*)"\s*$', column)
+        names.append(match.group(1) if match else column.upper())
+    return names
+
+
+def bulk_export(connection, queryset, fileobj, transport=None, column_names=False):
+    """
+    Write the result of `queryset` to `fileobj` as CSV with a single EXPORT
+    statement and return the number of rows exported.
+    """
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+    compiler = queryset.query.get_compiler(connection=connection)
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        # e.g. filter(id__in=[]), which Django does not run at all
+        if column_names:
+            for chunk in csv_chunks([result_column_names(compiler)]):
+                fileobj.write(chunk)
+        return 0
+    with get_transport(connection, transport).export_location(fileobj) as location:
+        sql = 'EXPORT (%s) INTO CSV %s %s%s' % (
+            inline_params(sql, params),
+            location,
+            CSV_FORMAT,
+            ' WITH COLUMN NAMES' if column_names else '',
+        )
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.rowcount
+        finally:
+            cursor.close()
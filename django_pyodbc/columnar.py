@@ -0,0 +1,148 @@
+"""
+Columnar fetching of result sets into NumPy arrays.
+
+Rows are fetched in batches and every column is converted straight into a
+typed array, so the result set never exists as a list of Python tuples.
+NULLs are handled with masks: every column is returned as a
+numpy.ma.MaskedArray.
+"""
+import datetime
+import decimal
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from django.core.exceptions import ImproperlyConfigured
+
+from django_pyodbc.compat import binary_type, text_type
+
+try:
+    long
+except NameError:
+    long = int
+
+# (dtype, fill value for NULLs, conversion of the non-NULL values) by the
+# Python type pyodbc reports for the column in cursor.description
+COLUMN_TYPES = {
+    int: ('int64', 0, None),
+    long: ('int64', 0, None),
+    float: ('float64', 0.0, None),
+    decimal.Decimal: ('float64', 0.0, float),
+    bool: ('bool', False, None),
+    datetime.datetime: ('datetime64[us]', None, None),
+    datetime.date: ('datetime64[D]', None, None),
+}
+OBJECT_COLUMN = ('object', None, None)
+
+
+def _get_numpy():
+    if numpy is None:
+        raise ImproperlyConfigured("Columnar fetching requires numpy, "
+                                   "but it isn't installed.")
+    return numpy
+
+
+def fetch_columns(cursor, batch_size=None):
+    """
+    Fetch the remaining rows of `cursor`, a django_pyodbc CursorWrapper, and
+    return an OrderedDict mapping each column name to a masked array.
+    """
+    np = _get_numpy()
+    if batch_size is None:
+        batch_size = cursor.fetch_batch_size
+    description = cursor.cursor.description or ()
+
+    names = []
+    for i, column in enumerate(description):
+        name = column[0]
+        if name in names:
+            name = '%s_%d' % (name, i)
+        names.append(name)
+    column_types = [COLUMN_TYPES.get(column[1], OBJECT_COLUMN) for column in description]
+
+    # strings still need decoding; the other converters only apply to rows
+    object_converters = dict(
+        (i, convert) for i, convert in cursor.get_row_converters(description)
+        if description[i][1] in (binary_type, text_type)
+    )
+
+    # The rows go straight into one array per column, grown geometrically
+    # (from cursor.rowcount when the driver knows it), so that no more than
+    # one batch is held twice. Masks are only allocated once a column has
+    # a NULL.
+    capacity = getattr(cursor.cursor, 'rowcount', -1)
+    if capacity is None or capacity <= 0:
+        capacity = batch_size
+    data = [np.empty(capacity, dtype=dtype) for dtype, fill, convert in column_types]
+    masks = [None] * len(column_types)
+    count = 0
+    while True:
+        rows = cursor.fetchmany_raw(batch_size)
+        if not rows:
+            break
+        end = count + len(rows)
+        if end > capacity:
+            capacity = max(end, capacity * 2)
+            for array in data:
+                array.resize(capacity, refcheck=False)
+            for mask in masks:
+                if mask is not None:
+                    mask.resize(capacity, refcheck=False)
+        for i, (dtype, fill, convert) in enumerate(column_types):
+            values = [row[i] for row in rows]
+            mask = [value is None for value in values]
+            has_nulls = any(mask)
+            if convert is not None or has_nulls or i in object_converters:
+                convert = convert or object_converters.get(i)
+                values = [
+                    fill if value is None else (convert(value) if convert else value)
+                    for value in values
+                ]
+            if dtype == 'object':
+                # np.array() would unpack sequence values, such as the
+                # bytearrays of a BINARY column, into a second dimension
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+            else:
+                array = np.array(values, dtype=dtype)
+            data[i][count:end] = array
+            if has_nulls:
+                if masks[i] is None:
+                    masks[i] = np.zeros(capacity, dtype=bool)
+                masks[i][count:end] = mask
+            elif masks[i] is not None:
+                masks[i][count:end] = False
+        count = end
+        del rows
+
+    columns = OrderedDict()
+    for name, array, mask in zip(names, data, masks):
+        array.resize(count, refcheck=False)
+        if mask is not None:
+            mask.resize(count, refcheck=False)
+        columns[name] = np.ma.MaskedArray(array, mask=np.ma.nomask if mask is None else mask, copy=False)
+    return columns
+
+
+def fetch_queryset_columns(queryset, batch_size=None):
+    """
+    Evaluate `queryset` (typically a values() or values_list() queryset) on
+    its database and return its columns as fetch_columns() does.
+    """
+    from django.db import connections
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+    compiler = queryset.query.get_compiler(using=queryset.db)
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        return OrderedDict()
+    cursor = connections[queryset.db].cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetch_columns(batch_size)
+    finally:
+        cursor.close()
@@ -73,3 +73,9 @@ except ImportError:
                 yield tup
         except IndexError:
             pass
+
+try:
+    from django.utils.six import reraise
+except ImportError:
+    # derived from six
+    exec("def reraise(tp, value, tb=None):\n    raise tp, value, tb\n")
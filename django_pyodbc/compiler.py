@@ -1,10 +1,11 @@
 import re
-import tempfile
-from collections import OrderedDict
 
 from django.db.models.sql import compiler
 from django import VERSION as DjangoVersion
 
+from django_pyodbc.lru import LRUCache
+from django_pyodbc import querycache
+
 
 # Pattern to scan a column data type string and split the data type from any
 # constraints or other included parts of a column definition. Based upon
@@ -18,64 +19,133 @@ _re_data_type_terminator = re.compile(
 )
 
 class SQLCompiler(compiler.SQLCompiler):
-    _re_advanced_group_by =  re.compile(r'GROUP BY(.*%s.*)((ORDER BY)|(LIMIT))?', re.MULTILINE)
+    # placeholders, and the escaped percent signs to step over
+    _re_placeholder = re.compile(r'%%|%s')
+    # a GROUP BY with parameters, found in the SQL on Django < 1.8
+    _re_advanced_group_by = re.compile(r'GROUP BY(.*%s.*)((ORDER BY)|(LIMIT))?', re.MULTILINE)
+
+    # common table expression holding the parameters of a query that groups
+    # by expressions with parameters, see hoist_params()
+    params_table = None
+
+    def pre_sql_setup(self):
+        result = super(SQLCompiler, self).pre_sql_setup()
+        if result is not None:
+            # Django >= 1.8: the GROUP BY is a list of (sql, params)
+            self.params_table = None
+            extra_select, order_by, group_by = result
+            if any(g_params for g_sql, g_params in group_by):
+                # named after the alias prefix, which differs for subqueries
+                self.params_table = '"GROUP_BY_PARAMS_%s"' % self.query.alias_prefix
+        return result
+
+    def get_from_clause(self):
+        result, params = super(SQLCompiler, self).get_from_clause()
+        if self.params_table is not None:
+            result.append(', %s' % self.params_table)
+        return result, params
 
     def as_sql(self, with_limits=True, with_col_aliases=False, subquery=False):
-        sql, params = super(SQLCompiler, self).as_sql(with_limits, with_col_aliases, subquery)
-
-        if self._re_advanced_group_by.search(sql) is not None:
-            print "GROUP BY with parameters found: we need to rewrite the sql"
-
-            # we need to rewrite queries that have parameters inside the GROUP BY clause, such as this one:
-            #
-            #   sql = """SELECT (first_seen >= %s), COUNT(*) FROM "TABLEAU_ALL" GROUP BY (first_seen >= %s)"""
-            #   params = ['2016-05-04', '2016-05-04']
-            #
-            # to this
-            #
-            #   sql = """
-            #       WITH tmp AS (SELECT %s as p0)
-            #           SELECT(first_seen >= p0), COUNT(*)
-            #           FROM "TABLEAU_ALL", tmp
-            #           GROUP BY(first_seen >= p0)
-            #   """
-            #   params = ['2016-05-04']
-            #
-
-            # first, we generate a sequence of unique parameter names p0, p1... for each individual parameter
-            param_names = map(lambda (i, p): 'p%d' % (i,), enumerate(params))
-            named_params = OrderedDict()
-            for i, (param_name, param_value) in enumerate(zip(param_names, params)):
-                # for every parameter, find the first parameter in the list that has the same value
-                param_names[i] = next(name for (name,value) in zip(param_names, params) if value==param_value)
-                # for these repeated parameters, we will use the first name:
-                # if a value appears twice (for instance p3 and p5 have the same value), we will use p3 in both places
-                named_params[param_names[i]] = param_value
-                # print i, param_name, param_value, param_names[i]
-
-            # param_names has a list of replacements for each of the %s in the original query with the correct parameter name
-            # named_params has an ordered dict of parameters with unique values
-
-            # generate a unique temporary name
-            tmp_name = '"TMP_%s"' % (next(tempfile._get_candidate_names()),)
-
-            # generate the first part of the sql sentence: a %s placeholder for each named parameter
-            with_sql = 'WITH {tmp_name} AS (SELECT {named_params})'.format(
-                tmp_name=tmp_name,
-                named_params=", ".join(map(lambda name: '%s AS {name}'.format(name=name), named_params.keys()))
-            )
+        cache = getattr(self.connection, 'query_cache', None)
+        if (cache is None or not querycache.SUPPORTED or
+                getattr(self.query, 'bypass_query_cache', False)):
+            return self.compile_sql(with_limits, with_col_aliases, subquery)
+        if with_limits and self.query.low_mark == self.query.high_mark:
+            # an empty slice, compiled as no SQL at all
+            cache.skip()
+            return self.compile_sql(with_limits, with_col_aliases, subquery)
+        key = querycache.query_key(self.query, self.__class__, with_limits, with_col_aliases, subquery)
+        if key is None:
+            cache.skip()
+            return self.compile_sql(with_limits, with_col_aliases, subquery)
+        template = cache.get(key)
+        if template is querycache.REJECTED:
+            return self.compile_sql(with_limits, with_col_aliases, subquery)
+        if template is not None:
+            sql, n_params = template
+            params = self.template_params(subquery)
+            if len(params) == n_params:
+                return sql, tuple(params)
+            # compiled from now on, rather than stored again
+            cache.reject(key)
+            return self.compile_sql(with_limits, with_col_aliases, subquery)
+        sql, params = self.compile_sql(with_limits, with_col_aliases, subquery)
+        cache.set(key, sql, params)
+        return sql, params
 
-            # replace %s placeholders with their corresponding named parameters
-            for named_param in param_names:
-                sql = sql.replace('%s', tmp_name + "." + named_param, 1)
+    def compile_sql(self, with_limits=True, with_col_aliases=False, subquery=False):
+        # subquery is an argument of as_sql() since Django 1.8
+        args = (with_limits, with_col_aliases, subquery) if subquery else (with_limits, with_col_aliases)
+        sql, params = super(SQLCompiler, self).as_sql(*args)
+        if (self.params_table is None and params and DjangoVersion[:2] < (1, 8) and
+                self._re_advanced_group_by.search(sql) is not None):
+            # Django < 1.8 does not tell pre_sql_setup() about the GROUP BY:
+            # compile again with the parameters table in the FROM clause
+            self.params_table = '"GROUP_BY_PARAMS_%s"' % self.query.alias_prefix
+            try:
+                sql, params = super(SQLCompiler, self).as_sql(*args)
+                return self.hoist_params(sql, params)
+            finally:
+                self.params_table = None
+        if self.params_table is not None and params:
+            sql, params = self.hoist_params(sql, params)
+        return sql, params
 
-            # combine the two sql parts into a single statement
-            sql = with_sql + ' ' + sql.replace('FROM ', 'FROM {tmp_name}, '.format(tmp_name=tmp_name))
+    def template_params(self, subquery=False):
+        """
+        Set the compiler up as as_sql() does and return the parameters of the
+        query, for SQL taken from the query cache (see querycache).
+        """
+        self.subquery = subquery
+        refcounts_before = self.query.alias_refcount.copy()
+        try:
+            # the selected columns are needed to read the rows
+            self.setup_query()
+            return querycache.where_params(self.query.where, self, self.connection)
+        finally:
+            self.query.reset_refcounts(refcounts_before)
+
+    def hoist_params(self, sql, params):
+        """
+        Move the parameters of `sql` into the common table expression
+        params_table, so that an expression with parameters in the GROUP BY
+        is the same expression as in the select list:
 
-            # new param list contains only one item for each distinct parameter value
-            params = named_params.values()
+            SELECT (first_seen >= %s), COUNT(*) FROM "T" GROUP BY (first_seen >= %s)
 
-        return sql, params
+        becomes
+
+            WITH "GROUP_BY_PARAMS_T" AS (SELECT %s AS p0)
+            SELECT (first_seen >= "GROUP_BY_PARAMS_T".p0), COUNT(*)
+            FROM "T" , "GROUP_BY_PARAMS_T" GROUP BY (first_seen >= "GROUP_BY_PARAMS_T".p0)
+
+        Parameters of the same type and value share one column; unhashable
+        ones get a column each.
+        """
+        table = self.params_table
+        names = {}
+        hoisted = []
+        remaining = iter(params)
+
+        def replace(match):
+            if match.group() == '%%':
+                return '%%'
+            value = next(remaining)
+            try:
+                key = (type(value), value)
+                name = names.get(key)
+            except TypeError:
+                key = name = None
+            if name is None:
+                name = 'p%d' % len(hoisted)
+                hoisted.append(value)
+                if key is not None:
+                    names[key] = name
+            return '%s.%s' % (table, name)
+
+        sql = self._re_placeholder.sub(replace, sql)
+        with_sql = 'WITH %s AS (SELECT %s)' % (table, ', '.join('%%s AS p%d' % i for i in range(len(hoisted))))
+        return '%s %s' % (with_sql, sql), tuple(hoisted)
 
 
 class SQLInsertCompiler(compiler.SQLInsertCompiler, SQLCompiler):
@@ -84,19 +154,79 @@ class SQLInsertCompiler(compiler.SQLInsertCompiler, SQLCompiler):
     # ... and insert the OUTPUT clause between it and the values list (or DEFAULT VALUES).
     _values_repl = r'\g<prefix> OUTPUT INSERTED.{col} INTO @sqlserver_ado_return_id\g<default>VALUES\g<suffix>'
 
+    # Finished INSERT statements of single objects keyed on (alias, model,
+    # fields, return_id, raw), with whether they take the field values as
+    # parameters: only the parameters are computed for the next save().
+    insert_templates = LRUCache(512)
+
     def as_sql(self, *args, **kwargs):
         # Fix for Django ticket #14019
         if not hasattr(self, 'return_id'):
             self.return_id = False
 
+        key = self.insert_template_key()
+        if key is not None:
+            obj = self.query.objs[0]
+            # checked on the attributes: pre_save() has side effects (e.g.
+            # auto_now) and must run once, here or in the compiler below
+            if any(hasattr(value, 'resolve_expression') or hasattr(value, 'as_sql')
+                   for value in (getattr(obj, f.attname, None) for f in self.query.fields)):
+                # expressions (Django >= 1.9) are compiled into the SQL
+                key = None
+            else:
+                template = self.insert_templates.get(key)
+                if template is not None:
+                    sql, takes_params = template
+                    values = self.insert_values(obj)
+                    return [(sql, self.insert_params(values) if takes_params else ())]
+
         result = super(SQLInsertCompiler, self).as_sql(*args, **kwargs)
+        if key is not None and isinstance(result, list) and len(result) == 1:
+            sql, params = self._fix_insert(result[0][0], result[0][1])
+            # the statement either binds one parameter per field, or none
+            # (DEFAULT VALUES)
+            if sql.count('%s') == len(params) and len(params) in (0, len(self.query.fields)):
+                self.insert_templates.set(key, (sql, bool(params)))
+            return [(sql, params)]
         if isinstance(result, list):
             # Django 1.4 wraps return in list
+            objs = getattr(self.query, 'objs', ())
+            if len(result) == 1 and len(objs) > 1 and not getattr(self.query, 'fields', True):
+                # A multi-row insert of objects without any field to set:
+                # _fix_insert turns each statement into DEFAULT VALUES, so
+                # one is needed per object.
+                result = result * len(objs)
             return [self._fix_insert(x[0], x[1]) for x in result]
         
         sql, params = result
         return self._fix_insert(sql, params)
 
+    def insert_template_key(self):
+        """
+        Return the key of the INSERT template of the query, or None when it
+        does not insert a single object or its SQL depends on the values.
+        """
+        query = self.query
+        objs = getattr(query, 'objs', None)
+        if objs is None or len(objs) != 1 or not query.fields:
+            return None
+        if any(hasattr(field, 'get_placeholder') for field in query.fields):
+            # e.g. geometry fields, whose placeholder depends on the value
+            return None
+        return (self.connection.alias, query.model, tuple(query.fields), self.return_id, query.raw)
+
+    def insert_values(self, obj):
+        # the values SQLInsertCompiler.as_sql() saves for an object
+        if self.query.raw:
+            return [getattr(obj, f.attname) for f in self.query.fields]
+        return [f.pre_save(obj, True) for f in self.query.fields]
+
+    def insert_params(self, values):
+        # the parameters SQLInsertCompiler.as_sql() binds for those values
+        connection = self.connection
+        return tuple(f.get_db_prep_save(value, connection=connection)
+                     for f, value in zip(self.query.fields, values))
+
     def _fix_insert(self, sql, params):
         """
         Wrap the passed SQL with IDENTITY_INSERT statements and apply
@@ -0,0 +1,140 @@
+"""
+Query fingerprints and detection of repeated queries (N+1 patterns).
+
+fingerprint() normalises a statement by replacing literals and placeholders
+with '?' and collapsing IN lists and multi-row VALUES lists, so that the
+queries issued by a loop over related objects share one fingerprint.
+
+While a QueryTracker is active in a thread, CursorWrapper counts the
+statements it executes and their time by fingerprint; an executemany() call
+counts as one statement, however many batches it is sent in. A fingerprint seen
+more than `threshold` times is logged as a warning by the
+'django_pyodbc.queries' logger, or raises RepeatedQueryError in strict
+mode:
+
+    with track_queries(threshold=10, strict=True):
+        response = self.client.get('/orders/')     # in a test
+
+For requests, add the middleware and configure it in the settings file;
+only `sample_rate` of the requests are tracked:
+
+    MIDDLEWARE_CLASSES += ('django_pyodbc.fingerprint.QueryTrackingMiddleware',)
+    DJANGO_PYODBC_QUERY_TRACKING = {'threshold': 20, 'sample_rate': 0.05, 'strict': False}
+"""
+import contextlib
+import logging
+import random
+import re
+import threading
+
+from django_pyodbc.lru import LRUCache
+
+logger = logging.getLogger('django_pyodbc.queries')
+
+_literal_re = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b|%s")
+_in_list_re = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_values_re = re.compile(r'(\((?:\?,\s*)*\?\))(?:\s*,\s*\((?:\?,\s*)*\?\))+')
+_space_re = re.compile(r'\s+')
+
+_fingerprints = LRUCache(4096)
+
+
+def fingerprint(sql):
+    """
+    Return the normalised form of the statement `sql`.
+    """
+    result = _fingerprints.get(sql)
+    if result is None:
+        result = _literal_re.sub('?', sql)
+        result = _in_list_re.sub('IN (...)', result)
+        result = _values_re.sub(r'\1, ...', result)
+        result = _space_re.sub(' ', result).strip()
+        _fingerprints.set(sql, result)
+    return result
+
+
+class RepeatedQueryError(AssertionError):
+    """
+    Raised in strict mode when a fingerprint repeats more than the
+    threshold of the QueryTracker.
+    """
+    pass
+
+
+class QueryTracker(object):
+    """
+    Counts and total time of the statements of a unit of work, by
+    fingerprint.
+    """
+    def __init__(self, threshold=None, strict=False):
+        self.threshold = threshold
+        self.strict = strict
+        self.counts = {}
+        self.times = {}
+
+    def record(self, sql, duration):
+        key = fingerprint(sql)
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        self.times[key] = self.times.get(key, 0.0) + duration
+        if self.threshold is not None and count == self.threshold + 1:
+            message = 'Query repeated more than %d times: %s' % (self.threshold, key)
+            if self.strict:
+                raise RepeatedQueryError(message)
+            logger.warning(message, extra={'fingerprint': key, 'threshold': self.threshold})
+
+    def summary(self):
+        """
+        Return (fingerprint, count, total time) tuples, most frequent first.
+        """
+        return sorted(((key, count, self.times[key]) for key, count in self.counts.items()),
+                      key=lambda item: (-item[1], -item[2]))
+
+
+_local = threading.local()
+
+
+def get_trackers():
+    """
+    Return the trackers active in the current thread, or None.
+    """
+    return getattr(_local, 'trackers', None)
+
+
+@contextlib.contextmanager
+def track_queries(threshold=None, strict=False):
+    """
+    Track the statements executed by the current thread in the body of the
+    with statement. Yields the QueryTracker.
+    """
+    tracker = QueryTracker(threshold, strict)
+    trackers = get_trackers()
+    _local.trackers = (trackers or ()) + (tracker,)
+    try:
+        yield tracker
+    finally:
+        _local.trackers = trackers
+
+
+class QueryTrackingMiddleware(object):
+    """
+    Tracks the queries of a sample of the requests, configured by the
+    DJANGO_PYODBC_QUERY_TRACKING setting (threshold, sample_rate, strict).
+    """
+    def __init__(self, *args):
+        from django.conf import settings
+        config = getattr(settings, 'DJANGO_PYODBC_QUERY_TRACKING', {})
+        self.threshold = config.get('threshold', 20)
+        self.sample_rate = config.get('sample_rate', 1.0)
+        self.strict = config.get('strict', False)
+
+    def process_request(self, request):
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            request._query_tracking = track_queries(self.threshold, self.strict)
+            request.query_tracker = request._query_tracking.__enter__()
+
+    def process_response(self, request, response):
+        tracking = getattr(request, '_query_tracking', None)
+        if tracking is not None:
+            del request._query_tracking
+            tracking.__exit__(None, None, None)
+        return response
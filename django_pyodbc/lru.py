@@ -0,0 +1,80 @@
+"""
+Small thread-safe LRU cache used by the hot paths of the backend.
+"""
+import itertools
+import threading
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts the least recently used entries once it
+    holds `maxsize` entries. Hits and misses are counted.
+
+    Lookups take no lock and only stamp the entry with a clock value, which
+    keeps a hit cheaper than the work it saves. When the cache is full the
+    oldest eighth of the entries is evicted in one go, so the ordering cost
+    is paid once every maxsize / 8 insertions.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._clock = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        entry[0] = next(self._clock)
+        return entry[1]
+
+    def set(self, key, value):
+        """
+        Store `value` and return the list of (key, value) entries evicted to
+        make room for it.
+        """
+        if self.maxsize <= 0:
+            return [(key, value)]
+        evicted = []
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                by_age = sorted(self._data.items(), key=lambda item: item[1][0])
+                for old_key, (_, old_value) in by_age[:max(1, self.maxsize // 8)]:
+                    del self._data[old_key]
+                    evicted.append((old_key, old_value))
+            self._data[key] = [next(self._clock), value]
+        return evicted
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def clear(self):
+        """
+        Remove every entry and return them as a list of (key, value) tuples.
+        """
+        with self._lock:
+            items = [(key, value) for key, (_, value) in self._data.items()]
+            self._data.clear()
+        return items
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
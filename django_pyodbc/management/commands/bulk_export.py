@@ -0,0 +1,81 @@
+"""
+bulk_export management command: writes the rows of a model to a CSV file
+with Exasol's EXPORT statement, see DatabaseOperations.bulk_export.
+
+    ./manage.py bulk_export app_label.Model rows.csv.gz --header
+"""
+import gzip
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import bz2
+    has_bz2 = True
+except ImportError:
+    has_bz2 = False
+
+
+def open_output(path):
+    """
+    Open `path` for writing, compressed according to its extension. '-'
+    is the standard output.
+    """
+    if path == '-':
+        return getattr(sys.stdout, 'buffer', sys.stdout), False
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb'), True
+    if path.endswith('.bz2'):
+        if not has_bz2:
+            raise CommandError("bz2 compression is not available in this Python installation.")
+        return bz2.BZ2File(path, 'w'), True
+    return open(path, 'wb'), True
+
+
+def get_model(label):
+    try:
+        app_label, model_name = label.split('.')
+    except ValueError:
+        raise CommandError("Models are given as app_label.ModelName, not %r." % label)
+    try:
+        from django.apps import apps
+        model = apps.get_model(app_label, model_name)
+    except ImportError:
+        from django.db.models import get_model
+        model = get_model(app_label, model_name)
+    except LookupError:
+        model = None
+    if model is None:
+        raise CommandError("Unknown model: %s" % label)
+    return model
+
+
+class Command(BaseCommand):
+    help = 'Exports the rows of a model as CSV with a single EXPORT statement (Exasol-specific).'
+    args = "app_label.Model [output]"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database', default='default',
+                    help='Nominates a database to export from. Defaults to the "default" database.'),
+        make_option('--header', action='store_true', dest='header', default=False,
+                    help='Write the column names as the first line.'),
+    )
+
+    def handle(self, label=None, output='-', **options):
+        from django.db import connections
+
+        if label is None:
+            raise CommandError("Enter the model to export as app_label.ModelName.")
+        model = get_model(label)
+        connection = connections[options.get('database', 'default')]
+        queryset = model._default_manager.using(connection.alias).all()
+
+        fileobj, close = open_output(output)
+        try:
+            count = connection.ops.bulk_export(queryset, fileobj, column_names=options.get('header', False))
+        finally:
+            if close:
+                fileobj.close()
+        if int(options.get('verbosity', 1)) > 0 and output != '-':
+            self.stdout.write("Exported %d rows to %s\n" % (count, output))
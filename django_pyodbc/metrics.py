@@ -0,0 +1,244 @@
+"""
+Latency histograms and counters of the statements run by CursorWrapper.
+
+Enabled per database with OPTIONS['metrics'] = True. Metrics are labelled
+with the database alias and the kind of statement (select, insert, update,
+delete, other) and collected in a process wide registry:
+
+    from django_pyodbc.metrics import registry
+    registry.snapshot()      # {(name, labels): value or histogram dict}
+    registry.render()        # Prometheus text exposition format
+
+Metrics recorded:
+
+    django_pyodbc_execute_seconds         histogram of execute/executemany time
+    django_pyodbc_param_bytes_total       approximate bytes of parameters sent
+    django_pyodbc_executemany_batches_total
+    django_pyodbc_rows_fetched_total
+    django_pyodbc_fetch_batches_total     round trips made by the fetch methods
+    django_pyodbc_errors_total            errors, also labelled by exception class
+    django_pyodbc_query_cache_total       lookups of the query cache by result
+                                          (hit, miss, uncacheable)
+"""
+import re
+import threading
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STATEMENT_KINDS = ('select', 'insert', 'update', 'delete')
+_kinds = dict((kind, kind) for kind in STATEMENT_KINDS)
+
+HELP = {
+    'django_pyodbc_execute_seconds': 'Time spent executing statements.',
+    'django_pyodbc_param_bytes_total': 'Approximate size of the parameters sent.',
+    'django_pyodbc_executemany_batches_total': 'Batches sent by executemany().',
+    'django_pyodbc_rows_fetched_total': 'Rows fetched from result sets.',
+    'django_pyodbc_fetch_batches_total': 'Round trips made to fetch rows.',
+    'django_pyodbc_errors_total': 'Errors raised by the driver.',
+    'django_pyodbc_query_cache_total': 'Lookups of compiled queries in the query cache.',
+}
+
+
+# SET and DECLARE statements the backend puts before the statement itself,
+# e.g. SET IDENTITY_INSERT, or SET NOCOUNT ON;DECLARE @sqlserver_ado_return_id
+_re_prefix = re.compile(r'\s*(?:(?:SET|DECLARE)\s[^;]*;\s*)*', re.IGNORECASE)
+# tokens of a WITH clause: literals, quoted names, parentheses and words
+_re_with_token = re.compile(r"'[^']*'|\"[^\"]*\"|[()]|\w+")
+
+
+def statement_kind(sql):
+    """
+    Return the label of the statement `sql`: its first keyword when it is a
+    select, insert, update or delete, 'other' otherwise. Leading SET and
+    DECLARE statements and a WITH clause are skipped.
+    """
+    start = _re_prefix.match(sql).end()
+    words = sql[start:start + 16].split(None, 1)
+    if not words:
+        return 'other'
+    word = words[0].lower()
+    if word == 'with':
+        return _with_kind(sql, start + 4)
+    return _kinds.get(word, 'other')
+
+
+def _with_kind(sql, pos):
+    # the first keyword outside the parentheses of the common table
+    # expressions
+    depth = 0
+    for match in _re_with_token.finditer(sql, pos):
+        token = match.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif not depth and token.lower() in _kinds:
+            return _kinds[token.lower()]
+    return 'other'
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+
+class Histogram(object):
+    """
+    Cumulative counts of observations by upper bound, plus their sum.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'buckets': buckets, 'sum': total, 'count': cumulative}
+
+
+class MetricsRegistry(object):
+    """
+    Metrics by name and sorted tuple of (label, value) pairs.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, labels):
+        key = (name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+        return metric
+
+    def counter(self, name, **labels):
+        return self._get(Counter, name, tuple(sorted(labels.items())))
+
+    def histogram(self, name, **labels):
+        return self._get(Histogram, name, tuple(sorted(labels.items())))
+
+    def snapshot(self):
+        """
+        Return {(name, labels): value} with a dict of buckets, sum and count
+        as the value of histograms.
+        """
+        with self._lock:
+            items = list(self._metrics.items())
+        return dict((key, metric.snapshot() if isinstance(metric, Histogram) else metric.value)
+                    for key, metric in items)
+
+    def reset(self):
+        """
+        Set every metric back to zero. The metric objects are kept, as they
+        are cached by the connections recording into them.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        seen = set()
+        for (name, labels), value in sorted(self.snapshot().items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append('# HELP %s %s' % (name, HELP.get(name, name)))
+                lines.append('# TYPE %s %s' % (name, 'histogram' if isinstance(value, dict) else 'counter'))
+            if isinstance(value, dict):
+                for bound, count in value['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(labels + (('le', le),)), count))
+                lines.append('%s_sum%s %r' % (name, _format_labels(labels), value['sum']))
+                lines.append('%s_count%s %d' % (name, _format_labels(labels), value['count']))
+            else:
+                lines.append('%s%s %s' % (name, _format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for label, value in labels)
+
+
+registry = MetricsRegistry()
+
+
+class ConnectionMetrics(object):
+    """
+    Records the metrics of one database alias into `registry`; the metric
+    objects are looked up once per statement kind.
+    """
+    def __init__(self, alias, registry=registry):
+        self.alias = alias
+        self.registry = registry
+        self._metrics = {}
+
+    def _metric(self, kind, name, histogram=False):
+        key = (kind, name)
+        metric = self._metrics.get(key)
+        if metric is None:
+            get = self.registry.histogram if histogram else self.registry.counter
+            metric = self._metrics[key] = get(name, alias=self.alias, kind=kind)
+        return metric
+
+    def executed(self, kind, seconds, param_bytes=0, batches=0):
+        self._metric(kind, 'django_pyodbc_execute_seconds', True).observe(seconds)
+        if param_bytes:
+            self._metric(kind, 'django_pyodbc_param_bytes_total').inc(param_bytes)
+        if batches:
+            self._metric(kind, 'django_pyodbc_executemany_batches_total').inc(batches)
+
+    def fetched(self, kind, rows, batches=1):
+        self._metric(kind, 'django_pyodbc_rows_fetched_total').inc(rows)
+        self._metric(kind, 'django_pyodbc_fetch_batches_total').inc(batches)
+
+    def query_cache(self, result):
+        self.registry.counter('django_pyodbc_query_cache_total', alias=self.alias, result=result).inc()
+
+    def failed(self, kind, error):
+        self.registry.counter('django_pyodbc_errors_total', alias=self.alias, kind=kind,
+                              error=error.__class__.__name__).inc()
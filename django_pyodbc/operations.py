@@ -7,6 +7,7 @@ except:
     pytz = None
 
 from django.conf import settings
+from django.db import utils
 try:
     from django.db.backends.base.operations import BaseDatabaseOperations
 except ImportError:
@@ -18,6 +19,10 @@ from django_pyodbc.compat import smart_text, string_types, timezone
 
 EDITION_AZURE_SQL_DB = 5
 
+# SQLSTATE of a transaction rolled back by Exasol on a collision with a
+# concurrent one, e.g. two reservations of the same identity values
+TRANSACTION_COLLISION = '40001'
+
 class DatabaseOperations(BaseDatabaseOperations):
     compiler_module = "django_pyodbc.compiler"
     def __init__(self, connection):
@@ -74,6 +79,172 @@ class DatabaseOperations(BaseDatabaseOperations):
         return self._ss_edition == EDITION_AZURE_SQL_DB
     on_azure_sql_db = property(_on_azure_sql_db)
 
+    def bulk_batch_size(self, fields, objs):
+        """
+        Returns the maximum number of objects inserted by a single multi-row
+        INSERT: bounded by the number of rows of a VALUES list (1000 on SQL
+        Server), by the number of parameters the driver accepts and by the
+        maximum statement length (OPTIONS 'bulk_max_rows', 'bulk_max_params'
+        and 'bulk_max_statement_length').
+        """
+        if not fields:
+            return len(objs)
+        by_rows = self.connection.bulk_max_rows
+        by_params = self.connection.bulk_max_params // len(fields)
+        if not all(hasattr(f, 'column') for f in fields):
+            # the deletion Collector passes field names
+            return max(min(by_rows, by_params), 1)
+        # "INSERT INTO table (columns) VALUES " and the IDENTITY_INSERT
+        # wrapping, then "(?, ?, ...), " for every row
+        table = self.quote_name(fields[0].model._meta.db_table)
+        header = 3 * len(table) + sum(len(self.quote_name(f.column)) + 2 for f in fields) + 80
+        row = 3 * len(fields) + 2
+        by_length = (self.connection.bulk_max_statement_length - header) // row
+        return max(min(by_rows, by_params, by_length, len(objs)), 1)
+
+    def bulk_export(self, queryset, fileobj, transport=None, column_names=False):
+        """
+        Writes the result of `queryset` to the file object `fileobj` as CSV
+        with Exasol's EXPORT statement, streaming it block by block. Returns
+        the number of rows exported. See django_pyodbc.bulk for the
+        transports.
+        """
+        from django_pyodbc.bulk import bulk_export
+        return bulk_export(self.connection, queryset, fileobj, transport, column_names)
+
+    def bulk_import(self, model, rows, fields=None, transport=None):
+        """
+        Loads `rows` (model instances or sequences of values in the order of
+        `fields`) into the table of `model` with Exasol's IMPORT statement,
+        streaming them as CSV. Returns the number of rows imported. See
+        django_pyodbc.bulk for the transports.
+        """
+        from django_pyodbc.bulk import bulk_import
+        return bulk_import(self.connection, model, rows, fields, transport)
+
+    def bulk_insert_sql(self, fields, num_values):
+        """
+        Returns the multi-row VALUES list of a bulk INSERT. `num_values` is a
+        number of rows prior to Django 1.9 and the rows of placeholders since.
+        """
+        if isinstance(num_values, (list, tuple)):
+            rows = ["(%s)" % ", ".join(row) for row in num_values]
+        else:
+            rows = ["(%s)" % ", ".join(["%s"] * len(fields))] * num_values
+        return "VALUES " + ", ".join(rows)
+
+    def bulk_insert_returning_ids(self, model, objs, fields, batch_size=None):
+        """
+        Inserts the instances `objs`, which have no primary key yet, into
+        the table of `model` and returns their new primary keys in order.
+        How the keys are obtained is set by OPTIONS['bulk_return_ids']:
+
+        'output'    every batch of rows is inserted by a MERGE whose OUTPUT
+                    clause stores the new keys with the ordinal of their rows
+                    in the @sqlserver_ado_return_id table variable, read back
+                    in the same round trip (SQL Server)
+        'identity'  a range of values is reserved by moving the identity of
+                    the table past it with ALTER TABLE, and the rows are
+                    inserted with these values (Exasol); a concurrent
+                    reservation makes the transaction fail with
+                    TRANSACTION_COLLISION
+        """
+        strategy = self.connection.bulk_return_ids
+        if strategy == 'output':
+            return self._bulk_insert_output(model, objs, fields, batch_size)
+        if strategy == 'identity':
+            return self._bulk_insert_identity(model, objs, fields, batch_size)
+        raise ValueError("Unknown bulk_return_ids option %r, use 'output' or 'identity'." % (strategy,))
+
+    def _bulk_insert_output(self, model, objs, fields, batch_size):
+        # Identity values are not guaranteed to follow the order of the rows
+        # of a VALUES list, so every row carries its ordinal: a MERGE can
+        # OUTPUT columns of its source, which an INSERT can't.
+        from django_pyodbc.bulk import field_values
+        from django_pyodbc.compiler import _re_data_type_terminator
+        meta = model._meta
+        qn = self.quote_name
+        table = qn(meta.db_table)
+        pk = qn(meta.pk.column)
+        src, ordinal = qn('src'), qn('ord')
+        pk_type = _re_data_type_terminator.split(meta.pk.db_type(self.connection))[0]
+        declare = 'SET NOCOUNT ON;DECLARE @sqlserver_ado_return_id table (%s int, %s %s)' % (ordinal, pk, pk_type)
+        select = 'SELECT %s FROM @sqlserver_ado_return_id ORDER BY %s' % (pk, ordinal)
+        output = 'OUTPUT %%s, INSERTED.%s INTO @sqlserver_ado_return_id (%s, %s)' % (pk, ordinal, pk)
+        columns = [qn(f.column) for f in fields]
+        if fields:
+            batch_size = min(batch_size or len(objs), max(self.bulk_batch_size(fields, objs), 1))
+            placeholders = ', '.join(['%s'] * len(fields))
+            merge = 'MERGE INTO %s USING (VALUES %%s) AS %s (%s, %s) ON 1 = 0 ' \
+                    'WHEN NOT MATCHED THEN INSERT (%s) VALUES (%s) %s' % (
+                        table, src, ', '.join(columns), ordinal, ', '.join(columns),
+                        ', '.join('%s.%s' % (src, c) for c in columns), output % ('%s.%s' % (src, ordinal)))
+        else:
+            batch_size = batch_size or len(objs)
+            insert = 'INSERT INTO %s %s DEFAULT VALUES' % (table, output)
+        ids = []
+        cursor = self.connection.cursor()
+        try:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                if fields:
+                    rows = ', '.join('(%s, %d)' % (placeholders, i) for i in range(len(batch)))
+                    statements = [merge % rows]
+                    params = [v for values in field_values(fields, batch, self.connection) for v in values]
+                else:
+                    statements = [insert % i for i in range(len(batch))]
+                    params = []
+                # a MERGE has to be terminated with a semicolon
+                cursor.execute(';'.join([declare] + statements + [select]), params)
+                batch_ids = [row[0] for row in cursor.fetchall()]
+                if len(batch_ids) != len(batch):
+                    raise utils.DatabaseError(
+                        'Inserting %d rows into %s returned %d primary keys.' % (len(batch), table, len(batch_ids)))
+                ids.extend(batch_ids)
+        finally:
+            cursor.close()
+        return ids
+
+    def _bulk_insert_identity(self, model, objs, fields, batch_size):
+        from django_pyodbc.bulk import field_values
+        meta = model._meta
+        schema, _, table_name = meta.db_table.upper().rpartition('.')
+        cursor = self.connection.cursor()
+        try:
+            if schema:
+                schema_sql, params = '%s', [schema]
+            else:
+                schema_sql, params = 'CURRENT_SCHEMA', []
+            cursor.execute('SELECT COLUMN_IDENTITY FROM EXA_ALL_COLUMNS WHERE COLUMN_SCHEMA = %s'
+                           ' AND COLUMN_TABLE = %%s AND COLUMN_NAME = %%s' % schema_sql,
+                           params + [table_name, meta.pk.column.upper()])
+            row = cursor.fetchone()
+            if not row or row[0] is None:
+                raise ValueError('%s.%s is not an identity column' % (meta.db_table, meta.pk.column))
+            first = int(row[0])
+            # The ALTER TABLE write-locks the table until the end of the
+            # transaction; a concurrent reservation of the same values ends
+            # in a transaction collision (TRANSACTION_COLLISION) rather than
+            # in duplicate keys, and PyodbcQuerySet.bulk_create() retries.
+            cursor.execute('ALTER TABLE %s MODIFY COLUMN %s IDENTITY %d' % (
+                self.quote_name(meta.db_table), self.quote_name(meta.pk.column), first + len(objs)))
+            ids = list(range(first, first + len(objs)))
+            fields = [meta.pk] + list(fields)
+            batch_size = min(batch_size or len(objs), max(self.bulk_batch_size(fields, objs), 1))
+            insert = 'INSERT INTO %s (%s) ' % (
+                self.quote_name(meta.db_table), ', '.join(self.quote_name(f.column) for f in fields))
+            values = field_values(fields[1:], objs, self.connection)
+            for start in range(0, len(objs), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                params = []
+                for pk, row in zip(batch_ids, values):
+                    params.append(pk)
+                    params.extend(row)
+                cursor.execute(insert + self.bulk_insert_sql(fields, len(batch_ids)), params)
+        finally:
+            cursor.close()
+        return ids
+
     def date_extract_sql(self, lookup_type, field_name):
         """
         Given a lookup_type of 'year', 'month', 'day' or 'week_day', returns
@@ -0,0 +1,447 @@
+"""
+Run independent queries at the same time on separate connections.
+
+    totals, latest, count = connection.run_parallel([
+        Order.objects.values('region').annotate(total=Sum('amount')),
+        Order.objects.order_by('-created')[:10],
+        lambda: Order.objects.count(),
+    ], max_workers=3, timeout=30)
+
+QuerySets are evaluated into lists, callables are called. The queries of
+every batch run on one process-wide pool of threads, shared by all the
+databases, and at most `max_workers` of them at a time for one batch; the
+other queries wait for a free thread. The size of the pool is set in the
+Django settings file (8 by default):
+
+    DJANGO_PYODBC_PARALLEL_THREADS = 16
+
+A batch asking for more workers than that logs a warning. Each thread keeps its own Django
+connections from one query to the next, and lets them go the way Django
+does at the end of a request: according to CONN_MAX_AGE, or back to the
+connection pool when OPTIONS['pool'] is set. The queries don't see
+uncommitted changes of the calling thread. A batch started from one of
+these threads runs its queries one after the other in that thread.
+
+run_async() starts the same batch in the background and returns at once
+with an AsyncQueries handle, so the caller can do other work, or another
+event loop can wait for it in its executor:
+
+    batch = connection.run_async([totals_qs, latest_qs], timeout=30)
+    ...
+    totals, latest = batch.result()
+
+On timeout or cancellation the running statements are interrupted with
+Cursor.cancel(), which needs pyodbc 4 and a driver supporting SQLCancel.
+When it fails the error is logged and the connection of the worker is
+closed instead, so that the statement does not keep running on the server.
+"""
+import heapq
+import logging
+import sys
+import threading
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from django.conf import settings
+from django.db import connections, utils
+
+from django_pyodbc.compat import reraise
+from django_pyodbc.pool import PooledConnection
+
+logger = logging.getLogger('django_pyodbc')
+
+# threads running the queries of all batches in the process, unless set
+# by DJANGO_PYODBC_PARALLEL_THREADS
+MAX_THREADS = 8
+
+# whether a batch asking for more workers than there are threads was logged
+_max_workers_warned = False
+
+
+class ParallelTimeout(utils.DatabaseError):
+    """
+    Raised when the queries of run_parallel() did not finish in time.
+    """
+    pass
+
+
+class ParallelCancelled(utils.DatabaseError):
+    """
+    Raised by AsyncQueries.result() once the queries were cancelled.
+    """
+    pass
+
+
+class _Task(object):
+    """
+    Runs the queries of a batch one after the other on a thread of the
+    executor; a batch has up to `max_workers` tasks.
+    """
+    def __init__(self, batch):
+        self.batch = batch
+        self.connections = []
+        # connections closed by cancel(), whose close() may fail
+        self.aborted = []
+
+    def run(self, release=True):
+        batch = self.batch
+        try:
+            while not batch.stopped.is_set():
+                try:
+                    index, query = batch.jobs.get_nowait()
+                except Empty:
+                    return
+                # remember the connections, so that a timeout can cancel them
+                self.connections = list(connections.all())
+                try:
+                    if callable(query):
+                        result = query()
+                    else:
+                        result = list(query)
+                except Exception:
+                    batch.set_error(sys.exc_info())
+                else:
+                    batch.set_result(index, result)
+        finally:
+            self.connections = []
+            try:
+                if release:
+                    self.release()
+            finally:
+                batch.task_done()
+
+    def release(self):
+        # Keep the connections of the thread for its next task, unless
+        # Django would close them at the end of a request.
+        for connection in connections.all():
+            if connection in self.aborted:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            elif hasattr(connection, 'close_if_unusable_or_obsolete'):
+                connection.close_if_unusable_or_obsolete()
+            else:
+                # Django < 1.6
+                connection.close()
+
+    def cancel(self):
+        # Called from another thread once the batch has timed out or was
+        # cancelled.
+        for connection in self.connections:
+            ref = getattr(connection, 'last_cursor', None)
+            cursor = ref() if ref is not None else None
+            if cursor is None:
+                continue
+            try:
+                cursor.cancel()
+            except Exception:
+                logger.warning("Could not cancel the statement of a parallel query on '%s', "
+                               "closing its connection instead.", connection.alias, exc_info=True)
+                self.abort(connection)
+
+    def abort(self, connection):
+        # Close the raw connection under the running statement; Django's
+        # close() can't be called from another thread. A pooled connection
+        # fails its rollback when the task gives it back, and is dropped.
+        raw = connection.connection
+        if raw is None:
+            return
+        self.aborted.append(connection)
+        try:
+            if isinstance(raw, PooledConnection):
+                raw = raw._connection
+            raw.close()
+        except Exception:
+            logger.warning("Could not close the connection of a parallel query on '%s'.",
+                           connection.alias, exc_info=True)
+
+
+class _Batch(object):
+    """
+    Queries of one run_parallel() or run_async() call and their results.
+    """
+    def __init__(self, queries, max_workers):
+        self.size = len(queries)
+        self.jobs = Queue()
+        for job in enumerate(queries):
+            self.jobs.put(job)
+        self.values = [None] * self.size
+        self.pending = self.size
+        self.exc_info = None
+        self.stopped = threading.Event()
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self.tasks = [_Task(self) for i in range(min(max_workers, self.size))]
+        self.running = len(self.tasks)
+
+    def set_result(self, index, value):
+        with self.lock:
+            if not self.done.is_set():
+                self.values[index] = value
+                self.pending -= 1
+
+    def set_error(self, exc_info):
+        # the first error is raised once the running queries have
+        # finished, the queries not started yet are skipped
+        with self.lock:
+            if not self.done.is_set():
+                if self.exc_info is None:
+                    self.exc_info = exc_info
+                self.pending -= 1
+            self.stopped.set()
+
+    def task_done(self):
+        with self.lock:
+            self.running -= 1
+            finished = not self.running
+        if finished:
+            self.finish()
+
+    def stop(self, error_class, message):
+        """
+        Cancel the running statements, skip the queries not started yet and
+        finish the batch with `error_class`, unless it is already finished
+        or a query has failed.
+        """
+        with self.lock:
+            if self.done.is_set():
+                return False
+            self.stopped.set()
+            if self.exc_info is None:
+                try:
+                    raise error_class(message % (self.pending, self.size))
+                except error_class:
+                    self.exc_info = sys.exc_info()
+        for task in self.tasks:
+            task.cancel()
+        self.finish()
+        return True
+
+    def finish(self):
+        with self.lock:
+            if self.done.is_set():
+                return
+            self.done.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_done_callback(self, callback):
+        with self.lock:
+            if not self.done.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def result(self):
+        if self.exc_info is not None:
+            reraise(*self.exc_info)
+        return self.values
+
+
+class _Executor(object):
+    """
+    Process-wide pool of threads running the tasks of every batch, started
+    as needed up to `max_threads`.
+    """
+    def __init__(self, max_threads):
+        self.max_threads = max_threads
+        self.tasks = Queue()
+        self.threads = []
+        self.idle = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def submit(self, task):
+        with self.lock:
+            self.tasks.put(task)
+            if self.idle < self.tasks.qsize() and len(self.threads) < self.max_threads:
+                thread = threading.Thread(target=self._run, name='django_pyodbc parallel')
+                thread.daemon = True
+                self.threads.append(thread)
+                self.idle += 1
+                thread.start()
+
+    def in_thread(self):
+        return getattr(self.local, 'worker', False)
+
+    def _run(self):
+        self.local.worker = True
+        while True:
+            task = self.tasks.get()
+            with self.lock:
+                self.idle -= 1
+            try:
+                task.run()
+            except Exception:
+                logger.exception("A parallel query task failed.")
+            with self.lock:
+                self.idle += 1
+
+
+class _Timer(object):
+    """
+    One thread stopping the batches of run_async() that are past their
+    timeout.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.deadlines = []
+        self.thread = None
+
+    def add(self, deadline, batch, timeout):
+        with self.condition:
+            heapq.heappush(self.deadlines, (deadline, id(batch), batch, timeout))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='django_pyodbc parallel timer')
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                deadline, key, batch, timeout = self.deadlines[0]
+                now = time.time()
+                if deadline > now:
+                    self.condition.wait(deadline - now)
+                    continue
+                heapq.heappop(self.deadlines)
+            batch.stop(ParallelTimeout, "%%d of %%d queries did not finish within %s seconds." % timeout)
+
+
+_executor = None
+_timer = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the executor of the process, with DJANGO_PYODBC_PARALLEL_THREADS
+    threads at most.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = _Executor(getattr(settings, 'DJANGO_PYODBC_PARALLEL_THREADS', MAX_THREADS))
+    return _executor
+
+
+def _get_timer():
+    global _timer
+    if _timer is None:
+        with _lock:
+            if _timer is None:
+                _timer = _Timer()
+    return _timer
+
+
+def _start(queries, max_workers):
+    global _max_workers_warned
+    batch = _Batch(list(queries), max_workers)
+    executor = get_executor()
+    if len(batch.tasks) > executor.max_threads and not _max_workers_warned:
+        _max_workers_warned = True
+        logger.warning("A batch of parallel queries asks for %d workers, but only %d threads run "
+                       "them, shared by every batch; raise DJANGO_PYODBC_PARALLEL_THREADS to run "
+                       "more at a time.", len(batch.tasks), executor.max_threads)
+    if executor.in_thread():
+        # waiting for other threads of the executor could deadlock; the
+        # connections stay with the task running in this thread
+        for task in batch.tasks:
+            task.run(release=False)
+    else:
+        for task in batch.tasks:
+            executor.submit(task)
+    if not batch.tasks:
+        batch.finish()
+    return batch
+
+
+def run_parallel(queries, max_workers=4, timeout=None, cancelled=None):
+    """
+    Evaluate `queries` on at most `max_workers` threads and return their
+    results in the same order. The threads are those of the process-wide
+    executor, DJANGO_PYODBC_PARALLEL_THREADS (8) at most and shared by every
+    batch, so fewer than `max_workers` can be free; a warning is logged once
+    when `max_workers` is above that limit. The first error raised by a query is
+    re-raised once the running queries have finished, and the queries not
+    started yet are skipped. After `timeout` seconds the running statements
+    are cancelled and ParallelTimeout is raised; they are cancelled as well
+    once the threading.Event `cancelled` is set, raising ParallelCancelled.
+    """
+    batch = _start(queries, max_workers)
+    deadline = time.time() + timeout if timeout is not None else None
+    while not batch.done.is_set():
+        # wait in steps: a blocking wait() can't be interrupted
+        wait = 1.0 if deadline is None else max(min(deadline - time.time(), 1.0), 0)
+        if cancelled is not None:
+            if cancelled.is_set():
+                batch.stop(ParallelCancelled, "%d of %d queries were cancelled.")
+                break
+            wait = min(wait, 0.05)
+        if not batch.done.wait(wait) and deadline is not None and time.time() >= deadline:
+            batch.stop(ParallelTimeout, "%%d of %%d queries did not finish within %s seconds." % timeout)
+    return batch.result()
+
+
+class AsyncQueries(object):
+    """
+    Handle on a batch of queries started by run_async().
+    """
+    def __init__(self, queries, max_workers=4, timeout=None):
+        self._cancelled = False
+        self._batch = _start(queries, max_workers)
+        if timeout is not None and not self._batch.done.is_set():
+            _get_timer().add(time.time() + timeout, self._batch, timeout)
+
+    def done(self):
+        return self._batch.done.is_set()
+
+    def cancel(self):
+        """
+        Cancel the running statements and skip the queries not started yet.
+        Return False if the batch had already finished.
+        """
+        if not self._batch.stop(ParallelCancelled, "%d of %d queries were cancelled."):
+            return False
+        self._cancelled = True
+        return True
+
+    def cancelled(self):
+        return self._cancelled
+
+    def result(self, timeout=None):
+        """
+        Wait for the batch and return the results of the queries in order,
+        or re-raise the error of the batch. Raise ParallelTimeout if it did
+        not finish within `timeout` seconds; the queries keep running.
+        """
+        if not self._batch.done.wait(timeout):
+            raise ParallelTimeout("The queries did not finish within %s seconds." % timeout)
+        return self._batch.result()
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(handle) once the batch is finished, in the thread
+        that finishes it, or right away if it already is.
+        """
+        self._batch.add_done_callback(lambda: callback(self))
+
+
+def run_async(queries, max_workers=4, timeout=None):
+    """
+    Start evaluating `queries` like run_parallel() on the threads of the
+    executor and return an AsyncQueries handle on the results.
+    """
+    return AsyncQueries(queries, max_workers, timeout)
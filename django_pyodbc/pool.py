@@ -0,0 +1,355 @@
+"""
+Thread-safe pool of raw pyodbc connections, one pool per database alias.
+
+Pooling is enabled by adding a 'pool' dictionary to the OPTIONS of a
+database in the Django settings file:
+
+    'OPTIONS': {
+        'driver': 'EXASolution Driver',
+        'pool': {
+            'min_size': 2,          # connections kept open while idle
+            'max_size': 10,         # hard limit of open connections
+            'idle_timeout': 300,    # seconds an idle connection is kept
+            'max_lifetime': 3600,   # seconds before a connection is recycled
+            'wait_timeout': 30,     # seconds a checkout waits for a connection
+            'max_waiters': 50,      # callers allowed to wait at the same time
+            'ping_interval': 30,    # idle seconds before checkout runs a ping
+            'ping_query': 'SELECT 1',
+        },
+    }
+
+Connections are pooled per connection settings (alias, NAME, USER, HOST,
+driver...), so that a database whose NAME changes, as the test runner does,
+does not get connections to the old database. min_size connections are
+opened when the pool is created.
+
+Every checkout hands out a new PooledConnection proxy, whose close() gives
+the connection back to the pool instead of closing it, so
+DatabaseWrapper.close() works unchanged. A proxy given back is detached from
+the connection: closing it again does nothing and using it raises
+InterfaceError.
+"""
+import threading
+import time
+from collections import deque
+
+from django.db import utils
+
+DEFAULTS = {
+    'min_size': 0,
+    'max_size': 10,
+    'idle_timeout': 300,
+    'max_lifetime': 3600,
+    'wait_timeout': 30,
+    'max_waiters': None,
+    'ping_interval': 30,
+    'ping_query': 'SELECT 1',
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(utils.DatabaseError):
+    """
+    Raised when no connection could be checked out of the pool in time, or
+    when the wait queue is already full.
+    """
+    pass
+
+
+class PooledConnection(object):
+    """
+    Proxy around a raw pyodbc connection for one checkout from a
+    ConnectionPool.
+    """
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def _connection(self):
+        entry = self._entry
+        if entry is None:
+            raise utils.InterfaceError("The connection was given back to the pool.")
+        return entry.connection
+
+    def close(self):
+        """
+        Give the connection back to the pool. Does nothing if it already
+        was; the proxy can't be used afterwards.
+        """
+        self._pool.release(self)
+
+    def __getattr__(self, attr):
+        return getattr(self._connection, attr)
+
+    def __setattr__(self, attr, value):
+        # e.g. autocommit, which belongs to the connection
+        if attr.startswith('_'):
+            object.__setattr__(self, attr, value)
+        else:
+            setattr(self._connection, attr, value)
+
+
+class PoolEntry(object):
+    """
+    A raw connection of a ConnectionPool, with the times the pool expires
+    it by.
+    """
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of connections created by the `connect` callable.
+
+    Idle connections are reused in LIFO order so that the warmest connection
+    is handed out first and the others can expire after `idle_timeout`.
+    """
+    def __init__(self, connect, min_size=0, max_size=10, idle_timeout=300,
+                 max_lifetime=3600, wait_timeout=30, max_waiters=None,
+                 ping_interval=30, ping_query='SELECT 1'):
+        if max_size < 1 or min_size > max_size:
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured("The connection pool needs 0 <= min_size <= max_size and max_size >= 1.")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.max_waiters = max_waiters
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+
+        self._idle = deque()
+        self._size = 0
+        self._waiters = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # counters
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.discards = 0
+        self.wait_time = 0.0
+        self.checkout_time = 0.0
+        self.max_checkout_time = 0.0
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening a new one if the pool is
+        not full yet and waiting for one to be released otherwise.
+        """
+        start = time.time()
+        with self._lock:
+            self._prune()
+            entry = None
+            while entry is None:
+                if self._idle:
+                    entry = self._idle.pop()
+                    if self._expired(entry, start):
+                        self._discard(entry)
+                        entry = None
+                        continue
+                elif self._size < self.max_size:
+                    # reserve the slot before connecting outside of the lock
+                    self._size += 1
+                    break
+                else:
+                    self._wait(start)
+
+        if entry is None:
+            try:
+                entry = self._open()
+            except:
+                with self._lock:
+                    self._size -= 1
+                    self._available.notify()
+                raise
+        elif not self._is_alive(entry, start):
+            with self._lock:
+                self._discard(entry)
+            return self.acquire()
+
+        now = time.time()
+        entry.last_used = now
+        elapsed = now - start
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_time += elapsed
+            self.max_checkout_time = max(self.max_checkout_time, elapsed)
+        return PooledConnection(self, entry)
+
+    def release(self, pooled):
+        """
+        Give a checked out connection back to the pool. Any open transaction
+        is rolled back first; connections that fail to roll back or are past
+        their lifetime are closed instead. Releasing a connection that was
+        already given back does nothing.
+        """
+        with self._lock:
+            # detach the proxy, so that it can neither be released twice
+            # nor used once another caller checks the connection out
+            entry, pooled._entry = pooled._entry, None
+        if entry is None:
+            return
+        now = time.time()
+        keep = now - entry.created_at < self.max_lifetime
+        if keep:
+            try:
+                entry.connection.rollback()
+            except Exception:
+                keep = False
+        with self._lock:
+            if keep:
+                entry.last_used = now
+                self._idle.append(entry)
+            else:
+                self._discard(entry)
+            self._available.notify()
+
+    def fill(self):
+        """
+        Open idle connections until the pool holds min_size connections.
+        """
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except:
+                with self._lock:
+                    self._size -= 1
+                    self._available.notify()
+                raise
+            with self._lock:
+                self._idle.appendleft(entry)
+                self._available.notify()
+
+    def close_all(self):
+        """
+        Close every idle connection. Connections currently checked out are
+        closed when they are released past their lifetime.
+        """
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._available.notify_all()
+
+    def stats(self):
+        """
+        Return a snapshot of the pool size and of its counters.
+        """
+        with self._lock:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiters,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'discards': self.discards,
+                'wait_time': self.wait_time,
+                'checkout_time': self.checkout_time,
+                'max_checkout_time': self.max_checkout_time,
+            }
+
+    def _open(self):
+        connection = self.connect()
+        with self._lock:
+            self.connects += 1
+        return PoolEntry(connection)
+
+    def _prune(self):
+        # Called with the lock held: expire idle connections beyond
+        # min_size, oldest first.
+        now = time.time()
+        while len(self._idle) > self.min_size and self._idle[0].last_used + self.idle_timeout < now:
+            self._discard(self._idle.popleft())
+
+    def _wait(self, start):
+        # Called with the lock held: block until a connection is released
+        # or raise PoolTimeout.
+        if self.max_waiters is not None and self._waiters >= self.max_waiters:
+            self.timeouts += 1
+            raise PoolTimeout("Connection pool wait queue is full (%d waiters)." % self._waiters)
+        remaining = self.wait_timeout - (time.time() - start)
+        if remaining <= 0:
+            self.timeouts += 1
+            raise PoolTimeout("Timed out after %.1f seconds waiting for a pooled connection." % self.wait_timeout)
+        self._waiters += 1
+        waited = time.time()
+        try:
+            self._available.wait(remaining)
+        finally:
+            self._waiters -= 1
+            self.wait_time += time.time() - waited
+
+    def _expired(self, entry, now):
+        return (now - entry.created_at >= self.max_lifetime or
+                (self._size > self.min_size and now - entry.last_used >= self.idle_timeout))
+
+    def _is_alive(self, entry, now):
+        # Only connections that have been idle for a while pay for a round trip.
+        if self.ping_interval is None or now - entry.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = entry.connection.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, entry):
+        # Called with the lock held.
+        self._size -= 1
+        self.discards += 1
+        connection, entry.connection = entry.connection, None
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(key, connect=None, options=None):
+    """
+    Return the pool of the connection settings `key`, creating it with
+    `connect` and the pool `options` from the settings on first use, and
+    opening its min_size connections.
+    """
+    pool = _pools.get(key)
+    if pool is None and connect is not None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            created = pool is None
+            if created:
+                config = dict(DEFAULTS)
+                config.update(options or {})
+                pool = _pools[key] = ConnectionPool(connect, **config)
+        if created:
+            pool.fill()
+    return pool
+
+
+def close_pools():
+    """
+    Close the idle connections of every pool, e.g. before forking workers.
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
@@ -0,0 +1,155 @@
+"""
+Read-ahead of pyodbc result sets in a helper thread.
+
+pyodbc releases the GIL while it waits on the network, so a helper thread
+can fetch the next batch of rows while the caller is still converting the
+current one. Enabled per database with OPTIONS['prefetch'] = True; the
+number of batches fetched ahead is OPTIONS['prefetch_depth'] (default 2).
+The helper thread only starts once a result set has returned
+OPTIONS['fetch_batch_size'] rows and has more to come. pyodbc connections
+can't be used by two threads at once, so the helper threads of a connection
+are stopped before it runs another statement, commits or rolls back, e.g.
+when a related object is loaded while iterating over a QuerySet; the cursor
+then reads the rest of its result set itself.
+"""
+import sys
+import threading
+
+try:
+    from Queue import Queue, Empty, Full
+except ImportError:
+    from queue import Queue, Empty, Full
+
+from django_pyodbc.compat import reraise
+
+
+class Prefetcher(object):
+    """
+    Cursor-like reader that fetches `batch_size` rows at a time from
+    `cursor` in a helper thread, keeping at most `depth` batches queued.
+
+    Errors raised by the driver in the helper thread are re-raised by the
+    fetch call that would have returned the rows. close() must be called
+    before the cursor is used for anything else.
+    """
+    def __init__(self, cursor, batch_size, depth=2):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self._queue = Queue(maxsize=max(depth, 1))
+        self._stopped = threading.Event()
+        self._buffer = []
+        self._exhausted = False
+        # batches read by the helper thread before detach(), then None
+        # once they are handed out
+        self._detached = None
+        # the batch the helper thread could not queue once stopped
+        self._unqueued = None
+        self._thread = threading.Thread(target=self._run, name='django_pyodbc prefetch')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                rows = self.cursor.fetchmany(self.batch_size)
+                if not self._put(rows):
+                    self._unqueued = rows
+                    return
+                if not rows:
+                    return
+        except BaseException:
+            failure = _Failure(sys.exc_info())
+            if not self._put(failure):
+                self._unqueued = failure
+
+    def _put(self, item):
+        # Wait for room in the queue, giving up once close() was called.
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.05)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _next_batch(self):
+        if self._detached is not None:
+            if self._detached:
+                item = self._detached.pop(0)
+            else:
+                # read by the calling thread from now on
+                item = self.cursor.fetchmany(self.batch_size)
+        else:
+            item = self._queue.get()
+        if isinstance(item, _Failure):
+            self._exhausted = True
+            reraise(*item.exc_info)
+        if not item:
+            self._exhausted = True
+        return item
+
+    def fetchmany(self, size):
+        rows = self._buffer
+        while len(rows) < size and not self._exhausted:
+            rows.extend(self._next_batch())
+        self._buffer = rows[size:]
+        return rows[:size]
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        if rows:
+            return rows[0]
+        return None
+
+    def fetchall(self):
+        rows = self._buffer
+        self._buffer = []
+        while not self._exhausted:
+            rows.extend(self._next_batch())
+        return rows
+
+    def detach(self):
+        """
+        Stop the helper thread and wait until it no longer uses the cursor,
+        keeping the rows it has read; the next fetches read the rest of the
+        result set in the calling thread.
+        """
+        if self._detached is not None or self._exhausted:
+            return
+        self._stopped.set()
+        batches = []
+        while self._thread.is_alive():
+            # unblock a helper waiting for room in the queue
+            try:
+                batches.append(self._queue.get_nowait())
+            except Empty:
+                self._thread.join(0.05)
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except Empty:
+                break
+        if self._unqueued is not None:
+            batches.append(self._unqueued)
+            self._unqueued = None
+        self._detached = batches
+
+    def close(self):
+        """
+        Stop the helper thread and wait until it no longer uses the cursor.
+        """
+        self._stopped.set()
+        while self._thread.is_alive():
+            # unblock a helper waiting for room in the queue
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                pass
+            self._thread.join(0.05)
+        self._buffer = []
+        self._exhausted = True
+
+
+class _Failure(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
@@ -0,0 +1,232 @@
+"""
+Cache of the SQL compiled for QuerySets, keyed on the structure of the query.
+
+Applications build the same QuerySets with different values over and over
+again. With the cache, SQLCompiler.as_sql() looks up the SQL compiled for a
+query of the same structure (model, tables and joins, selected columns,
+lookups and the shape of their values, ordering, slicing) and only extracts
+the parameters from the lookups of the WHERE clause, in the order they are
+compiled, instead of compiling the query again.
+
+It is enabled by setting the number of templates kept per database in the
+OPTIONS of a database in the Django settings file:
+
+    'OPTIONS': {
+        'query_cache_size': 512,
+    }
+
+The cache needs Django 1.8 or later; the option is ignored on older versions.
+Queries with extra(), annotations, aggregates, GROUP BY, subqueries, custom
+expressions or an empty slice are compiled as usual. A QuerySet of PyodbcQuerySet can
+skip the cache with bypass_query_cache(). get_query_cache(alias).info()
+returns the hits, misses and hit rate; with OPTIONS['metrics'] they are
+also counted in django_pyodbc_query_cache_total.
+"""
+import threading
+
+try:
+    from django.db.models.expressions import Col
+except ImportError:
+    # Django < 1.8, whose queries are not keyed on their structure
+    Col = None
+try:
+    from django.db.models.lookups import Lookup
+except ImportError:
+    Lookup = None
+from django.db.models.fields import Field
+from django.db.models.sql.where import WhereNode
+
+from django_pyodbc.compat import string_types
+from django_pyodbc.lru import LRUCache
+
+# the built-in lookups of the fields, whose parameters are the ones of
+# process_rhs(); Django 1.9 dropped default_lookups for the lookups
+# registered on Field, which are also there on earlier versions
+BUILTIN_LOOKUPS = frozenset(
+    lookup for lookup in getattr(Field, 'class_lookups', {}).values()
+    if Lookup is not None and isinstance(lookup, type) and issubclass(lookup, Lookup) and
+    lookup.__module__ == Lookup.__module__
+)
+
+# whether the cache can be used with this version of Django
+SUPPORTED = Col is not None
+
+# lookups whose value is always sent as one parameter, so that only its
+# type is part of the key; the values of other lookups are part of the key
+PARAMETER_LOOKUPS = frozenset([
+    'exact', 'iexact', 'gt', 'gte', 'lt', 'lte', 'contains', 'icontains',
+    'startswith', 'istartswith', 'endswith', 'iendswith', 'range',
+])
+
+# template of the queries whose parameters did not match their template,
+# which are compiled every time
+REJECTED = (None, None)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class Uncacheable(Exception):
+    pass
+
+
+class QueryTemplateCache(object):
+    """
+    SQL and number of parameters compiled for queries, by query_key().
+    """
+    def __init__(self, maxsize=512, metrics=None):
+        self.templates = LRUCache(maxsize)
+        self.metrics = metrics
+        # queries the cache does not handle, templates whose number of
+        # parameters did not match the parameters extracted, and lookups of
+        # those templates, which are not hits
+        self.uncacheable = 0
+        self.rejected = 0
+        self.rejected_lookups = 0
+
+    def get(self, key):
+        template = self.templates.get(key)
+        if template is REJECTED:
+            self.rejected_lookups += 1
+            self.skip()
+        elif self.metrics is not None:
+            self.metrics.query_cache(template is None and 'miss' or 'hit')
+        return template
+
+    def set(self, key, sql, params):
+        self.templates.set(key, (sql, len(params)))
+
+    def skip(self):
+        self.uncacheable += 1
+        if self.metrics is not None:
+            self.metrics.query_cache('uncacheable')
+
+    def reject(self, key):
+        # the lookup that found the template was not a hit either
+        self.rejected += 1
+        self.rejected_lookups += 1
+        self.templates.set(key, REJECTED)
+
+    def info(self):
+        info = self.templates.info()
+        info['hits'] -= self.rejected_lookups
+        info['uncacheable'] = self.uncacheable
+        info['rejected'] = self.rejected
+        lookups = info['hits'] + info['misses']
+        info['hit_rate'] = float(info['hits']) / lookups if lookups else None
+        return info
+
+
+def get_query_cache(alias, maxsize=None, metrics=None):
+    """
+    Return the template cache of the database `alias`, shared by its
+    connections in every thread, creating it with `maxsize` templates.
+    Return None on versions of Django the cache does not support.
+    """
+    if not SUPPORTED:
+        return None
+    cache = _caches.get(alias)
+    if cache is None and maxsize:
+        with _caches_lock:
+            cache = _caches.get(alias)
+            if cache is None:
+                cache = _caches[alias] = QueryTemplateCache(maxsize, metrics)
+    return cache
+
+
+def query_key(query, *flags):
+    """
+    Return the structural key of `query`, or None when the SQL of the query
+    can depend on more than the key holds.
+    """
+    if (query.extra or query.annotations or query.extra_tables or query.extra_order_by or
+            query.group_by is not None or query.select_for_update or
+            getattr(query, 'having', None) and query.having.children):
+        return None
+    try:
+        tables = tuple(_join_key(query, alias) for alias in query.tables if query.alias_refcount[alias])
+        select = tuple(_col_key(col) for col in query.select)
+        if any(not isinstance(field, string_types) for field in query.order_by):
+            return None
+        return (
+            flags, query.model, tables, tuple(sorted(query.external_aliases)), select,
+            query.default_cols, _freeze(query.select_related), query.distinct,
+            tuple(query.distinct_fields), tuple(query.order_by), query.default_ordering,
+            query.standard_ordering, query.low_mark, query.high_mark,
+            frozenset(query.deferred_loading[0]), query.deferred_loading[1],
+            _where_key(query.where),
+        )
+    except Uncacheable:
+        return None
+
+
+def _join_key(query, alias):
+    join = query.alias_map[alias]
+    if join.join_type is None:
+        return (alias, join.table_name)
+    if join.join_field.get_extra_restriction(query.where_class, alias, join.parent_alias) is not None:
+        raise Uncacheable
+    return (alias, join.table_name, join.parent_alias, join.join_type, join.join_cols, join.nullable)
+
+
+def _col_key(col):
+    if type(col) is not Col:
+        raise Uncacheable
+    target, output_field = col.target, col.output_field
+    return (col.alias, target.model, target.attname,
+            getattr(output_field, 'model', None), getattr(output_field, 'attname', None))
+
+
+def _where_key(node):
+    if isinstance(node, WhereNode) and type(node) is not WhereNode:
+        # EmptyWhere and other subclasses
+        raise Uncacheable
+    children = []
+    for child in node.children:
+        if type(child) is WhereNode:
+            children.append(_where_key(child))
+        elif type(child) in BUILTIN_LOOKUPS:
+            children.append(_lookup_key(child))
+        else:
+            raise Uncacheable
+    return (node.connector, node.negated, tuple(children))
+
+
+def _lookup_key(lookup):
+    if not lookup.rhs_is_direct_value() or lookup.bilateral_transforms:
+        raise Uncacheable
+    rhs = lookup.rhs
+    if lookup.lookup_name == 'in':
+        if not rhs:
+            # compiled as nothing at all, see EmptyResultSet
+            raise Uncacheable
+        value = len(rhs)
+    elif lookup.lookup_name in PARAMETER_LOOKUPS:
+        value = type(rhs)
+    else:
+        value = ('value', rhs)
+        try:
+            hash(value)
+        except TypeError:
+            raise Uncacheable
+    return (type(lookup), _col_key(lookup.lhs), value)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def where_params(node, compiler, connection):
+    """
+    Return the parameters of the WHERE clause `node` in the order in which
+    they are compiled, without compiling the SQL of the lookups.
+    """
+    params = []
+    for child in node.children:
+        if isinstance(child, WhereNode):
+            params.extend(where_params(child, compiler, connection))
+        else:
+            params.extend(child.process_rhs(compiler, connection)[1])
+    return params
@@ -0,0 +1,144 @@
+"""
+QuerySet and Manager with the bulk operations specific to this backend.
+
+    class Measurement(models.Model):
+        ...
+        objects = PyodbcManager()
+
+    Measurement.objects.bulk_create(measurements, method='import')
+    Measurement.objects.bypass_query_cache().filter(...)
+    Measurement.objects.values('sensor', 'value').fetch_columns()
+"""
+import sys
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Manager
+from django.db.models.query import QuerySet
+
+from django_pyodbc.bulk import default_import_fields
+from django_pyodbc.operations import TRANSACTION_COLLISION
+
+
+class PyodbcQuerySet(QuerySet):
+    # compile the SQL of this QuerySet without the query cache
+    _bypass_query_cache = False
+
+    def bypass_query_cache(self):
+        """
+        Returns a new QuerySet whose SQL is always compiled, not taken from
+        the query cache of the database (see django_pyodbc.querycache).
+        """
+        clone = self._clone()
+        clone._bypass_query_cache = True
+        clone.query.bypass_query_cache = True
+        return clone
+
+    def fetch_columns(self, batch_size=None):
+        """
+        Evaluates the QuerySet into one NumPy masked array per selected
+        column, in an OrderedDict keyed on the column names (see
+        django_pyodbc.columnar).
+        """
+        from django_pyodbc.columnar import fetch_queryset_columns
+        return fetch_queryset_columns(self, batch_size)
+
+    def _clone(self, *args, **kwargs):
+        clone = super(PyodbcQuerySet, self)._clone(*args, **kwargs)
+        if self._bypass_query_cache:
+            # Query.clone() copies only the attributes it knows about
+            clone._bypass_query_cache = True
+            clone.query.bypass_query_cache = True
+        return clone
+
+    def bulk_create(self, objs, batch_size=None, method=None):
+        """
+        Inserts each of the instances into the database like
+        QuerySet.bulk_create(). With method='import', the objects are
+        streamed to the server with a single IMPORT statement instead of
+        batched INSERTs (see DatabaseOperations.bulk_import). With
+        OPTIONS['bulk_return_ids'], the INSERTs also set the primary keys of
+        the objects created.
+        """
+        if method in (None, 'insert'):
+            self._for_write = True
+            if connections[self.db].bulk_return_ids and self.model._meta.has_auto_field:
+                return self._bulk_create_returning_ids(objs, batch_size)
+            return super(PyodbcQuerySet, self).bulk_create(objs, batch_size=batch_size)
+        if method != 'import':
+            raise ValueError("Unknown bulk_create method %r, use 'insert' or 'import'." % (method,))
+        if self.model._meta.parents:
+            raise ValueError("Can't bulk create an inherited model")
+        if not objs:
+            return objs
+        connection = connections[self.db]
+        fields = self.model._meta.local_concrete_fields
+        objs_with_pk = [o for o in objs if o.pk is not None]
+        objs_without_pk = [o for o in objs if o.pk is None]
+        if objs_with_pk:
+            connection.ops.bulk_import(self.model, objs_with_pk, fields=fields)
+        if objs_without_pk:
+            connection.ops.bulk_import(self.model, objs_without_pk,
+                                       fields=default_import_fields(self.model))
+        return objs
+
+    def _bulk_create_returning_ids(self, objs, batch_size=None):
+        """
+        bulk_create() with batched INSERTs that also sets the primary keys
+        of the objects inserted without one, as configured by
+        OPTIONS['bulk_return_ids'] (see
+        DatabaseOperations.bulk_insert_returning_ids). Outside of a
+        transaction, the insert starts over up to
+        OPTIONS['bulk_collision_retries'] times when it collides with a
+        concurrent one.
+        """
+        if self.model._meta.parents:
+            raise ValueError("Can't bulk create an inherited model")
+        if not objs:
+            return objs
+        self._for_write = True
+        connection = connections[self.db]
+        meta = self.model._meta
+        objs = list(objs)
+        objs_with_pk = [o for o in objs if o.pk is not None]
+        objs_without_pk = [o for o in objs if o.pk is None]
+        # a collision rolls back the whole transaction, so it can only be
+        # retried when it is ours
+        retries = 0 if connection.in_atomic_block else connection.bulk_collision_retries
+        while True:
+            try:
+                with transaction.atomic(using=self.db, savepoint=False):
+                    if objs_with_pk:
+                        self._batched_insert(objs_with_pk, meta.local_concrete_fields, batch_size)
+                    if objs_without_pk:
+                        ids = connection.ops.bulk_insert_returning_ids(
+                            self.model, objs_without_pk, default_import_fields(self.model), batch_size)
+                        if len(ids) != len(objs_without_pk):
+                            raise DatabaseError('Inserted %d objects but got %d primary keys.' % (
+                                len(objs_without_pk), len(ids)))
+                break
+            except DatabaseError:
+                e = sys.exc_info()[1]
+                if not retries or not e.args or e.args[0] != TRANSACTION_COLLISION:
+                    raise
+                retries -= 1
+        if objs_without_pk:
+            for obj, pk in zip(objs_without_pk, ids):
+                setattr(obj, meta.pk.attname, pk)
+                obj._state.adding = False
+                obj._state.db = self.db
+        return objs
+
+
+class PyodbcManager(Manager):
+
+    def bypass_query_cache(self):
+        return self.get_queryset().bypass_query_cache()
+
+    def fetch_columns(self, batch_size=None):
+        return self.get_queryset().fetch_columns(batch_size)
+
+    def get_queryset(self):
+        return PyodbcQuerySet(self.model, using=self._db)
+
+    # Django < 1.6
+    get_query_set = get_queryset
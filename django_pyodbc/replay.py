@@ -0,0 +1,399 @@
+"""
+Capture of the statements run by CursorWrapper, and a driver replaying them
+without a database.
+
+Capture is enabled per database in the Django settings file:
+
+    'OPTIONS': {
+        'capture': {'path': '/tmp/orders.capture', 'results': True},
+    }
+
+Every statement is appended to the log as one line of JSON:
+
+    ts      start time (seconds since the epoch)
+    alias   database alias
+    fp      fingerprint of the statement, see django_pyodbc.fingerprint
+    sql     the statement, with %s placeholders
+    params  its parameters; for executemany the first row only
+    many    number of parameter rows of an executemany batch
+    dur     execution time in seconds
+    count   cursor.rowcount
+    rows    rows fetched from the result set
+    shape   (name, type, size) of the result columns, with 'results' only,
+            written once per fingerprint
+    err     class of the error raised, if any
+
+Parameters of types JSON lacks are tagged: {"$dt": iso} for datetimes,
+"$d" dates, "$t" times, "$dec" decimals and "$b" base64 encoded bytes.
+
+The log is replayed with a ReplayConnection standing in for the pyodbc
+connection of a database:
+
+    'OPTIONS': {
+        'replay': {'path': '/tmp/orders.capture', 'speed': 0},
+    }
+
+or on its own, to time the backend against the trace:
+
+    from django_pyodbc.replay import replay
+    replay('/tmp/orders.capture', speed=2.0)
+
+Statements are matched by fingerprint, in the order of the log; once the
+entries of a fingerprint are used up the last one is repeated. Each one
+takes its recorded time divided by `speed` (0 to not wait at all) and
+returns as many rows as were fetched, with values made up from the shape.
+"""
+import atexit
+import base64
+import codecs
+import datetime
+import decimal
+import json
+import numbers
+import os
+import threading
+import time
+from collections import deque
+
+from django_pyodbc.compat import _py3, binary_type, string_types, text_type
+from django_pyodbc.fingerprint import fingerprint
+
+_capture_logs = {}
+_capture_lock = threading.Lock()
+
+
+def encode_value(value):
+    """
+    Return `value` as a value JSON can represent.
+    """
+    if value is None or isinstance(value, (bool, text_type)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, float):
+        return value
+    if isinstance(value, datetime.datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'$t': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$dec': str(value)}
+    if isinstance(value, binary_type) and not _py3:
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    if isinstance(value, (binary_type, bytearray)):
+        return {'$b': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return text_type(value)
+
+
+def decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    tag, text = list(value.items())[0]
+    if tag == '$dt':
+        return parse_datetime(text)
+    if tag == '$d':
+        return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+    if tag == '$t':
+        return parse_datetime('2000-01-01T' + text).time()
+    if tag == '$dec':
+        return decimal.Decimal(text)
+    if tag == '$b':
+        return bytearray(base64.b64decode(text.encode('ascii')))
+    raise ValueError('Unknown parameter tag %r in the capture log' % tag)
+
+
+def parse_datetime(text):
+    if '.' in text:
+        return datetime.datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime.datetime.strptime(text, '%Y-%m-%dT%H:%M:%S')
+
+
+def result_shape(description):
+    return [(column[0], getattr(column[1], '__name__', None), column[3]) for column in description]
+
+
+class CaptureLog(object):
+    """
+    Append-only log of statements in a file, shared by the connections
+    capturing to the same path. Each entry is written in one write() of
+    the file opened for appending, so that processes can share the file.
+    """
+    def __init__(self, path, results=False):
+        self.path = path
+        self.results = results
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # fingerprints whose result shape is in the log
+        self.shapes = set()
+        self._lock = threading.Lock()
+
+    def entry(self, cursor, start, duration, params, batches, error=None):
+        """
+        Return the entry of the statement just run by the CursorWrapper
+        `cursor`; its rows are counted until the result set is exhausted.
+        """
+        sql = cursor.last_sql
+        entry = {
+            'ts': round(start, 6),
+            'alias': cursor.db and cursor.db.alias,
+            'fp': fingerprint(sql),
+            'sql': sql,
+            'dur': round(duration, 6),
+        }
+        if batches:
+            entry['many'] = len(params)
+            params = params[0] if params else ()
+        entry['params'] = [encode_value(value) for value in params]
+        if error is not None:
+            entry['err'] = error.__class__.__name__
+            return entry
+        entry['count'] = getattr(cursor.cursor, 'rowcount', -1)
+        entry['rows'] = 0
+        if self.results and not batches and entry['fp'] not in self.shapes:
+            description = getattr(cursor.cursor, 'description', None)
+            if description:
+                entry['shape'] = result_shape(description)
+                self.shapes.add(entry['fp'])
+        return entry
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'), sort_keys=True) + '\n'
+        with self._lock:
+            if self.fd is not None:
+                os.write(self.fd, line.encode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+def get_capture_log(options):
+    """
+    Return the CaptureLog for the 'capture' OPTIONS of a database, a dict
+    with the path of the log and 'results' to record the result shapes.
+    """
+    if isinstance(options, string_types):
+        options = {'path': options}
+    path = os.path.abspath(options['path'])
+    with _capture_lock:
+        log = _capture_logs.get(path)
+        if log is None:
+            log = _capture_logs[path] = CaptureLog(path, options.get('results', False))
+        return log
+
+
+@atexit.register
+def close_capture_logs():
+    with _capture_lock:
+        logs = list(_capture_logs.values())
+        _capture_logs.clear()
+    for log in logs:
+        log.close()
+
+
+def read_log(path):
+    """
+    Yield the entries of the capture log at `path`, with decoded parameters.
+    """
+    with codecs.open(path, 'r', 'utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry['params'] = tuple(decode_value(value) for value in entry['params'])
+            yield entry
+
+
+def make_value(type_name, size, i):
+    """
+    Return a value of the column type `type_name` for the row `i`.
+    """
+    if type_name in ('int', 'long'):
+        return i
+    if type_name == 'float':
+        return float(i)
+    if type_name == 'Decimal':
+        return decimal.Decimal(i)
+    if type_name == 'bool':
+        return i % 2 == 0
+    if type_name == 'datetime':
+        return datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=i)
+    if type_name == 'date':
+        return datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 10000)
+    if type_name == 'time':
+        return datetime.time(i // 3600 % 24, i // 60 % 60, i % 60)
+    if type_name in ('bytearray', 'bytes', 'buffer'):
+        return bytearray(b'x' * min(size or 16, 64))
+    if type_name in ('str', 'unicode'):
+        value = text_type(i)
+        return value + u'x' * (min(size or 16, 64) - len(value))
+    return None
+
+
+class ReplayConnection(object):
+    """
+    Stands in for a pyodbc connection, answering the statements of a
+    capture log.
+    """
+    def __init__(self, entries, speed=1.0):
+        if isinstance(entries, string_types):
+            entries = read_log(entries)
+        self.speed = speed
+        self.entries = {}
+        self.shapes = {}
+        for entry in entries:
+            self.entries.setdefault(entry['fp'], deque()).append(entry)
+            if 'shape' in entry:
+                self.shapes[entry['fp']] = entry['shape']
+        # statements absent from the log, answered with an empty result
+        self.misses = 0
+        self.autocommit = False
+        self._lock = threading.Lock()
+
+    def next_entry(self, sql):
+        if isinstance(sql, binary_type):
+            sql = sql.decode('utf-8')
+        key = fingerprint(sql)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            if len(entries) > 1:
+                return entries.popleft()
+            return entries[0]
+
+    def cursor(self):
+        return ReplayCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayCursor(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+        self.types = ()
+        self.rows = 0
+        self.position = 0
+
+    def execute(self, sql, *params):
+        return self._execute(sql)
+
+    def executemany(self, sql, params_list):
+        self._execute(sql)
+        self.description = None
+
+    def _execute(self, sql):
+        entry = self.connection.next_entry(sql)
+        self.description = None
+        self.rowcount = -1
+        self.rows = self.position = 0
+        if entry is None:
+            return self
+        speed = self.connection.speed
+        if speed and entry['dur']:
+            time.sleep(entry['dur'] / speed)
+        if 'err' in entry:
+            from django_pyodbc.base import Database
+            raise Database.Error('Replayed %s' % entry['err'])
+        self.rowcount = entry.get('count', -1)
+        shape = self.connection.shapes.get(entry['fp'])
+        if shape:
+            self.description = [(name, None, None, size, None, None, True) for name, type_name, size in shape]
+            self.types = [(type_name, size) for name, type_name, size in shape]
+            self.rows = entry.get('rows', 0)
+        return self
+
+    def fetchmany(self, size=1):
+        count = min(size, self.rows - self.position)
+        start, self.position = self.position, self.position + count
+        return [tuple(make_value(type_name, size, i) for type_name, size in self.types)
+                for i in range(start, start + count)]
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        if rows:
+            return rows[0]
+        return None
+
+    def fetchall(self):
+        return self.fetchmany(self.rows - self.position)
+
+    def nextset(self):
+        self.description = None
+        self.rows = self.position = 0
+        return False
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def replay(path, speed=1.0, paced=False, using=None):
+    """
+    Run the statements of the capture log at `path` through a CursorWrapper
+    on a ReplayConnection and fetch their rows, and return statistics of
+    the run. With `paced` the statements start at their recorded times,
+    scaled by `speed`. With `using`, the cursors of that database are used
+    instead, e.g. one with a 'replay' option and the OPTIONS under test.
+    """
+    from django_pyodbc.base import CursorWrapper
+    entries = list(read_log(path))
+    if using is None:
+        connection = ReplayConnection(entries, speed)
+
+        def get_cursor():
+            return CursorWrapper(connection.cursor(), 'utf-8')
+    else:
+        from django.db import connections
+        connection = None
+        get_cursor = connections[using].cursor
+    stats = {'statements': 0, 'rows': 0, 'errors': 0,
+             'recorded_seconds': sum(entry['dur'] for entry in entries)}
+    start = time.time()
+    first = entries[0]['ts'] if entries else 0
+    for entry in entries:
+        if paced and speed:
+            delay = (entry['ts'] - first) / speed - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+        cursor = get_cursor()
+        try:
+            if 'many' in entry:
+                cursor.executemany(entry['sql'], [entry['params']] * entry['many'])
+            else:
+                cursor.execute(entry['sql'], entry['params'])
+                if cursor.description:
+                    rows = cursor.fetchmany_raw(1000)
+                    while rows:
+                        stats['rows'] += len(rows)
+                        rows = cursor.fetchmany_raw(1000)
+        except Exception:
+            stats['errors'] += 1
+        finally:
+            cursor.close()
+        stats['statements'] += 1
+    stats['seconds'] = time.time() - start
+    stats['misses'] = connection.misses if connection is not None else None
+    return stats
@@ -0,0 +1,155 @@
+"""
+Logging of slow statements, optionally with their Exasol profile.
+
+Enabled per database in the Django settings file:
+
+    'OPTIONS': {
+        'slow_query_threshold': 1.0,    # seconds
+        'slow_query_profile': True,     # re-run slow SELECTs with profiling
+    }
+
+Statements taking longer than the threshold are logged as warnings by the
+'django_pyodbc.slow_queries' logger with their SQL, parameters, duration and
+row count; the values are also available as attributes of the log record
+(sql, params, duration, rowcount, profile). A SELECT is logged once its
+result set is exhausted or closed, with the number of rows fetched; other
+statements right away, with cursor.rowcount.
+
+With slow_query_profile, a slow SELECT is run a second time with
+ALTER SESSION SET PROFILE='ON' and the parts of its profile are read from
+EXA_USER_PROFILE_LAST_DAY after FLUSH STATISTICS. This happens on a
+connection of its own, in a helper thread, and the statement is logged from
+there once profiled; when more than PROFILE_QUEUE_SIZE statements wait for
+their profile, the next ones are logged without one. Other statements are
+not run twice.
+"""
+import logging
+import sys
+import threading
+
+try:
+    from Queue import Full, Queue
+except ImportError:
+    from queue import Full, Queue
+
+from django_pyodbc.metrics import statement_kind
+
+logger = logging.getLogger('django_pyodbc.slow_queries')
+
+PROFILE_COLUMNS = ('PART_ID', 'PART_NAME', 'PART_INFO', 'OBJECT_NAME', 'OBJECT_ROWS',
+                   'OUT_ROWS', 'DURATION', 'CPU', 'TEMP_DB_RAM_PEAK')
+
+PROFILE_SQL = ('SELECT %s FROM EXA_USER_PROFILE_LAST_DAY'
+               ' WHERE SESSION_ID = CURRENT_SESSION AND STMT_ID = ? ORDER BY PART_ID'
+               % ', '.join(PROFILE_COLUMNS))
+
+
+# slow statements waiting for their profile
+PROFILE_QUEUE_SIZE = 16
+
+_profile_queue = None
+_profile_lock = threading.Lock()
+
+
+def profile_statement(connection, sql, params):
+    """
+    Run `sql` again on the raw pyodbc `connection` with profiling switched
+    on and return the parts of its profile as a list of dicts.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("ALTER SESSION SET PROFILE = 'ON'")
+        try:
+            cursor.execute(sql, params)
+            while cursor.fetchmany(10000):
+                pass
+            # statements are numbered within the session
+            cursor.execute('SELECT CURRENT_STATEMENT')
+            stmt_id = cursor.fetchone()[0] - 1
+        finally:
+            cursor.execute("ALTER SESSION SET PROFILE = 'OFF'")
+        cursor.execute('FLUSH STATISTICS')
+        cursor.execute(PROFILE_SQL, (stmt_id,))
+        return [dict(zip(PROFILE_COLUMNS, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def format_profile(profile):
+    lines = []
+    for part in profile:
+        lines.append('  %(PART_ID)3s %(PART_NAME)-20s %(OBJECT_NAME)-30s rows=%(OUT_ROWS)s duration=%(DURATION)s'
+                     % dict((key, '' if value is None else value) for key, value in part.items()))
+    return '\n'.join(lines)
+
+
+class SlowQuery(object):
+    """
+    A slow statement run by the CursorWrapper `cursor`, with the SQL `sql`
+    sent to the driver. `rows` counts the rows fetched from its result set.
+    """
+    def __init__(self, cursor, sql, params, duration, profile=False):
+        self.sql = cursor.last_sql
+        self.driver_sql = sql
+        self.params = params
+        self.duration = duration
+        self.rowcount = getattr(cursor.cursor, 'rowcount', None)
+        self.rows = 0
+        # opens the connection the statement is profiled on
+        self.connect = None
+        if profile and cursor.db is not None and statement_kind(self.sql) == 'select':
+            self.connect = cursor.db._get_connect()
+
+    def log(self, rowcount, parts=None):
+        message = 'Slow query (%.3f s, %s rows): %s; params=%r' % (self.duration, rowcount, self.sql, self.params)
+        if parts:
+            message += '\n' + format_profile(parts)
+        logger.warning(message, extra={
+            'sql': self.sql,
+            'params': self.params,
+            'duration': self.duration,
+            'rowcount': rowcount,
+            'profile': parts,
+        })
+
+
+def log_slow_query(slow, fetched=False):
+    """
+    Log the SlowQuery `slow`, with the rows fetched from its result set if
+    `fetched`, once its profile is read if it needs one.
+    """
+    rowcount = slow.rows if fetched else slow.rowcount
+    if slow.connect is not None:
+        try:
+            get_profile_queue().put_nowait((slow, rowcount))
+            return
+        except Full:
+            pass
+    slow.log(rowcount)
+
+
+def get_profile_queue():
+    global _profile_queue
+    with _profile_lock:
+        if _profile_queue is None:
+            _profile_queue = Queue(PROFILE_QUEUE_SIZE)
+            thread = threading.Thread(target=_profile_slow_queries, args=(_profile_queue,),
+                                      name='django_pyodbc slow query profiler')
+            thread.daemon = True
+            thread.start()
+        return _profile_queue
+
+
+def _profile_slow_queries(queue):
+    while True:
+        slow, rowcount = queue.get()
+        parts = None
+        try:
+            connection = slow.connect()
+            try:
+                parts = profile_statement(connection, slow.driver_sql, slow.params)
+            finally:
+                connection.close()
+        except Exception:
+            logger.debug('Profiling of a slow query failed', exc_info=sys.exc_info())
+        slow.log(rowcount, parts)
@@ -0,0 +1,96 @@
+"""
+Per-connection cache of prepared statements.
+
+pyodbc prepares a statement once per cursor and only skips the prepare
+when the same cursor executes the same SQL again. The cache keeps a pyodbc
+cursor per translated SQL statement so that the hot parametrized queries
+of an application find a cursor on which they are already prepared.
+
+It is enabled by setting the number of cursors kept per connection in the
+OPTIONS of a database in the Django settings file:
+
+    'OPTIONS': {
+        'statement_cache_size': 32,
+    }
+
+A cursor is checked out of the cache while a CursorWrapper uses it, so that
+a result set being read is never overwritten by another execution of the
+same statement; it is checked back in when the CursorWrapper moves on to a
+different statement or is closed. Result sets still open on a cursor are
+discarded when it is checked in, as SQL Server without MARS allows only one
+active result set per connection; a cursor whose results can't be discarded
+is closed instead.
+"""
+from django_pyodbc.lru import LRUCache
+
+
+class StatementCache(object):
+    """
+    Idle pyodbc cursors of a connection keyed by the SQL prepared on them.
+    Cursors evicted from the cache are closed. `connection` is the pyodbc
+    connection the cursors belong to.
+    """
+    def __init__(self, maxsize=32, connection=None):
+        self.cursors = LRUCache(maxsize)
+        self.connection = connection
+        # statements prepared on the server / prepares avoided by a reuse
+        self.prepares = 0
+        self.prepares_avoided = 0
+        self.closed = False
+
+    def checkout(self, sql):
+        """
+        Take the cursor on which `sql` is prepared out of the cache, or
+        return None.
+        """
+        cursor = self.cursors.pop(sql)
+        if cursor is None:
+            self.cursors.misses += 1
+        else:
+            self.cursors.hits += 1
+        return cursor
+
+    def checkin(self, sql, cursor):
+        """
+        Give back `cursor`, on which `sql` is prepared.
+        """
+        if self.closed or sql in self.cursors or not _discard_results(cursor):
+            # the connection is gone, another cursor with the same statement
+            # was checked in first, or the cursor still holds results
+            _close(cursor)
+            return
+        for _, evicted in self.cursors.set(sql, cursor):
+            _close(evicted)
+
+    def close(self):
+        """
+        Close every cached cursor before the connection is closed. Cursors
+        checked in afterwards are closed right away.
+        """
+        self.closed = True
+        for _, cursor in self.cursors.clear():
+            _close(cursor)
+
+    def info(self):
+        info = self.cursors.info()
+        info['prepares'] = self.prepares
+        info['prepares_avoided'] = self.prepares_avoided
+        return info
+
+
+def _discard_results(cursor):
+    # moves past the remaining rows and result sets, which frees the
+    # statement without dropping what was prepared on it
+    try:
+        while cursor.nextset():
+            pass
+    except Exception:
+        return False
+    return True
+
+
+def _close(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
@@ -0,0 +1,76 @@
+"""
+Tracing spans around connecting, executing statements and fetching rows.
+
+Any tracer with the start_span(name, attributes=None) method of
+OpenTelemetry can be plugged in, nothing is imported by the backend. The
+spans returned only need set_attribute(key, value) and end(); when they
+have record_exception(exc), it is called for errors.
+
+A tracer is set for every database with set_tracer(), or for one database
+in its OPTIONS, as an object or a dotted path to one:
+
+    'OPTIONS': {
+        'tracer': 'myproject.tracing.tracer',
+    }
+
+Spans created:
+
+    db.connect       db.alias, db.pooled
+    db.execute       db.alias, db.statement.fingerprint, db.params, db.rowcount
+    db.executemany   db.alias, db.statement.fingerprint, db.rows
+    db.fetch         db.alias, db.statement.fingerprint, db.rows, db.batches,
+                     db.batch_size; from the first fetch to the end of the
+                     result set
+
+Errors set the error and error.type attributes. Without a tracer the
+cursor only checks one attribute per call.
+"""
+from django_pyodbc.compat import string_types
+
+tracer = None
+
+
+def set_tracer(new_tracer):
+    """
+    Set the tracer used by the databases without a tracer in their OPTIONS,
+    None to switch tracing off.
+    """
+    global tracer
+    tracer = new_tracer
+
+
+def get_tracer(option=None):
+    """
+    Return the tracer set in the OPTIONS of a database, importing it if it
+    is a dotted path.
+    """
+    if option is None:
+        return None
+    if isinstance(option, string_types):
+        try:
+            from django.utils.module_loading import import_string
+        except ImportError:
+            from django.utils.module_loading import import_by_path as import_string
+        return import_string(option)
+    return option
+
+
+def start_span(tracer, name, attributes):
+    return tracer.start_span(name, attributes=attributes)
+
+
+def end_span(span, error=None, **attributes):
+    """
+    Set the final `attributes` of `span`, mark it as failed by `error` if
+    any, and end it.
+    """
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+    if error is not None:
+        span.set_attribute('error', True)
+        span.set_attribute('error.type', error.__class__.__name__)
+        record_exception = getattr(span, 'record_exception', None)
+        if record_exception is not None:
+            record_exception(error)
+    span.end()
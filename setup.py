@@ -37,6 +37,10 @@ setup(
         'django_pyodbc.management.commands'
     ],
     install_requires=[
-        'pyodbc>=3.0.6,<3.1',
-    ]
+        'pyodbc>=3.0.6',
+    ],
+    extras_require={
+        # Cursor.fast_executemany, see OPTIONS['fast_executemany']
+        'fast': ['pyodbc>=4.0.19'],
+    }
 )
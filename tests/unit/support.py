@@ -0,0 +1,162 @@
+"""
+Settings and stand-ins shared by the unit tests of the backend, which need
+no database:
+
+    python -m unittest discover -s tests/unit
+
+Tests of the compiler and of the DatabaseWrapper import django_pyodbc.base
+and are skipped when pyodbc is not installed.
+"""
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from django.conf import settings
+
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+from django_pyodbc.compat import binary_type
+
+if not settings.configured:
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'django_pyodbc',
+                'NAME': 'unittest',
+                'USER': 'user',
+                'PASSWORD': 'password',
+                'HOST': '127.0.0.1',
+                'PORT': '8563',
+                'OPTIONS': {'driver': 'EXASolution Driver'},
+            },
+        },
+        # the models of the apps need the backend, and so pyodbc
+        INSTALLED_APPS=pyodbc and ['django.contrib.contenttypes', 'django.contrib.auth'] or [],
+        SECRET_KEY='unittest',
+    )
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+requires_pyodbc = unittest.skipIf(pyodbc is None, "pyodbc is not installed")
+
+
+class FakeCursor(object):
+    """
+    Cursor of a FakeConnection, recording the statements it runs and
+    answering them with the rows its connection holds for their SQL.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.rows = []
+        self.closed = False
+
+    def execute(self, sql, *params):
+        if isinstance(sql, binary_type):
+            sql = sql.decode('utf-8')
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            # pyodbc takes the parameters as arguments or as one sequence
+            params = tuple(params[0])
+        self.connection.statements.append((sql, params))
+        self.rows = list(self.connection.results.pop(sql, []))
+        self.description = self.rows and [('C%d' % i, None, None, None, None, None, True)
+                                          for i in range(len(self.rows[0]))] or None
+        self.rowcount = len(self.rows)
+        return self
+
+    def executemany(self, sql, params_list):
+        self.connection.statements.append((sql, list(params_list)))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def nextset(self):
+        self.rows = []
+        self.description = None
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection(object):
+    """
+    Stands in for a pyodbc connection: `results` maps the SQL of a statement
+    to the rows it returns, once.
+    """
+    def __init__(self, *args, **kwargs):
+        self.statements = []
+        self.results = {}
+        self.autocommit = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def use_connection(test, raw, alias='default'):
+    """
+    Make `raw` the open pyodbc connection of the database `alias`, in
+    autocommit mode like a new connection, while `test` runs.
+    """
+    from django.db import connections
+    connection = connections[alias]
+    connection.connection = raw
+    connection.autocommit = True
+    raw.autocommit = True
+
+    def restore():
+        connection.connection = None
+        connection.autocommit = False
+        connection.needs_rollback = False
+        connection.in_atomic_block = False
+    test.addCleanup(restore)
+    return connection
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def record_logs(test, name):
+    """
+    Return the records logged to the logger `name` while `test` runs.
+    """
+    handler = RecordingHandler()
+    logger = logging.getLogger(name)
+    logger.addHandler(handler)
+    test.addCleanup(logger.removeHandler, handler)
+    return handler.records
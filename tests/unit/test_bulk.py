@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+import re
+import unittest
+
+try:
+    from urllib2 import HTTPError, urlopen
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+from support import FakeConnection, requires_pyodbc, use_connection
+
+from django_pyodbc.bulk import HTTPTransport, bulk_export, csv_chunks, format_csv_value, inline_params, quote_literal
+
+
+class FormatCSVValueTests(unittest.TestCase):
+
+    def test_float_keeps_every_digit(self):
+        for value in (0.1, 1.0 / 3, 123456789.123456789, 1e-20, -2.5e300):
+            self.assertEqual(float(format_csv_value(value)), value)
+
+    def test_values(self):
+        self.assertEqual(format_csv_value(None), '')
+        self.assertEqual(format_csv_value(True), '1')
+        self.assertEqual(format_csv_value(False), '0')
+        self.assertEqual(format_csv_value(42), '42')
+        self.assertEqual(format_csv_value(decimal.Decimal('1.10')), '1.10')
+        self.assertEqual(format_csv_value(datetime.date(2015, 3, 1)), '2015-03-01')
+        self.assertEqual(format_csv_value(datetime.datetime(2015, 3, 1, 12, 30, 5, 123999)),
+                         '2015-03-01 12:30:05.123')
+
+    def test_csv_chunks(self):
+        rows = [[1, u'a,"b"', None], [2, u'ü', 0.1]]
+        data = b''.join(csv_chunks(rows, chunk_size=1))
+        self.assertEqual(data, u'1,"a,""b""",\n2,ü,0.1\n'.encode('utf-8'))
+        self.assertEqual(len(list(csv_chunks(rows, chunk_size=1))), 2)
+
+
+class QuoteLiteralTests(unittest.TestCase):
+
+    def test_float_keeps_every_digit(self):
+        for value in (0.1, 1.0 / 3, 123456789.123456789, 1e-20):
+            self.assertEqual(float(quote_literal(value)), value)
+
+    def test_values(self):
+        self.assertEqual(quote_literal(None), 'NULL')
+        self.assertEqual(quote_literal(True), 'TRUE')
+        self.assertEqual(quote_literal(7), '7')
+        self.assertEqual(quote_literal(decimal.Decimal('2.50')), '2.50')
+        self.assertEqual(quote_literal(u"O'Brien"), u"'O''Brien'")
+        self.assertEqual(quote_literal(datetime.date(2015, 3, 1)), "DATE '2015-03-01'")
+        self.assertEqual(quote_literal(datetime.datetime(2015, 3, 1, 8, 0)),
+                         "TIMESTAMP '2015-03-01 08:00:00.000'")
+
+    def test_inline_params(self):
+        sql = inline_params('SELECT * FROM T WHERE A = %s AND B LIKE %s AND C = %%', [0.1, u'50%'])
+        self.assertEqual(sql, "SELECT * FROM T WHERE A = 0.1 AND B LIKE '50%%' AND C = %%")
+
+
+class HTTPTransportTests(unittest.TestCase):
+
+    def test_import_served_once(self):
+        transport = HTTPTransport(host='127.0.0.1')
+        with transport.import_location(iter([b'1,a\n', b'2,b\n'])) as location:
+            port, file_name = re.match(r"AT 'http://127.0.0.1:(\d+)' FILE '(\w+\.csv)'", location).groups()
+            url = 'http://127.0.0.1:%s/' % port
+            self.assertRaises(HTTPError, urlopen, url + 'other.csv')
+            self.assertEqual(urlopen(url + file_name).read(), b'1,a\n2,b\n')
+            self.assertRaises(HTTPError, urlopen, url + file_name)
+
+    def test_file_name_per_statement(self):
+        transport = HTTPTransport(host='127.0.0.1')
+        with transport.import_location(iter([])) as first:
+            pass
+        with transport.import_location(iter([])) as second:
+            pass
+        self.assertNotEqual(first.split('FILE')[1], second.split('FILE')[1])
+
+
+@requires_pyodbc
+class BulkExportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = FakeConnection()
+        self.connection = use_connection(self, self.raw)
+
+    def test_empty_result_set(self):
+        from io import BytesIO
+        from django.contrib.auth.models import Group
+        queryset = Group.objects.filter(id__in=[])
+        fileobj = BytesIO()
+        self.assertEqual(bulk_export(self.connection, queryset, fileobj), 0)
+        self.assertEqual(fileobj.getvalue(), b'')
+        fileobj = BytesIO()
+        self.assertEqual(bulk_export(self.connection, queryset.values_list('name'), fileobj, column_names=True), 0)
+        self.assertEqual(fileobj.getvalue(), b'NAME\n')
+        fileobj = BytesIO()
+        bulk_export(self.connection, queryset, fileobj, column_names=True)
+        self.assertEqual(fileobj.getvalue(), b'ID,NAME\n')
+        self.assertEqual(self.raw.statements, [])
@@ -0,0 +1,112 @@
+import datetime
+import decimal
+import unittest
+
+from support import FakeConnection, FakeCursor, requires_pyodbc, use_connection
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+requires_numpy = unittest.skipIf(numpy is None, "numpy is not installed")
+
+
+class TypedCursor(FakeCursor):
+    """
+    Reports the column types of the connection, and the row count only
+    when it is told to, like drivers not knowing it before fetching.
+    """
+    def execute(self, sql, *params):
+        super(TypedCursor, self).execute(sql, *params)
+        if self.description:
+            self.description = [column[:1] + (column_type,) + column[2:]
+                                for column, column_type in zip(self.description, self.connection.types)]
+        if not self.connection.known_rowcount:
+            self.rowcount = -1
+        return self
+
+
+class TypedConnection(FakeConnection):
+    types = ()
+    known_rowcount = False
+
+    def cursor(self):
+        return TypedCursor(self)
+
+
+@requires_numpy
+@requires_pyodbc
+class FetchColumnsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = TypedConnection()
+        self.raw.types = (int, decimal.Decimal, datetime.datetime, bytes)
+        self.rows = [(i, decimal.Decimal('%d.5' % i), datetime.datetime(2000, 1, 1, 0, 0, i % 60),
+                      None if i % 3 else b'x%d' % i) for i in range(25)]
+        self.connection = use_connection(self, self.raw)
+
+    def fetch(self, batch_size):
+        self.raw.results['SELECT 1'] = self.rows
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT 1')
+        return cursor.cursor.fetch_columns(batch_size)
+
+    def assertColumns(self, columns):
+        self.assertEqual(list(columns), ['C0', 'C1', 'C2', 'C3'])
+        self.assertEqual(columns['C0'].dtype, numpy.dtype('int64'))
+        self.assertEqual(columns['C0'].tolist(), list(range(25)))
+        self.assertEqual(columns['C1'].tolist(), [i + 0.5 for i in range(25)])
+        self.assertEqual(columns['C2'].dtype, numpy.dtype('datetime64[us]'))
+        self.assertEqual(columns['C2'][-1], numpy.datetime64('2000-01-01T00:00:24'))
+        self.assertIs(columns['C0'].mask, numpy.ma.nomask)
+        self.assertEqual(columns['C3'].mask.tolist(), [bool(i % 3) for i in range(25)])
+        self.assertEqual(columns['C3'][3], u'x3')
+        for column in columns.values():
+            self.assertEqual(len(column.data), 25)
+
+    def test_grown(self):
+        # 4 rows allocated, then 8, 16 and 32
+        self.assertColumns(self.fetch(4))
+
+    def test_rowcount(self):
+        self.raw.known_rowcount = True
+        self.assertColumns(self.fetch(4))
+
+    def test_nulls_after_first_batch(self):
+        self.rows = [(1, None, None, b'a')] * 3 + [(None, None, None, None)]
+        self.raw.types = (int, float, datetime.date, bytes)
+        columns = self.fetch(2)
+        self.assertEqual(columns['C0'].mask.tolist(), [False, False, False, True])
+        self.assertEqual(columns['C3'].mask.tolist(), [False, False, False, True])
+        self.assertTrue(columns['C1'].mask.all())
+
+    def test_binary(self):
+        # equal-length values, like those of a BINARY(16) column
+        self.rows = [(i, bytearray(b'%016d' % i)) for i in range(5)] + [(5, None)]
+        self.raw.types = (int, bytearray)
+        columns = self.fetch(4)
+        self.assertEqual(columns['C1'].dtype, numpy.dtype('object'))
+        self.assertEqual(columns['C1'].shape, (6,))
+        self.assertEqual(columns['C1'][2], bytearray(b'%016d' % 2))
+        self.assertEqual(columns['C1'].mask.tolist(), [False] * 5 + [True])
+
+    def test_empty(self):
+        self.rows = []
+        cursor = self.connection.cursor()
+        self.raw.results['SELECT 1'] = [(1,)]
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        columns = cursor.cursor.fetch_columns()
+        self.assertEqual(len(columns['C0']), 0)
+
+    def test_queryset(self):
+        from django.contrib.auth.models import Group
+        from django_pyodbc.queryset import PyodbcManager
+        manager = PyodbcManager()
+        manager.model = Group
+        self.raw.types = (int, bytes)
+        self.raw.results['SELECT "AUTH_GROUP"."ID", "AUTH_GROUP"."NAME" FROM "AUTH_GROUP"'] = [(1, b'a'), (2, b'b')]
+        columns = manager.values_list('id', 'name').fetch_columns()
+        self.assertEqual(columns['C0'].tolist(), [1, 2])
+        self.assertEqual(columns['C1'].tolist(), [u'a', u'b'])
@@ -0,0 +1,178 @@
+import unittest
+
+from support import requires_pyodbc
+
+
+@requires_pyodbc
+class GroupByParamsTests(unittest.TestCase):
+
+    def grouped(self):
+        from django.contrib.auth.models import User
+        from django.db.models import Count
+        return User.objects.extra(
+            select={'recent': 'id >= %s', 'b': "username LIKE '10%%' OR id = %s"}, select_params=(5, 5),
+        ).values('recent', 'b').annotate(n=Count('id')).filter(username__in=['a', 'b'])
+
+    def compile(self, queryset):
+        return queryset.query.get_compiler('default').as_sql()
+
+    def assertHoisted(self, sql, params):
+        self.assertTrue(sql.startswith('WITH "GROUP_BY_PARAMS_T" AS (SELECT %s AS p0, %s AS p1, %s AS p2) SELECT '), sql)
+        self.assertIn(' FROM "AUTH_USER" , "GROUP_BY_PARAMS_T" ', sql)
+        self.assertIn(' GROUP BY (username LIKE \'10%%\' OR id = "GROUP_BY_PARAMS_T".p0), '
+                      '(id >= "GROUP_BY_PARAMS_T".p0)', sql)
+        # only the table expression has placeholders
+        self.assertEqual(sql.count('%s'), 3)
+        self.assertEqual(params, (5, 'a', 'b'))
+
+    def test_hoisted(self):
+        sql, params = self.compile(self.grouped())
+        self.assertHoisted(sql, params)
+        self.assertEqual(self.compile(self.grouped()), (sql, params))
+
+    def test_not_hoisted_without_group_by_params(self):
+        from django.contrib.auth.models import Group
+        sql, params = self.compile(Group.objects.filter(name='x'))
+        self.assertEqual(sql, 'SELECT "AUTH_GROUP"."ID", "AUTH_GROUP"."NAME" FROM "AUTH_GROUP" '
+                              'WHERE "AUTH_GROUP"."NAME" = %s')
+        self.assertEqual(params, ('x',))
+
+    def test_regex_fallback(self):
+        # Django < 1.8, whose pre_sql_setup() does not return the GROUP BY
+        from django.db.models.sql import compiler as django_compiler
+        from django_pyodbc import compiler
+        version, pre_sql_setup = compiler.DjangoVersion, compiler.SQLCompiler.pre_sql_setup
+        compiler.DjangoVersion = (1, 7, 0)
+        compiler.SQLCompiler.pre_sql_setup = django_compiler.SQLCompiler.pre_sql_setup
+        try:
+            sql, params = self.compile(self.grouped())
+        finally:
+            compiler.DjangoVersion, compiler.SQLCompiler.pre_sql_setup = version, pre_sql_setup
+        self.assertHoisted(sql, params)
+
+    def test_hoist_params(self):
+        from django.contrib.auth.models import Group
+        query_compiler = Group.objects.all().query.get_compiler('default')
+        query_compiler.params_table = '"P"'
+        sql, params = query_compiler.hoist_params('SELECT %s, %s, %s, %s, \'%%\'', [1, 1, u'1', [2]])
+        self.assertEqual(sql, 'WITH "P" AS (SELECT %s AS p0, %s AS p1, %s AS p2) '
+                              'SELECT "P".p0, "P".p0, "P".p1, "P".p2, \'%%\'')
+        self.assertEqual(params, (1, u'1', [2]))
+
+
+@requires_pyodbc
+class BulkInsertTests(unittest.TestCase):
+
+    def compile(self, objs, fields):
+        from django.contrib.auth.models import Group
+        from django.db.models.sql import InsertQuery
+        query = InsertQuery(Group)
+        query.insert_values(fields, objs)
+        query_compiler = query.get_compiler('default')
+        query_compiler.return_id = False
+        return query_compiler.as_sql()
+
+    def test_explicit_pk(self):
+        from django.contrib.auth.models import Group
+        objs = [Group(id=i, name='g%d' % i) for i in (1, 2, 3)]
+        [(sql, params)] = self.compile(objs, Group._meta.local_concrete_fields)
+        # IDENTITY_INSERT wraps the whole statement once
+        self.assertEqual(sql, 'SET IDENTITY_INSERT "AUTH_GROUP" ON;'
+                              'INSERT INTO "AUTH_GROUP" ("ID", "NAME") VALUES (%s, %s), (%s, %s), (%s, %s);'
+                              'SET IDENTITY_INSERT "AUTH_GROUP" OFF')
+        self.assertEqual(tuple(params), (1, 'g1', 2, 'g2', 3, 'g3'))
+
+    def test_auto_pk(self):
+        from django.contrib.auth.models import Group
+        objs = [Group(name='g%d' % i) for i in (1, 2, 3)]
+        [(sql, params)] = self.compile(objs, [Group._meta.get_field('name')])
+        self.assertEqual(sql, 'INSERT INTO "AUTH_GROUP" ("NAME") VALUES (%s), (%s), (%s)')
+        self.assertNotIn('IDENTITY_INSERT', sql)
+        self.assertEqual(tuple(params), ('g1', 'g2', 'g3'))
+
+
+@requires_pyodbc
+class InsertTemplateTests(unittest.TestCase):
+
+    def setUp(self):
+        from django_pyodbc.compiler import SQLInsertCompiler
+        self.templates = SQLInsertCompiler.insert_templates
+        self.templates.clear()
+
+    def tearDown(self):
+        self.templates.clear()
+
+    def compile(self, obj, return_id=False, fields=None, raw=False):
+        from django.db.models.sql import InsertQuery
+        meta = obj._meta
+        if fields is None:
+            fields = [f for f in meta.local_concrete_fields if not f.primary_key]
+        query = InsertQuery(type(obj))
+        query.insert_values(fields, [obj], raw=raw)
+        query_compiler = query.get_compiler('default')
+        query_compiler.return_id = return_id
+        return query_compiler.as_sql()
+
+    def assertCached(self, make, **kwargs):
+        first = self.compile(make(1), **kwargs)
+        hits = self.templates.info()['hits']
+        cached = self.compile(make(2), **kwargs)
+        self.assertEqual(self.templates.info()['hits'], hits + 1)
+        self.templates.clear()
+        self.assertEqual(cached, self.compile(make(2), **kwargs))
+        self.assertNotEqual(cached, first)
+        return cached
+
+    def test_same_sql_as_compiled(self):
+        import datetime
+        from django.contrib.auth.models import Group, User
+        self.assertCached(lambda i: Group(name='g%d' % i))
+        self.assertCached(lambda i: Group(name='g%d' % i), return_id=True)
+        self.assertCached(lambda i: Group(name='g%d' % i), raw=True)
+        self.assertCached(lambda i: User(username='u%d' % i, date_joined=datetime.datetime(2000, 1, i)),
+                          return_id=True)
+
+    def test_identity_insert(self):
+        from django.contrib.auth.models import Group
+        [(sql, params)] = self.assertCached(lambda i: Group(id=i, name='g'), fields=Group._meta.local_concrete_fields)
+        self.assertTrue(sql.startswith('SET IDENTITY_INSERT "AUTH_GROUP" ON;'), sql)
+        self.assertEqual(params, (2, 'g'))
+
+    def test_keyed_on_return_id(self):
+        from django.contrib.auth.models import Group
+        [(sql, params)] = self.compile(Group(name='g'))
+        [(returning_sql, returning_params)] = self.compile(Group(name='g'), return_id=True)
+        self.assertNotIn('@sqlserver_ado_return_id', sql)
+        self.assertIn('OUTPUT INSERTED."ID" INTO @sqlserver_ado_return_id', returning_sql)
+        self.assertEqual(params, returning_params)
+        self.assertEqual(len(self.templates), 2)
+
+    def test_expressions_not_cached(self):
+        from django.contrib.auth.models import Group
+        from django.db.models import Value
+        self.compile(Group(name='g'))
+        info = self.templates.info()
+        try:
+            self.compile(Group(name=Value('g')))
+        except Exception:
+            # Django < 1.9 can't save expressions
+            pass
+        self.assertEqual(self.templates.info(), info)
+
+    def test_pre_save_called_once(self):
+        from django.contrib.auth.models import Group
+        field = Group._meta.get_field('name')
+        calls = []
+
+        def pre_save(obj, add):
+            calls.append(obj)
+            return obj.name
+        field.pre_save = pre_save
+        self.addCleanup(delattr, field, 'pre_save')
+        first, second = Group(name='g1'), Group(name='g2')
+        # compiled, then from the template
+        self.compile(first)
+        self.compile(second)
+        self.assertEqual(calls, [first, second])
+        self.compile(Group(name='g3'), raw=True)
+        self.assertEqual(len(calls), 2)
@@ -0,0 +1,238 @@
+import datetime
+import decimal
+import logging
+import unittest
+
+from support import FakeConnection, FakeCursor, record_logs, requires_pyodbc
+
+
+class OldPyodbcCursor(FakeCursor):
+    # pyodbc < 4.0.19: setting fast_executemany raises AttributeError
+    fast_executemany = property()
+
+
+@requires_pyodbc
+class FastExecutemanyTests(unittest.TestCase):
+
+    def setUp(self):
+        from django_pyodbc import base
+        self.base = base
+        base._fast_executemany_warned = False
+        self.addCleanup(setattr, base, '_fast_executemany_warned', False)
+        self.records = record_logs(self, 'django_pyodbc')
+
+    def test_fallback_warns_once(self):
+        cursor = self.base.CursorWrapper(OldPyodbcCursor(FakeConnection()), 'utf-8')
+        cursor.fast_executemany = True
+        cursor.executemany('INSERT INTO T VALUES (%s)', [(1,), (2,)])
+        self.assertFalse(cursor.fast_executemany)
+        self.assertEqual(cursor.cursor.connection.statements, [('INSERT INTO T VALUES (?)', [(1,), (2,)])])
+        cursor.fast_executemany = True
+        cursor.executemany('INSERT INTO T VALUES (%s)', [(3,)])
+        self.assertEqual(len(self.records), 1)
+        self.assertEqual(self.records[0].levelno, logging.WARNING)
+
+    def test_old_pyodbc_warns_at_setup(self):
+        if self.base.pyodbc_ver >= (4, 0, 19):
+            self.skipTest("pyodbc supports fast_executemany")
+        wrapper = self.base.DatabaseWrapper({
+            'ENGINE': 'django_pyodbc', 'NAME': 'db', 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {'driver': 'EXASolution Driver', 'fast_executemany': True},
+        }, 'unittest')
+        self.assertFalse(wrapper.fast_executemany)
+        self.assertEqual(len(self.records), 1)
+
+
+class Point(object):
+
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+@requires_pyodbc
+class FormatParamsTests(unittest.TestCase):
+
+    def setUp(self):
+        from django_pyodbc import base
+        self.base = base
+        self.cursor = base.CursorWrapper(FakeCursor(FakeConnection()), 'utf-8')
+
+    def test_subclasses(self):
+        from django.utils.safestring import mark_safe
+        params = self.cursor.format_params([mark_safe(u'caf\xe9'), True, False, 5, 2.5])
+        self.assertEqual(params, (b'caf\xc3\xa9', 1, 0, 5, 2.5))
+        self.assertIsInstance(params[0], bytes)
+        # bool is looked up before its base class int
+        self.assertIs(type(params[1]), int)
+
+    def test_unchanged(self):
+        params = [1, 2.5, None, b'x', decimal.Decimal('1.5'), datetime.date(2000, 1, 1)]
+        self.assertIs(self.cursor.format_params(params), params)
+        params = (1,)
+        self.assertIs(self.cursor.format_params(params), params)
+
+    def test_encoding(self):
+        cursor = self.base.CursorWrapper(FakeCursor(FakeConnection()), 'latin-1')
+        self.assertEqual(cursor.format_params([b'caf\xe9', u'caf\xe9']), (b'caf\xc3\xa9', b'caf\xc3\xa9'))
+        # utf-8 bytes are sent as they are
+        params = [b'caf\xc3\xa9']
+        self.assertIs(self.cursor.format_params(params), params)
+
+    def test_registered_at_runtime(self):
+        # the cursor was created before the converter is registered
+        cursor = self.cursor
+        cursor.format_params([Point(1, 2)])
+
+        def unregister():
+            del self.base.param_converters[Point]
+            for converters in self.base._param_converter_maps.values():
+                converters.reset()
+        self.base.register_param_converter(Point, lambda point: '%d,%d' % (point.x, point.y))
+        self.addCleanup(unregister)
+        cursor.executemany('INSERT INTO T VALUES (%s, %s)', [(Point(1, 2), True), (Point(3, 4), False)])
+        self.assertEqual(cursor.cursor.connection.statements,
+                         [('INSERT INTO T VALUES (?, ?)', [('1,2', 1), ('3,4', 0)])])
+
+
+class TypedCursor(FakeCursor):
+    """
+    Reports the column types of the connection in cursor.description.
+    """
+    def execute(self, sql, *params):
+        super(TypedCursor, self).execute(sql, *params)
+        if self.description:
+            self.description = [column[:1] + (column_type,) + column[2:]
+                                for column, column_type in zip(self.description, self.connection.types)]
+        return self
+
+
+class TypedConnection(FakeConnection):
+    types = ()
+
+    def cursor(self):
+        return TypedCursor(self)
+
+
+@requires_pyodbc
+class RowConvertersTests(unittest.TestCase):
+
+    def fetch(self, types, rows, encoding='utf-8'):
+        from django_pyodbc.base import CursorWrapper
+        raw = TypedConnection()
+        raw.types = types
+        raw.results['SELECT 1'] = rows
+        cursor = CursorWrapper(raw.cursor(), encoding)
+        cursor.execute('SELECT 1')
+        return cursor, cursor.fetchall()
+
+    def test_binary_columns(self):
+        cursor, rows = self.fetch((int, bytes, bytes, float), [
+            (1, b'caf\xc3\xa9', None, 1.5),
+            (2, b'x', b'y', None),
+        ])
+        self.assertEqual([i for i, convert in cursor.row_converters], [1, 2])
+        self.assertEqual(rows, [(1, u'caf\xe9', None, 1.5), (2, u'x', u'y', None)])
+        self.assertIsInstance(rows[1][2], type(u''))
+
+    def test_encoding(self):
+        cursor, rows = self.fetch((bytes,), [(b'caf\xe9',)], encoding='latin-1')
+        self.assertEqual(rows, [(u'caf\xe9',)])
+
+    def test_datetime(self):
+        from django.test.utils import override_settings
+        from django.utils import timezone
+        when = datetime.datetime(2000, 1, 2, 3, 4, 5)
+        with override_settings(USE_TZ=True):
+            cursor, rows = self.fetch((datetime.datetime, datetime.date), [(when, datetime.date(2000, 1, 2)), (None, None)])
+        self.assertEqual(rows, [(when.replace(tzinfo=timezone.utc), datetime.date(2000, 1, 2)), (None, None)])
+        with override_settings(USE_TZ=False):
+            cursor, rows = self.fetch((datetime.datetime,), [(when,)])
+        self.assertEqual(cursor.row_converters, [])
+        self.assertIsNone(rows[0][0].tzinfo)
+
+    def test_no_converters(self):
+        cursor, rows = self.fetch((int, float, decimal.Decimal), [(1, 1.5, decimal.Decimal('2.5'))])
+        self.assertEqual(cursor.row_converters, [])
+        self.assertEqual(rows, [(1, 1.5, decimal.Decimal('2.5'))])
+        self.assertIs(type(rows[0]), tuple)
+
+
+class CountingCursor(TypedCursor):
+
+    def fetchmany(self, size=1):
+        self.connection.fetches.append(size)
+        return super(CountingCursor, self).fetchmany(size)
+
+
+class CountingConnection(TypedConnection):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingConnection, self).__init__(*args, **kwargs)
+        self.fetches = []
+
+    def cursor(self):
+        return CountingCursor(self)
+
+
+@requires_pyodbc
+class ChunkedReadsTests(unittest.TestCase):
+
+    def test_iteration_streams_batches(self):
+        from django_pyodbc.base import CursorWrapper
+        raw = CountingConnection()
+        raw.types = (int, bytes)
+        raw.results['SELECT 1'] = [(i, b'r%d' % i) for i in range(5)]
+        cursor = CursorWrapper(raw.cursor(), 'utf-8')
+        cursor.fetch_batch_size = 2
+        cursor.execute('SELECT 1')
+        rows = iter(cursor)
+        self.assertEqual(next(rows), (0, u'r0'))
+        # only the first batch was fetched
+        self.assertEqual(raw.fetches, [2])
+        self.assertEqual(list(rows), [(i, u'r%d' % i) for i in range(1, 5)])
+        self.assertEqual(raw.fetches, [2, 2, 2])
+
+    def test_opt_out(self):
+        from django_pyodbc.base import DatabaseWrapper
+        settings_dict = {
+            'ENGINE': 'django_pyodbc', 'NAME': 'db', 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {'driver': 'EXASolution Driver'},
+        }
+        self.assertTrue(DatabaseWrapper(settings_dict, 'chunked').features.can_use_chunked_reads)
+        settings_dict['OPTIONS']['chunked_reads'] = False
+        self.assertFalse(DatabaseWrapper(settings_dict, 'buffered').features.can_use_chunked_reads)
+        # the other databases keep streaming
+        self.assertTrue(DatabaseWrapper(dict(settings_dict, OPTIONS={}), 'chunked').features.can_use_chunked_reads)
+
+
+@requires_pyodbc
+class FormatSQLTests(unittest.TestCase):
+
+    def setUp(self):
+        from django_pyodbc.base import CursorWrapper
+        self.cache = CursorWrapper.format_sql_cache
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        self.cursor = CursorWrapper(FakeCursor(FakeConnection()), 'utf-8')
+
+    def test_cached(self):
+        sql = u'SELECT "A" FROM "T" WHERE "B" = %s AND "C" = %s'
+        hits = self.cache.info()['hits']
+        self.assertEqual(self.cursor.format_sql(sql, 2), b'SELECT "A" FROM "T" WHERE "B" = ? AND "C" = ?')
+        self.assertEqual(self.cursor.format_sql(sql, 2), b'SELECT "A" FROM "T" WHERE "B" = ? AND "C" = ?')
+        self.assertEqual(self.cache.info()['hits'], hits + 1)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_literal_percent(self):
+        sql = u"SELECT \"A\" FROM \"T\" WHERE \"B\" LIKE 'a%' AND \"C\" = %s"
+        self.assertEqual(self.cursor.format_sql(sql, 1), sql.encode('utf-8'))
+
+    def test_not_cached(self):
+        self.cursor.format_sql(u'SELECT 1', 0)
+        self.cursor.format_sql(u"EXPORT (SELECT 'x') INTO CSV AT 'http://h:1' FILE 'f.csv'", 0)
+        long_sql = u'INSERT INTO "T" ("A") VALUES ' + u', '.join([u'(%s)'] * 2000)
+        self.assertEqual(self.cursor.format_sql(long_sql, 2000).count(b'?'), 2000)
+        self.assertEqual(len(self.cache), 0)
+        self.cursor.format_sql_cache_max_length = 20000
+        self.cursor.format_sql(long_sql, 2000)
+        self.assertEqual(len(self.cache), 1)
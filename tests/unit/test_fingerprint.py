@@ -0,0 +1,108 @@
+import unittest
+
+from django.test.utils import override_settings
+
+from support import FakeConnection, record_logs, requires_pyodbc, use_connection
+
+from django_pyodbc.fingerprint import (
+    QueryTrackingMiddleware, RepeatedQueryError, fingerprint, get_trackers, track_queries,
+)
+
+
+class Request(object):
+    pass
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual(fingerprint('SELECT "A" FROM "T" WHERE "ID" = 42 AND "X" = 1.5e3'),
+                         'SELECT "A" FROM "T" WHERE "ID" = ? AND "X" = ?')
+        self.assertEqual(fingerprint("SELECT * FROM T WHERE N = 'O''Brien' OR N = 'a'"),
+                         'SELECT * FROM T WHERE N = ? OR N = ?')
+        self.assertEqual(fingerprint('SELECT * FROM T WHERE N = %s'), 'SELECT * FROM T WHERE N = ?')
+
+    def test_identifiers_with_digits(self):
+        sql = 'SELECT U0."ID" FROM "TABLE_1" U0 WHERE U0."COL2" = %s'
+        self.assertEqual(fingerprint(sql), 'SELECT U0."ID" FROM "TABLE_1" U0 WHERE U0."COL2" = ?')
+
+    def test_in_lists(self):
+        expected = 'SELECT * FROM T WHERE ID IN (...)'
+        self.assertEqual(fingerprint('SELECT * FROM T WHERE ID IN (%s, %s, %s)'), expected)
+        self.assertEqual(fingerprint('SELECT * FROM T WHERE ID IN (1,2)'), expected)
+        self.assertEqual(fingerprint('SELECT * FROM T WHERE ID in(%s)'), expected)
+        # a subquery is kept
+        self.assertEqual(fingerprint('SELECT * FROM T WHERE A IN (SELECT B FROM U)'),
+                         'SELECT * FROM T WHERE A IN (SELECT B FROM U)')
+
+    def test_values_lists(self):
+        self.assertEqual(fingerprint('INSERT INTO T (A, B) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+                         'INSERT INTO T (A, B) VALUES (?, ?), ...')
+        self.assertEqual(fingerprint('INSERT INTO T (A) VALUES (%s)'), 'INSERT INTO T (A) VALUES (?)')
+
+    def test_whitespace(self):
+        self.assertEqual(fingerprint('  SELECT *\n  FROM T\tWHERE A = %s '), 'SELECT * FROM T WHERE A = ?')
+
+
+class QueryTrackerTests(unittest.TestCase):
+
+    def test_counts(self):
+        with track_queries() as tracker:
+            for i in range(3):
+                get_trackers()[0].record('SELECT * FROM T WHERE ID = %d' % i, 0.5)
+            get_trackers()[0].record('SELECT 1', 0.1)
+        self.assertIsNone(get_trackers())
+        self.assertEqual(tracker.summary(), [('SELECT * FROM T WHERE ID = ?', 3, 1.5), ('SELECT ?', 1, 0.1)])
+
+    def test_threshold_logged_once(self):
+        records = record_logs(self, 'django_pyodbc.queries')
+        with track_queries(threshold=2) as tracker:
+            for i in range(5):
+                tracker.record('SELECT * FROM T WHERE ID = %d' % i, 0.0)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].fingerprint, 'SELECT * FROM T WHERE ID = ?')
+
+    def test_nested(self):
+        with track_queries() as outer:
+            with track_queries() as inner:
+                self.assertEqual(get_trackers(), (outer, inner))
+            self.assertEqual(get_trackers(), (outer,))
+
+
+class QueryTrackingMiddlewareTests(unittest.TestCase):
+
+    def test_strict(self):
+        with override_settings(DJANGO_PYODBC_QUERY_TRACKING={'threshold': 2, 'strict': True}):
+            middleware = QueryTrackingMiddleware()
+        request = Request()
+        middleware.process_request(request)
+        tracker = request.query_tracker
+        tracker.record('SELECT * FROM T WHERE ID = 1', 0.0)
+        tracker.record('SELECT * FROM T WHERE ID = 2', 0.0)
+        self.assertRaises(RepeatedQueryError, tracker.record, 'SELECT * FROM T WHERE ID = 3', 0.0)
+        response = object()
+        self.assertIs(middleware.process_response(request, response), response)
+        self.assertIsNone(get_trackers())
+
+    def test_not_sampled(self):
+        with override_settings(DJANGO_PYODBC_QUERY_TRACKING={'sample_rate': 0}):
+            middleware = QueryTrackingMiddleware()
+        request = Request()
+        middleware.process_request(request)
+        self.assertFalse(hasattr(request, 'query_tracker'))
+        self.assertIsNone(get_trackers())
+        middleware.process_response(request, object())
+
+
+@requires_pyodbc
+class CursorTrackingTests(unittest.TestCase):
+
+    def test_strict_raises_from_execute(self):
+        connection = use_connection(self, FakeConnection())
+        cursor = connection.cursor()
+        with track_queries(threshold=2, strict=True) as tracker:
+            cursor.execute('SELECT "A" FROM "T" WHERE "ID" = %s', [1])
+            cursor.executemany('INSERT INTO "T" ("A") VALUES (%s)', [(1,), (2,), (3,)])
+            cursor.execute('SELECT "A" FROM "T" WHERE "ID" = %s', [2])
+            self.assertRaises(RepeatedQueryError, cursor.execute, 'SELECT "A" FROM "T" WHERE "ID" = %s', [3])
+        self.assertEqual(tracker.counts['INSERT INTO "T" ("A") VALUES (?)'], 1)
@@ -0,0 +1,116 @@
+import unittest
+
+from support import FakeConnection, requires_pyodbc, use_connection
+
+from django_pyodbc.metrics import ConnectionMetrics, Histogram, MetricsRegistry, statement_kind
+
+
+class StatementKindTests(unittest.TestCase):
+
+    def test_kinds(self):
+        for sql, kind in [
+            ('SELECT "A" FROM "T"', 'select'),
+            ('select 1', 'select'),
+            ('\n  SELECT\n"A" FROM "T"', 'select'),
+            ('INSERT INTO "T" ("A") VALUES (%s)', 'insert'),
+            ('UPDATE "T" SET "A" = %s', 'update'),
+            ('DELETE FROM "T"', 'delete'),
+            ('SELECT', 'select'),
+            ('MERGE INTO "T" USING (VALUES (%s, 0))', 'other'),
+            ('SET NOCOUNT ON', 'other'),
+            ('SELECTED', 'other'),
+            ('', 'other'),
+            ('   ', 'other'),
+        ]:
+            self.assertEqual(statement_kind(sql), kind, sql)
+
+
+    def test_rewritten_statements(self):
+        for sql, kind in [
+            # save() returning the id
+            ('SET NOCOUNT ON;DECLARE @sqlserver_ado_return_id table ("ID" int);'
+             'INSERT INTO "T" ("A") OUTPUT INSERTED."ID" INTO @sqlserver_ado_return_id VALUES (%s);'
+             'SELECT * FROM @sqlserver_ado_return_id', 'insert'),
+            ('SET NOCOUNT ON;INSERT INTO "T" DEFAULT VALUES', 'insert'),
+            # explicit primary key
+            ('SET IDENTITY_INSERT "T" ON;\nINSERT INTO "T" ("ID", "A") VALUES (%s, %s);\n'
+             'SET IDENTITY_INSERT "T" OFF', 'insert'),
+            # GROUP BY parameters hoisted into a WITH clause
+            ('WITH "GROUP_BY_PARAMS_T" AS (SELECT %s AS p0) SELECT "GROUP_BY_PARAMS_T".p0 FROM "T" '
+             'GROUP BY "GROUP_BY_PARAMS_T".p0', 'select'),
+            ('WITH "A" ("X") AS (SELECT 1), "B" AS (SELECT \'update\' FROM "A") '
+             'UPDATE "T" SET "X" = 1', 'update'),
+            ('WITH "A" AS (SELECT 1)', 'other'),
+        ]:
+            self.assertEqual(statement_kind(sql), kind, sql)
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['buckets'], [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(snapshot['count'], 4)
+        self.assertAlmostEqual(snapshot['sum'], 2.65)
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+
+
+class MetricsRegistryTests(unittest.TestCase):
+
+    def test_connection_metrics(self):
+        registry = MetricsRegistry()
+        metrics = ConnectionMetrics('default', registry)
+        metrics.executed('insert', 0.002, param_bytes=100, batches=3)
+        metrics.fetched('select', 10, batches=2)
+        metrics.failed('select', ValueError())
+        metrics.query_cache('hit')
+        snapshot = registry.snapshot()
+        labels = (('alias', 'default'), ('kind', 'insert'))
+        self.assertEqual(snapshot[('django_pyodbc_execute_seconds', labels)]['count'], 1)
+        self.assertEqual(snapshot[('django_pyodbc_param_bytes_total', labels)], 100)
+        self.assertEqual(snapshot[('django_pyodbc_executemany_batches_total', labels)], 3)
+        self.assertEqual(snapshot[('django_pyodbc_rows_fetched_total', (('alias', 'default'), ('kind', 'select')))], 10)
+        self.assertEqual(snapshot[('django_pyodbc_errors_total', (
+            ('alias', 'default'), ('error', 'ValueError'), ('kind', 'select')))], 1)
+        self.assertEqual(snapshot[('django_pyodbc_query_cache_total', (('alias', 'default'), ('result', 'hit')))], 1)
+        registry.reset()
+        self.assertEqual(registry.snapshot()[('django_pyodbc_param_bytes_total', labels)], 0)
+
+    def test_render(self):
+        registry = MetricsRegistry()
+        registry.counter('django_pyodbc_rows_fetched_total', alias='a"b', kind='select').inc(5)
+        registry.histogram('django_pyodbc_execute_seconds', alias='a', kind='select').observe(0.0001)
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE django_pyodbc_execute_seconds histogram', lines)
+        self.assertIn('django_pyodbc_execute_seconds_bucket{alias="a",kind="select",le="0.0005"} 1', lines)
+        self.assertIn('django_pyodbc_execute_seconds_bucket{alias="a",kind="select",le="+Inf"} 1', lines)
+        self.assertIn('django_pyodbc_execute_seconds_count{alias="a",kind="select"} 1', lines)
+        self.assertIn('# TYPE django_pyodbc_rows_fetched_total counter', lines)
+        self.assertIn(r'django_pyodbc_rows_fetched_total{alias="a\"b",kind="select"} 5', lines)
+
+
+@requires_pyodbc
+class CursorMetricsTests(unittest.TestCase):
+
+    def test_recorded_by_cursor(self):
+        raw = FakeConnection()
+        raw.results['SELECT "A" FROM "T" WHERE "B" = ?'] = [(1,), (2,), (3,)]
+        connection = use_connection(self, raw)
+        registry = MetricsRegistry()
+        connection.metrics = ConnectionMetrics('default', registry)
+        self.addCleanup(setattr, connection, 'metrics', None)
+        cursor = connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [1])
+        cursor.fetchall()
+        cursor.executemany('INSERT INTO "T" ("A") VALUES (%s)', [(1,), (2,)])
+        snapshot = registry.snapshot()
+        select = (('alias', 'default'), ('kind', 'select'))
+        insert = (('alias', 'default'), ('kind', 'insert'))
+        self.assertEqual(snapshot[('django_pyodbc_execute_seconds', select)]['count'], 1)
+        self.assertEqual(snapshot[('django_pyodbc_rows_fetched_total', select)], 3)
+        self.assertEqual(snapshot[('django_pyodbc_execute_seconds', insert)]['count'], 1)
+        self.assertEqual(snapshot[('django_pyodbc_executemany_batches_total', insert)], 1)
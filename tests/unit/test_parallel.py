@@ -0,0 +1,192 @@
+import threading
+import time
+import unittest
+
+from support import FakeConnection, FakeCursor, record_logs, requires_pyodbc
+
+
+def returns(value, delay=0):
+    def query():
+        time.sleep(delay)
+        return value
+    return query
+
+
+def raises(error):
+    def query():
+        raise error
+    return query
+
+
+@requires_pyodbc
+class RunParallelTests(unittest.TestCase):
+
+    def test_results_in_order(self):
+        from django_pyodbc.parallel import run_parallel
+        queries = [returns(1, 0.05), returns(2), returns(3, 0.02)]
+        self.assertEqual(run_parallel(queries, max_workers=3), [1, 2, 3])
+
+    def test_error(self):
+        from django_pyodbc.parallel import run_parallel
+        error = ValueError("bad query")
+        try:
+            run_parallel([returns(1), raises(error)], max_workers=2)
+        except ValueError as e:
+            self.assertIs(e, error)
+        else:
+            self.fail("the error of the query was not raised")
+
+    def test_timeout(self):
+        from django_pyodbc.parallel import ParallelTimeout, run_parallel
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.assertRaises(ParallelTimeout, run_parallel, [release.wait, returns(1)], 2, 0.05)
+
+
+@requires_pyodbc
+class ExecutorTests(unittest.TestCase):
+
+    def setUp(self):
+        from django_pyodbc import parallel
+        self.parallel = parallel
+        executor, parallel._executor = parallel._executor, parallel._Executor(2)
+        self.addCleanup(setattr, parallel, '_executor', executor)
+
+    def test_threads_bounded_and_reused(self):
+        lock = threading.Lock()
+        running = []
+        threads = set()
+        most = []
+
+        def query():
+            with lock:
+                running.append(1)
+                most.append(len(running))
+                threads.add(threading.current_thread())
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+        batches = [self.parallel.run_async([query] * 4, max_workers=4) for i in range(3)]
+        for batch in batches:
+            self.assertEqual(len(batch.result(5)), 4)
+        self.parallel.run_parallel([query] * 4, max_workers=4)
+        self.assertEqual(max(most), 2)
+        self.assertEqual(len(threads), 2)
+
+    def test_more_workers_than_threads(self):
+        records = record_logs(self, 'django_pyodbc')
+        self.addCleanup(setattr, self.parallel, '_max_workers_warned', False)
+        self.parallel._max_workers_warned = False
+        self.assertEqual(self.parallel.run_parallel([returns(i) for i in range(4)], max_workers=4), [0, 1, 2, 3])
+        self.parallel.run_parallel([returns(1)] * 4, max_workers=4)
+        self.assertEqual(len(records), 1)
+        self.assertIn('4 workers, but only 2 threads', records[0].getMessage())
+
+    def test_threads_setting(self):
+        from django.test.utils import override_settings
+        self.parallel._executor = None
+        with override_settings(DJANGO_PYODBC_PARALLEL_THREADS=3):
+            self.assertEqual(self.parallel.get_executor().max_threads, 3)
+
+    def test_nested_batch(self):
+        def query():
+            return self.parallel.run_parallel([returns(1), returns(2)], max_workers=2)
+        self.assertEqual(self.parallel.run_parallel([query, query], max_workers=2), [[1, 2], [1, 2]])
+
+
+class CancellableCursor(FakeCursor):
+
+    def cancel(self):
+        self.connection.cancelled = True
+
+
+class CancellableConnection(FakeConnection):
+    cancelled = False
+
+    def cursor(self):
+        return CancellableCursor(self)
+
+
+@requires_pyodbc
+class CancelTests(unittest.TestCase):
+
+    def run_blocked(self, raw):
+        from django.db import connection
+        from django_pyodbc.parallel import ParallelTimeout, run_parallel
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def query():
+            connection.connection = raw
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            release.wait(5)
+            cursor.close()
+        self.assertRaises(ParallelTimeout, run_parallel, [query], 1, 0.05)
+
+    def test_cancel(self):
+        records = record_logs(self, 'django_pyodbc')
+        raw = CancellableConnection()
+        self.run_blocked(raw)
+        self.assertTrue(raw.cancelled)
+        self.assertFalse(raw.closed)
+        self.assertEqual(records, [])
+
+    def test_close_when_cancel_fails(self):
+        # pyodbc 3 has no Cursor.cancel()
+        records = record_logs(self, 'django_pyodbc')
+        raw = FakeConnection()
+        self.run_blocked(raw)
+        self.assertTrue(raw.closed)
+        self.assertEqual(len(records), 1)
+        self.assertIsNotNone(records[0].exc_info)
+
+
+@requires_pyodbc
+class RunAsyncTests(unittest.TestCase):
+
+    def test_result(self):
+        from django_pyodbc.parallel import run_async
+        done = []
+        batch = run_async([returns(1, 0.05), returns(2)], max_workers=2)
+        batch.add_done_callback(done.append)
+        self.assertEqual(batch.result(5), [1, 2])
+        self.assertTrue(batch.done())
+        self.assertEqual(done, [batch])
+        # called right away once the batch is done
+        batch.add_done_callback(done.append)
+        self.assertEqual(done, [batch, batch])
+        self.assertFalse(batch.cancel())
+
+    def test_error(self):
+        from django_pyodbc.parallel import run_async
+        batch = run_async([raises(ValueError("bad query"))])
+        self.assertRaises(ValueError, batch.result, 5)
+
+    def test_result_timeout(self):
+        from django_pyodbc.parallel import ParallelTimeout, run_async
+        release = threading.Event()
+        batch = run_async([release.wait])
+        self.assertRaises(ParallelTimeout, batch.result, 0.02)
+        self.assertFalse(batch.done())
+        release.set()
+        self.assertEqual(batch.result(5), [True])
+
+    def test_cancel(self):
+        from django_pyodbc.parallel import ParallelCancelled, run_async
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = time.time()
+        batch = run_async([release.wait, returns(1)], max_workers=1)
+        self.assertTrue(batch.cancel())
+        self.assertRaises(ParallelCancelled, batch.result, 5)
+        self.assertTrue(batch.cancelled())
+        self.assertTrue(time.time() - started < 1)
+
+    def test_timeout(self):
+        from django_pyodbc.parallel import ParallelTimeout, run_async
+        release = threading.Event()
+        self.addCleanup(release.set)
+        batch = run_async([release.wait, returns(1)], max_workers=1, timeout=0.05)
+        self.assertRaises(ParallelTimeout, batch.result, 5)
+        self.assertFalse(batch.cancelled())
@@ -0,0 +1,159 @@
+import tempfile
+import unittest
+
+from support import FakeConnection, record_logs, requires_pyodbc
+
+from django.db import utils
+
+from django_pyodbc.pool import ConnectionPool, PoolTimeout, get_pool, _pools
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_release_twice(self):
+        pool = ConnectionPool(self.connect, max_size=2)
+        pooled = pool.acquire()
+        pooled.close()
+        pooled.close()
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['in_use']), (1, 1, 0))
+        # the connection is handed out once, not twice
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNot(first._connection, second._connection)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_reuse(self):
+        pool = ConnectionPool(self.connect, max_size=1)
+        first = pool.acquire()
+        raw = first._connection
+        first.close()
+        second = pool.acquire()
+        self.assertIsNot(first, second)
+        self.assertIs(second._connection, raw)
+        self.assertEqual(raw.rollbacks, 1)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_released_proxy_is_detached(self):
+        pool = ConnectionPool(self.connect, max_size=1)
+        stale = pool.acquire()
+        stale.close()
+        current = pool.acquire()
+        self.assertRaises(utils.InterfaceError, getattr, stale, 'cursor')
+        # closing the stale proxy does not give back the current checkout
+        stale.close()
+        self.assertEqual(pool.stats()['in_use'], 1)
+        current.cursor().execute('SELECT 1')
+        self.assertEqual(self.opened[0].statements, [('SELECT 1', ())])
+
+    def test_wait_timeout(self):
+        pool = ConnectionPool(self.connect, max_size=1, wait_timeout=0.01)
+        pool.acquire()
+        self.assertRaises(PoolTimeout, pool.acquire)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_failed_rollback_discards(self):
+        pool = ConnectionPool(self.connect, max_size=1)
+        pooled = pool.acquire()
+        raw = pooled._connection
+
+        def rollback():
+            raise Exception("connection lost")
+        raw.rollback = rollback
+        pooled.close()
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertIsNot(pool.acquire()._connection, raw)
+
+    def test_fill(self):
+        pool = ConnectionPool(self.connect, min_size=2, max_size=3)
+        pool.fill()
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['connects']), (2, 2, 2))
+
+
+class GetPoolTests(unittest.TestCase):
+
+    def tearDown(self):
+        for key in list(_pools):
+            if key[0] == 'unittest':
+                _pools.pop(key).close_all()
+
+    def test_keyed_by_settings(self):
+        first = get_pool(('unittest', 'db1'), FakeConnection)
+        self.assertIs(get_pool(('unittest', 'db1'), FakeConnection), first)
+        self.assertIsNot(get_pool(('unittest', 'db2'), FakeConnection), first)
+
+    def test_min_size_opened_on_creation(self):
+        pool = get_pool(('unittest', 'db1'), FakeConnection, {'min_size': 2})
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    @requires_pyodbc
+    def test_database_name_change(self):
+        from django_pyodbc.base import DatabaseWrapper
+        capture = tempfile.NamedTemporaryFile(suffix='.capture')
+        self.addCleanup(capture.close)
+        settings_dict = {
+            'ENGINE': 'django_pyodbc', 'NAME': 'db1', 'USER': 'user', 'PASSWORD': '',
+            'HOST': '127.0.0.1', 'PORT': '', 'OPTIONS': {
+                'driver': 'EXASolution Driver', 'pool': {'max_size': 1},
+                'replay': {'path': capture.name},
+            },
+        }
+        wrapper = DatabaseWrapper(dict(settings_dict), 'unittest')
+        first = wrapper.get_new_connection(wrapper.settings_dict)
+        settings_dict['NAME'] = 'db2'
+        renamed = DatabaseWrapper(dict(settings_dict), 'unittest')
+        # with the same key, the second checkout would time out
+        second = renamed.get_new_connection(renamed.settings_dict)
+        self.assertIsNot(first._connection, second._connection)
+        first.close()
+        second.close()
+
+    @requires_pyodbc
+    def test_autocommit_reset_on_checkout(self):
+        from django_pyodbc.base import DatabaseWrapper
+        capture = tempfile.NamedTemporaryFile(suffix='.capture')
+        self.addCleanup(capture.close)
+        wrapper = DatabaseWrapper({
+            'ENGINE': 'django_pyodbc', 'NAME': 'db1', 'USER': 'user', 'PASSWORD': '',
+            'HOST': '127.0.0.1', 'PORT': '', 'AUTOCOMMIT': True, 'CONN_MAX_AGE': 0, 'TIME_ZONE': None, 'OPTIONS': {
+                'driver': 'EXASolution Driver', 'pool': {'max_size': 1},
+                'replay': {'path': capture.name},
+            },
+        }, 'unittest')
+        wrapper.connect()
+        raw = wrapper.connection._connection
+        # connect() sets the autocommit of the checked out connection to
+        # the AUTOCOMMIT setting, on
+        self.assertIs(raw.autocommit, True)
+        wrapper.set_autocommit(False)
+        self.assertIs(raw.autocommit, False)
+        wrapper.close()
+        wrapper.connect()
+        self.assertIs(wrapper.connection._connection, raw)
+        self.assertIs(raw.autocommit, True)
+        wrapper.close()
+
+    def test_autocommit_option_overridden(self):
+        from django_pyodbc.base import DatabaseWrapper
+        records = record_logs(self, 'django_pyodbc')
+        settings_dict = {
+            'ENGINE': 'django_pyodbc', 'NAME': 'db1', 'USER': 'user', 'PASSWORD': '',
+            'HOST': '127.0.0.1', 'PORT': '', 'AUTOCOMMIT': True, 'CONN_MAX_AGE': 0, 'TIME_ZONE': None,
+            'OPTIONS': {'driver': 'EXASolution Driver', 'autocommit': True},
+        }
+        DatabaseWrapper(settings_dict, 'autocommit_same')
+        self.assertEqual(records, [])
+        settings_dict['OPTIONS']['autocommit'] = False
+        DatabaseWrapper(settings_dict, 'autocommit_differs')
+        DatabaseWrapper(settings_dict, 'autocommit_differs')
+        self.assertEqual(len(records), 1)
+        self.assertIn("AUTOCOMMIT setting (True)", records[0].getMessage())
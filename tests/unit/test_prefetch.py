@@ -0,0 +1,195 @@
+import threading
+import unittest
+
+from support import FakeConnection, FakeCursor, requires_pyodbc, use_connection
+
+from django_pyodbc.prefetch import Prefetcher
+
+
+class RowsCursor(FakeCursor):
+    """
+    Cursor whose result set is `count` rows numbered from 0, raising
+    `error` once `fail_after` rows were fetched.
+    """
+    def __init__(self, count, fail_after=None, error=None):
+        super(RowsCursor, self).__init__(FakeConnection())
+        self.rows = [(i,) for i in range(count)]
+        self.fail_after = fail_after
+        self.error = error
+        self.fetched = 0
+        self.threads = set()
+
+    def fetchmany(self, size=1):
+        if self.fail_after is not None and self.fetched >= self.fail_after:
+            raise self.error
+        rows = super(RowsCursor, self).fetchmany(size)
+        self.fetched += len(rows)
+        self.threads.add(threading.current_thread())
+        return rows
+
+
+class PrefetcherTests(unittest.TestCase):
+
+    def test_order(self):
+        prefetcher = Prefetcher(RowsCursor(25), 4)
+        rows = [prefetcher.fetchone()]
+        rows.extend(prefetcher.fetchmany(7))
+        rows.extend(prefetcher.fetchmany(3))
+        rows.extend(prefetcher.fetchall())
+        self.assertEqual(rows, [(i,) for i in range(25)])
+        self.assertEqual(prefetcher.fetchmany(5), [])
+        self.assertIsNone(prefetcher.fetchone())
+        prefetcher.close()
+
+    def test_empty_result(self):
+        prefetcher = Prefetcher(RowsCursor(0), 4)
+        self.assertEqual(prefetcher.fetchall(), [])
+        prefetcher.close()
+
+    def test_error_raised_by_fetch(self):
+        error = ValueError("connection lost")
+        prefetcher = Prefetcher(RowsCursor(25, fail_after=8, error=error), 4)
+        self.assertEqual(prefetcher.fetchmany(8), [(i,) for i in range(8)])
+        try:
+            prefetcher.fetchmany(1)
+        except ValueError as e:
+            self.assertIs(e, error)
+        else:
+            self.fail("the error of the driver was not raised")
+        self.assertEqual(prefetcher.fetchall(), [])
+        prefetcher.close()
+
+    def test_error_raised_by_fetchall(self):
+        error = ValueError("connection lost")
+        prefetcher = Prefetcher(RowsCursor(25, fail_after=0, error=error), 4)
+        self.assertRaises(ValueError, prefetcher.fetchall)
+        prefetcher.close()
+
+    def test_detach_keeps_rows(self):
+        cursor = RowsCursor(100)
+        prefetcher = Prefetcher(cursor, 4)
+        rows = prefetcher.fetchmany(3)
+        prefetcher.detach()
+        self.assertFalse(prefetcher._thread.is_alive())
+        cursor.threads.clear()
+        rows.extend(prefetcher.fetchmany(10))
+        rows.extend(prefetcher.fetchall())
+        self.assertEqual(rows, [(i,) for i in range(100)])
+        # the rest was read by this thread
+        self.assertEqual(cursor.threads, set([threading.current_thread()]))
+        prefetcher.close()
+
+    def test_detach_keeps_error(self):
+        error = ValueError("connection lost")
+        prefetcher = Prefetcher(RowsCursor(25, fail_after=8, error=error), 4)
+        self.assertEqual(prefetcher.fetchmany(8), [(i,) for i in range(8)])
+        prefetcher._thread.join(1)
+        prefetcher.detach()
+        self.assertRaises(ValueError, prefetcher.fetchmany, 1)
+        prefetcher.close()
+
+    def test_close_stops_reading(self):
+        cursor = RowsCursor(1000)
+        prefetcher = Prefetcher(cursor, 10, depth=1)
+        self.assertEqual(prefetcher.fetchone(), (0,))
+        prefetcher.close()
+        self.assertFalse(prefetcher._thread.is_alive())
+        fetched = cursor.fetched
+        self.assertTrue(fetched < 1000)
+        self.assertEqual(prefetcher.fetchall(), [])
+        self.assertEqual(cursor.fetched, fetched)
+
+
+@requires_pyodbc
+class CursorPrefetchTests(unittest.TestCase):
+
+    def cursor(self, count):
+        from django_pyodbc.base import CursorWrapper
+        cursor = CursorWrapper(RowsCursor(count), 'utf-8')
+        cursor.prefetch = True
+        self.addCleanup(cursor.stop_prefetch)
+        return cursor
+
+    def test_small_result_not_prefetched(self):
+        # Django's iterator reads 100 rows at a time
+        cursor = self.cursor(100)
+        self.assertEqual(len(cursor.fetchmany_raw(100)), 100)
+        self.assertEqual(cursor.fetchmany_raw(100), [])
+        self.assertIsNone(cursor.prefetcher)
+
+    def test_large_result_prefetched(self):
+        cursor = self.cursor(2500)
+        rows = []
+        for i in range(9):
+            rows.extend(cursor.fetchmany_raw(100))
+        self.assertIsNone(cursor.prefetcher)
+        rows.extend(cursor.fetchmany_raw(100))
+        self.assertIsNotNone(cursor.prefetcher)
+        while True:
+            chunk = cursor.fetchmany_raw(100)
+            if not chunk:
+                break
+            rows.extend(chunk)
+        self.assertEqual(rows, [(i,) for i in range(2500)])
+
+
+class SharedCursor(FakeCursor):
+    """
+    Records the threads reading its rows and fails when another statement
+    runs on the connection while a helper thread reads them.
+    """
+    def execute(self, sql, *params):
+        self.connection.executed.set()
+        super(SharedCursor, self).execute(sql, *params)
+        self.connection.executed.clear()
+        return self
+
+    def fetchmany(self, size=1):
+        if self.connection.executed.is_set():
+            raise AssertionError("fetched while another statement runs")
+        self.connection.threads.append(threading.current_thread())
+        return super(SharedCursor, self).fetchmany(size)
+
+
+class SharedConnection(FakeConnection):
+
+    def __init__(self, *args, **kwargs):
+        super(SharedConnection, self).__init__(*args, **kwargs)
+        self.executed = threading.Event()
+        self.threads = []
+
+    def cursor(self):
+        return SharedCursor(self)
+
+
+@requires_pyodbc
+class ConnectionPrefetchTests(unittest.TestCase):
+
+    def test_detached_by_other_statement(self):
+        raw = SharedConnection()
+        connection = use_connection(self, raw)
+        raw.results['SELECT 1'] = [(i,) for i in range(50)]
+        self.addCleanup(setattr, connection, 'prefetch', connection.prefetch)
+        self.addCleanup(setattr, connection, 'fetch_batch_size', connection.fetch_batch_size)
+        connection.prefetch, connection.fetch_batch_size = True, 5
+        # the CursorWrapper under Django's cursor
+        outer = connection._cursor()
+        outer.execute('SELECT 1')
+        rows = outer.fetchmany_raw(5)
+        self.assertIsNotNone(outer.prefetcher)
+        self.assertIn(outer, connection.prefetching)
+        inner = connection._cursor()
+        # e.g. a related object loaded inside QuerySet.iterator()
+        inner.execute('SELECT 2')
+        self.assertNotIn(outer, connection.prefetching)
+        self.assertFalse(outer.prefetcher._thread.is_alive())
+        del raw.threads[:]
+        while True:
+            chunk = outer.fetchmany_raw(5)
+            if not chunk:
+                break
+            rows.extend(chunk)
+        self.assertEqual(rows, [(i,) for i in range(50)])
+        self.assertTrue(all(thread is threading.current_thread() for thread in raw.threads))
+        outer.close()
+        inner.close()
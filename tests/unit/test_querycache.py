@@ -0,0 +1,92 @@
+import datetime
+import unittest
+
+from support import requires_pyodbc
+
+from django_pyodbc import querycache
+from django_pyodbc.querycache import QueryTemplateCache
+
+
+@unittest.skipUnless(querycache.SUPPORTED, "the query cache needs Django 1.8")
+class QueryTemplateCacheTests(unittest.TestCase):
+
+    def test_rejected_lookups_are_not_hits(self):
+        cache = QueryTemplateCache(8)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'SELECT %s', [1])
+        self.assertEqual(cache.get('key'), ('SELECT %s', 1))
+        # a template whose parameters did not match
+        cache.set('other', 'SELECT %s', [1])
+        cache.get('other')
+        cache.reject('other')
+        self.assertIs(cache.get('other'), querycache.REJECTED)
+        info = cache.info()
+        self.assertEqual((info['hits'], info['misses'], info['rejected'], info['uncacheable']), (1, 1, 1, 1))
+        self.assertEqual(info['hit_rate'], 0.5)
+
+    def test_builtin_lookups(self):
+        from django.db.models import lookups
+        self.assertTrue(set([lookups.Exact, lookups.In, lookups.Range]) <= querycache.BUILTIN_LOOKUPS)
+
+
+@requires_pyodbc
+@unittest.skipUnless(querycache.SUPPORTED, "the query cache needs Django 1.8")
+class QueryCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        from django.db import connection
+        self.connection = connection
+        self.cache = connection.query_cache = QueryTemplateCache(64)
+
+    def tearDown(self):
+        del self.connection.query_cache
+
+    def querysets(self, i):
+        from django.contrib.auth.models import Permission, User
+        return [
+            User.objects.filter(username='u%d' % i, is_active=True),
+            User.objects.filter(id__in=[1, 2, i]).exclude(email__startswith='x%d' % i),
+            User.objects.filter(date_joined__gte=datetime.datetime(2000 + i, 1, 1)).order_by('-id')[10:20],
+            Permission.objects.select_related('content_type').filter(codename='x%d' % i),
+            User.objects.only('username').filter(username__range=('a', 'b%d' % i)),
+        ]
+
+    def fresh(self, queryset):
+        query = queryset.query.clone()
+        query.bypass_query_cache = True
+        return query.get_compiler('default').as_sql()
+
+    def test_same_sql_as_compiled(self):
+        for i in range(3):
+            for queryset in self.querysets(i):
+                expected = self.fresh(queryset)
+                self.assertEqual(queryset.query.get_compiler('default').as_sql(), expected)
+        info = self.cache.info()
+        self.assertEqual((info['misses'], info['hits']), (5, 10))
+
+    def test_uncacheable(self):
+        from django.contrib.auth.models import User
+        queryset = User.objects.extra(where=['id > %s'], params=[1])
+        self.assertEqual(queryset.query.get_compiler('default').as_sql(), self.fresh(queryset))
+        self.assertEqual(self.cache.info()['uncacheable'], 1)
+        self.assertEqual(len(self.cache.templates), 0)
+
+    def test_empty_slice(self):
+        from django.contrib.auth.models import User
+        for i in range(3):
+            list(User.objects.filter(username='u%d' % i)[5:5])
+        info = self.cache.info()
+        self.assertEqual((info['uncacheable'], info['rejected'], info['misses']), (3, 0, 0))
+
+    def test_rejected_template(self):
+        from django.contrib.auth.models import User
+        queryset = User.objects.filter(username='a')
+        query_compiler = queryset.query.get_compiler('default')
+        expected = self.fresh(queryset)
+        key = querycache.query_key(queryset.query, query_compiler.__class__, True, False, False)
+        self.cache.set(key, 'BOGUS %s %s', [1, 2])
+        for i in range(3):
+            self.assertEqual(User.objects.filter(username='a').query.get_compiler('default').as_sql(), expected)
+        info = self.cache.info()
+        self.assertEqual((info['rejected'], info['hits']), (1, 0))
+        self.assertIs(self.cache.templates.get(key), querycache.REJECTED)
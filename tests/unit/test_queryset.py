@@ -0,0 +1,153 @@
+import re
+import unittest
+
+from support import FakeConnection, FakeCursor, pyodbc, requires_pyodbc, use_connection
+
+
+class ReturnIdCursor(FakeCursor):
+    """
+    Answers the statements reading back @sqlserver_ado_return_id with one
+    key per row inserted, and the identity of the table with 100.
+    """
+    def execute(self, sql, *params):
+        super(ReturnIdCursor, self).execute(sql, *params)
+        sql = self.connection.statements[-1][0]
+        if '@sqlserver_ado_return_id' in sql:
+            count = len(re.findall(r'\(\?(?:, \?)*, \d+\)', sql)) + sql.count('DEFAULT VALUES')
+            count += self.connection.extra_ids
+            self.rows = [(self.connection.next_id + i,) for i in range(count)]
+            self.connection.next_id += count
+        elif 'EXA_ALL_COLUMNS' in sql:
+            self.rows = [(self.connection.identity,)]
+        elif sql.startswith('ALTER TABLE') and self.connection.concurrent:
+            # another transaction reserved the same values first
+            reserved = self.connection.concurrent.pop(0)
+            self.connection.identity += reserved
+            raise pyodbc.OperationalError('40001', 'GlobalTransactionRollback msg: Transaction collision')
+        return self
+
+
+class ReturnIdConnection(FakeConnection):
+    next_id = 1
+    extra_ids = 0
+    identity = 100
+    # sizes of the reservations colliding with the next ones
+    concurrent = ()
+
+    def cursor(self):
+        return ReturnIdCursor(self)
+
+
+@requires_pyodbc
+class BulkCreateReturningIdsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = ReturnIdConnection()
+        self.connection = connection = use_connection(self, self.raw)
+        for option in ('bulk_return_ids', 'bulk_max_rows'):
+            self.addCleanup(setattr, connection, option, getattr(connection, option))
+        connection.bulk_return_ids = 'output'
+
+    def bulk_create(self, objs, **kwargs):
+        from django_pyodbc.queryset import PyodbcQuerySet
+        return PyodbcQuerySet(objs[0].__class__).bulk_create(objs, **kwargs)
+
+    def statements(self, marker):
+        return [(sql, params) for sql, params in self.raw.statements if marker in sql]
+
+    def test_output(self):
+        from django.contrib.auth.models import Group
+        self.connection.bulk_max_rows = 2
+        objs = [Group(name='g%d' % i) for i in range(5)] + [Group(id=50, name='x')]
+        result = self.bulk_create(objs)
+        self.assertEqual([obj.pk for obj in result], [1, 2, 3, 4, 5, 50])
+        self.assertEqual([obj._state.adding for obj in result], [False] * 5 + [True])
+        merges = self.statements('MERGE INTO')
+        self.assertEqual(len(merges), 3)
+        sql, params = merges[0]
+        self.assertIn('MERGE INTO "AUTH_GROUP" USING (VALUES (?, 0), (?, 1)) AS "SRC" ("NAME", "ORD") '
+                      'ON 1 = 0 WHEN NOT MATCHED THEN INSERT ("NAME") VALUES ("SRC"."NAME") '
+                      'OUTPUT "SRC"."ORD", INSERTED."ID" INTO @sqlserver_ado_return_id ("ORD", "ID")', sql)
+        self.assertTrue(sql.endswith(';SELECT "ID" FROM @sqlserver_ado_return_id ORDER BY "ORD"'), sql)
+        self.assertEqual(params, ('g0', 'g1'))
+        self.assertEqual(len(self.statements('IDENTITY_INSERT')), 1)
+
+    def test_output_key_count_mismatch(self):
+        from django.contrib.auth.models import Group
+        from django.db import DatabaseError
+        self.raw.extra_ids = -1
+        self.assertRaises(DatabaseError, self.bulk_create, [Group(name='a'), Group(name='b')])
+
+    def test_identity(self):
+        from django.contrib.auth.models import Group
+        self.connection.bulk_return_ids = 'identity'
+        result = self.bulk_create([Group(name='a'), Group(name='b'), Group(name='c')])
+        self.assertEqual([obj.pk for obj in result], [100, 101, 102])
+        [(alter, params)] = self.statements('ALTER TABLE')
+        self.assertEqual(alter, 'ALTER TABLE "AUTH_GROUP" MODIFY COLUMN "ID" IDENTITY 103')
+        [(insert, params)] = self.statements('INSERT INTO')
+        self.assertEqual(params, (100, 'a', 101, 'b', 102, 'c'))
+
+    def test_identity_collision_retried(self):
+        from django.contrib.auth.models import Group
+        self.connection.bulk_return_ids = 'identity'
+        self.raw.concurrent = [5, 2]
+        result = self.bulk_create([Group(name='a'), Group(name='b')])
+        self.assertEqual([obj.pk for obj in result], [107, 108])
+        alters = [sql for sql, params in self.statements('ALTER TABLE')]
+        self.assertEqual(alters, ['ALTER TABLE "AUTH_GROUP" MODIFY COLUMN "ID" IDENTITY %d' % n
+                                  for n in (102, 107, 109)])
+        self.assertEqual(self.raw.rollbacks, 2)
+        [(insert, params)] = self.statements('INSERT INTO')
+        self.assertEqual(params, (107, 'a', 108, 'b'))
+
+    def test_identity_collision_in_transaction(self):
+        from django.contrib.auth.models import Group
+        from django.db import DatabaseError, transaction
+        self.connection.bulk_return_ids = 'identity'
+        self.raw.concurrent = [5]
+        objs = [Group(name='a')]
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.bulk_create(objs)
+        self.assertIsNone(objs[0].pk)
+        self.assertEqual(len(self.statements('ALTER TABLE')), 1)
+
+    def test_identity_collision_retries_exhausted(self):
+        from django.contrib.auth.models import Group
+        from django.db import DatabaseError
+        self.connection.bulk_return_ids = 'identity'
+        self.addCleanup(setattr, self.connection, 'bulk_collision_retries', self.connection.bulk_collision_retries)
+        self.connection.bulk_collision_retries = 1
+        self.raw.concurrent = [1, 1]
+        self.assertRaises(DatabaseError, self.bulk_create, [Group(name='a')])
+        self.assertEqual(len(self.statements('ALTER TABLE')), 2)
+
+
+@requires_pyodbc
+class BulkBatchSizeTests(unittest.TestCase):
+
+    def test_limits(self):
+        from django.contrib.auth.models import Group
+        from django.db import connection
+        fields = [Group._meta.get_field('name')]
+        self.assertEqual(connection.ops.bulk_batch_size(fields, range(5000)), connection.bulk_max_rows)
+        self.assertEqual(connection.ops.bulk_batch_size(fields, range(10)), 10)
+        self.assertEqual(connection.ops.bulk_batch_size(fields * 4, range(5000)), connection.bulk_max_params // 4)
+
+    def test_field_names(self):
+        # Collector.get_del_batches() passes the names of the fields
+        from django.db import connection
+        self.assertEqual(connection.ops.bulk_batch_size(['group'], range(5000)), connection.bulk_max_rows)
+
+    def test_delete_through_collector(self):
+        from django.contrib.auth.models import Group
+        raw = FakeConnection()
+        use_connection(self, raw)
+        Group(id=1).delete()
+        # the related rows first, in an order depending on the version
+        self.assertEqual(raw.statements[-1], ('DELETE FROM "AUTH_GROUP" WHERE "AUTH_GROUP"."ID" IN (?)', (1,)))
+        self.assertEqual(sorted(sql for sql, params in raw.statements[:-1]), [
+            'DELETE FROM "AUTH_GROUP_PERMISSIONS" WHERE "AUTH_GROUP_PERMISSIONS"."GROUP_ID" IN (?)',
+            'DELETE FROM "AUTH_USER_GROUPS" WHERE "AUTH_USER_GROUPS"."GROUP_ID" IN (?)',
+        ])
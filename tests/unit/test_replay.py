@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import requires_pyodbc
+
+from django_pyodbc.replay import ReplayConnection, decode_value, encode_value, read_log
+
+
+def entry(sql, fp, **kwargs):
+    result = {'ts': 0.0, 'sql': sql, 'fp': fp, 'params': [], 'dur': 0.0}
+    result.update(kwargs)
+    return result
+
+
+class EncodeValueTests(unittest.TestCase):
+
+    def assertRoundTrip(self, value, tag):
+        encoded = encode_value(value)
+        self.assertEqual(list(encoded), [tag])
+        # survives the JSON of the log
+        decoded = decode_value(json.loads(json.dumps(encoded)))
+        self.assertEqual(decoded, value)
+        self.assertEqual(type(decoded), type(value))
+
+    def test_datetime(self):
+        self.assertRoundTrip(datetime.datetime(2016, 2, 29, 13, 14, 15, 123456), '$dt')
+        self.assertRoundTrip(datetime.datetime(2016, 2, 29, 13, 14, 15), '$dt')
+
+    def test_date(self):
+        self.assertRoundTrip(datetime.date(2016, 2, 29), '$d')
+
+    def test_time(self):
+        self.assertRoundTrip(datetime.time(13, 14, 15), '$t')
+        self.assertRoundTrip(datetime.time(13, 14, 15, 500), '$t')
+
+    def test_decimal(self):
+        self.assertRoundTrip(decimal.Decimal('12345678901234567890.000000001'), '$dec')
+
+    def test_bytes(self):
+        self.assertRoundTrip(bytearray(b'\x00\xff\xfe'), '$b')
+
+    def test_json_types(self):
+        for value in (None, True, 1, 1.5, u'text', u'd\xe9j\xe0'):
+            self.assertEqual(decode_value(encode_value(value)), value)
+
+    def test_unknown_tag(self):
+        self.assertRaises(ValueError, decode_value, {'$x': '1'})
+
+
+class ReadLogTests(unittest.TestCase):
+
+    def test_params_decoded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'capture')
+        when = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        with open(path, 'w') as f:
+            f.write(json.dumps(entry('SELECT 1', 'SELECT ?', params=[encode_value(when), 2])) + '\n\n')
+        entries = list(read_log(path))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['params'], (when, 2))
+
+
+class ReplayConnectionTests(unittest.TestCase):
+
+    def test_last_entry_repeated(self):
+        connection = ReplayConnection([
+            entry('SELECT 1', 'SELECT ?', count=1),
+            entry('SELECT 2', 'SELECT ?', count=2),
+        ], speed=0)
+        counts = [connection.next_entry(b'SELECT 3')['count'] for i in range(4)]
+        self.assertEqual(counts, [1, 2, 2, 2])
+        self.assertEqual(connection.misses, 0)
+
+    def test_misses(self):
+        connection = ReplayConnection([entry('SELECT 1', 'SELECT ?')], speed=0)
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM T')
+        self.assertIsNone(cursor.description)
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(connection.misses, 1)
+
+    def test_rows_made_up_from_shape(self):
+        shape = [['ID', 'int', 18], ['NAME', 'str', 4], ['CREATED', 'date', 10]]
+        connection = ReplayConnection([
+            entry('SELECT * FROM T', 'SELECT * FROM T', count=-1, rows=3, shape=shape),
+            entry('SELECT * FROM T', 'SELECT * FROM T', count=-1, rows=1),
+        ], speed=0)
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM T')
+        self.assertEqual([column[0] for column in cursor.description], ['ID', 'NAME', 'CREATED'])
+        self.assertEqual(cursor.fetchone(), (0, u'0xxx', datetime.date(2000, 1, 1)))
+        self.assertEqual(len(cursor.fetchall()), 2)
+        self.assertEqual(cursor.fetchall(), [])
+        # the shape is written once per fingerprint and kept for its later entries
+        cursor.execute('SELECT * FROM T')
+        self.assertEqual(len(cursor.fetchmany(10)), 1)
+
+    @requires_pyodbc
+    def test_error_entry_raises(self):
+        from django_pyodbc.base import Database
+        connection = ReplayConnection([entry('SELECT 1/0', 'SELECT ?/?', err='DataError')], speed=0)
+        self.assertRaises(Database.Error, connection.cursor().execute, 'SELECT 1/0')
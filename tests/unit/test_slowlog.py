@@ -0,0 +1,123 @@
+import time
+import unittest
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from support import FakeConnection, FakeCursor, record_logs, requires_pyodbc, use_connection
+
+from django_pyodbc import slowlog
+from django_pyodbc.slowlog import PROFILE_SQL, SlowQuery, log_slow_query
+
+
+class StatementCursor(object):
+    # the attributes of a CursorWrapper SlowQuery reads
+    db = None
+
+    def __init__(self, sql, cursor):
+        self.last_sql = sql
+        self.cursor = cursor
+
+
+def slow_select(connect=None):
+    cursor = FakeCursor(FakeConnection())
+    cursor.rowcount = -1
+    slow = SlowQuery(StatementCursor('SELECT "A" FROM "T"', cursor), 'SELECT "A" FROM "T"', (), 2.0)
+    slow.connect = connect
+    return slow
+
+
+def wait_for(records, count=1, timeout=5):
+    deadline = time.time() + timeout
+    while len(records) < count and time.time() < deadline:
+        time.sleep(0.01)
+    return records
+
+
+class ProfileQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.records = record_logs(self, 'django_pyodbc.slow_queries')
+        self.addCleanup(setattr, slowlog, '_profile_queue', slowlog._profile_queue)
+
+    def test_full_queue_logs_without_profile(self):
+        # a profiler busy with a statement, and one more waiting
+        slowlog._profile_queue = Queue(1)
+        slowlog._profile_queue.put((slow_select(), 0))
+        started = time.time()
+        log_slow_query(slow_select(connect=FakeConnection))
+        self.assertTrue(time.time() - started < 0.5)
+        self.assertEqual(len(self.records), 1)
+        self.assertIsNone(self.records[0].profile)
+        self.assertEqual(slowlog._profile_queue.qsize(), 1)
+
+    def test_profiled_in_helper_thread(self):
+        raw = FakeConnection()
+        raw.results['SELECT CURRENT_STATEMENT'] = [(12,)]
+        raw.results[PROFILE_SQL] = [(1, 'COMPILE / EXECUTE', None, None, None, None, 0.001, 1, 0),
+                                    (2, 'SCAN', None, 'T', 100, 5, 0.05, 90, 1)]
+        slowlog._profile_queue = None
+        slow = slow_select(connect=lambda: raw)
+        slow.rows = 5
+        log_slow_query(slow, fetched=True)
+        [record] = wait_for(self.records)
+        self.assertEqual(record.rowcount, 5)
+        self.assertEqual([part['PART_NAME'] for part in record.profile], ['COMPILE / EXECUTE', 'SCAN'])
+        self.assertEqual([sql for sql, params in raw.statements], [
+            "ALTER SESSION SET PROFILE = 'ON'",
+            'SELECT "A" FROM "T"',
+            'SELECT CURRENT_STATEMENT',
+            "ALTER SESSION SET PROFILE = 'OFF'",
+            'FLUSH STATISTICS',
+            PROFILE_SQL,
+        ])
+        self.assertEqual(raw.statements[-1][1], (11,))
+        self.assertTrue(raw.closed)
+
+    def test_failed_profile_still_logged(self):
+        def connect():
+            raise Exception("can't connect")
+        slowlog._profile_queue = None
+        log_slow_query(slow_select(connect=connect))
+        [record] = wait_for(self.records)
+        self.assertIsNone(record.profile)
+
+
+@requires_pyodbc
+class SlowQueryLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = FakeConnection()
+        self.connection = connection = use_connection(self, self.raw)
+        self.addCleanup(setattr, connection, 'slow_query_threshold', connection.slow_query_threshold)
+        connection.slow_query_threshold = 0
+        self.records = record_logs(self, 'django_pyodbc.slow_queries')
+
+    def test_select_logged_at_end_of_result_set(self):
+        self.raw.results['SELECT "A" FROM "T" WHERE "B" = ?'] = [(1,), (2,), (3,)]
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [1])
+        self.assertEqual(cursor.fetchmany(2), [(1,), (2,)])
+        self.assertEqual(self.records, [])
+        self.assertEqual(cursor.fetchmany(2), [(3,)])
+        [record] = self.records
+        self.assertEqual((record.sql, record.params, record.rowcount), ('SELECT "A" FROM "T" WHERE "B" = %s', [1], 3))
+        cursor.close()
+        self.assertEqual(len(self.records), 1)
+
+    def test_select_logged_when_closed(self):
+        self.raw.results['SELECT "A" FROM "T"'] = [(1,), (2,), (3,)]
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T"')
+        cursor.fetchone()
+        self.assertEqual(self.records, [])
+        cursor.close()
+        self.assertEqual(self.records[0].rowcount, 1)
+
+    def test_other_statements_logged_right_away(self):
+        cursor = self.connection.cursor()
+        cursor.execute('UPDATE "T" SET "A" = %s', [1])
+        self.assertEqual(len(self.records), 1)
+        self.assertEqual(self.records[0].rowcount, 0)
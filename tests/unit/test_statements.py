@@ -0,0 +1,117 @@
+import unittest
+
+from support import FakeConnection, FakeCursor, requires_pyodbc, use_connection
+
+from django_pyodbc.statements import StatementCache
+
+
+class BrokenResultsCursor(FakeCursor):
+
+    def nextset(self):
+        raise Exception("connection lost")
+
+
+class StatementCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+
+    def test_checkin_discards_results(self):
+        cache = StatementCache(4)
+        cursor = self.connection.cursor()
+        cursor.rows = [(1,), (2,)]
+        cursor.description = [('A', None, None, None, None, None, True)]
+        cache.checkin('SELECT ?', cursor)
+        self.assertIs(cache.checkout('SELECT ?'), cursor)
+        self.assertEqual(cursor.rows, [])
+        self.assertIsNone(cursor.description)
+        self.assertFalse(cursor.closed)
+
+    def test_checkin_closes_cursor_whose_results_remain(self):
+        cache = StatementCache(4)
+        cursor = BrokenResultsCursor(self.connection)
+        cache.checkin('SELECT ?', cursor)
+        self.assertTrue(cursor.closed)
+        self.assertIsNone(cache.checkout('SELECT ?'))
+
+    def test_checkin_twice(self):
+        cache = StatementCache(4)
+        first, second = self.connection.cursor(), self.connection.cursor()
+        cache.checkin('SELECT ?', first)
+        cache.checkin('SELECT ?', second)
+        self.assertTrue(second.closed)
+        self.assertIs(cache.checkout('SELECT ?'), first)
+
+    def test_eviction_closes_cursor(self):
+        cache = StatementCache(8)
+        cursors = [self.connection.cursor() for i in range(9)]
+        for i, cursor in enumerate(cursors):
+            cache.checkin('SELECT %d' % i, cursor)
+        self.assertTrue(cursors[0].closed)
+        self.assertFalse(any(cursor.closed for cursor in cursors[1:]))
+        self.assertIsNone(cache.checkout('SELECT 0'))
+        self.assertEqual(cache.info()['size'], 8)
+
+    def test_close(self):
+        cache = StatementCache(4)
+        cached, late = self.connection.cursor(), self.connection.cursor()
+        cache.checkin('SELECT ?', cached)
+        cache.close()
+        cache.checkin('SELECT ?', late)
+        self.assertTrue(cached.closed)
+        self.assertTrue(late.closed)
+        self.assertEqual(len(cache.cursors), 0)
+
+
+@requires_pyodbc
+class PreparedCursorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = FakeConnection()
+        self.connection = connection = use_connection(self, self.raw)
+        self.cache = connection.statement_cache = StatementCache(4, self.raw)
+        self.addCleanup(setattr, connection, 'statement_cache', None)
+
+    def test_prepares_avoided(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [1])
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [2])
+        self.assertEqual((self.cache.prepares, self.cache.prepares_avoided), (1, 1))
+        first = cursor.cursor.cursor
+        cursor.close()
+
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [3])
+        # the cursor the statement is prepared on is taken from the cache
+        self.assertIs(cursor.cursor.cursor, first)
+        self.assertEqual((self.cache.prepares, self.cache.prepares_avoided), (1, 2))
+        cursor.execute('SELECT "A" FROM "T" WHERE "C" = %s', [3])
+        self.assertEqual((self.cache.prepares, self.cache.prepares_avoided), (2, 2))
+
+    def test_reconnect(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [1])
+        cached = cursor.cursor.cursor
+        cursor.close()
+        # close() of Django < 1.8 drops the connection without _close(),
+        # and the next cursor connects again
+        self.connection.connection = raw = FakeConnection()
+        raw.autocommit = True
+        self.connection.statement_cache_size = 4
+        self.addCleanup(setattr, self.connection, 'statement_cache_size', 0)
+
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT "A" FROM "T" WHERE "B" = %s', [2])
+        self.assertTrue(cached.closed)
+        self.assertIsNot(cursor.cursor.cursor, cached)
+        self.assertIs(cursor.cursor.cursor.connection, raw)
+        self.assertIsNot(self.connection.statement_cache, self.cache)
+        self.assertIs(self.connection.statement_cache.connection, raw)
+        cursor.close()
+
+    def test_not_prepared_without_params(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        self.assertEqual((self.cache.prepares, self.cache.prepares_avoided), (0, 0))
+        self.assertEqual(len(self.cache.cursors), 0)
@@ -0,0 +1,141 @@
+import unittest
+
+from support import FakeConnection, FakeCursor, pyodbc, requires_pyodbc, use_connection
+
+from django_pyodbc import tracing
+
+
+class Span(object):
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.exceptions.append(exc)
+
+    def end(self):
+        self.ended = True
+
+
+class RecordingTracer(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = Span(name, attributes)
+        self.spans.append(span)
+        return span
+
+
+class FailingCursor(FakeCursor):
+
+    def execute(self, sql, *params):
+        raise pyodbc.ProgrammingError('42000', 'syntax error')
+
+
+class FailingConnection(FakeConnection):
+
+    def cursor(self):
+        return FailingCursor(self)
+
+
+@requires_pyodbc
+class TracingTests(unittest.TestCase):
+
+    SQL = 'SELECT "A" FROM "T" WHERE "ID" = %s'
+
+    def setUp(self):
+        self.tracer = RecordingTracer()
+        tracing.set_tracer(self.tracer)
+        self.addCleanup(tracing.set_tracer, None)
+
+    def wrapper(self, connect):
+        from django.db import connection
+        from django_pyodbc.base import DatabaseWrapper
+        wrapper = DatabaseWrapper(connection.settings_dict, 'traced')
+        wrapper._connect = connect
+        return wrapper
+
+    def test_connect(self):
+        self.wrapper(FakeConnection).get_new_connection()
+        [span] = self.tracer.spans
+        self.assertEqual(span.name, 'db.connect')
+        self.assertEqual(span.attributes, {'db.alias': 'traced', 'db.pooled': False})
+        self.assertTrue(span.ended)
+
+    def test_connect_error(self):
+        def connect():
+            raise pyodbc.OperationalError('08001', 'unreachable')
+        self.assertRaises(pyodbc.OperationalError, self.wrapper(connect).get_new_connection)
+        [span] = self.tracer.spans
+        self.assertEqual(span.attributes['error.type'], 'OperationalError')
+        self.assertEqual(len(span.exceptions), 1)
+        self.assertTrue(span.ended)
+
+    def test_execute_and_fetch(self):
+        raw = FakeConnection()
+        raw.results['SELECT "A" FROM "T" WHERE "ID" = ?'] = [(1,), (2,), (3,)]
+        cursor = use_connection(self, raw).cursor()
+        cursor.execute(self.SQL, [1])
+        [execute] = self.tracer.spans
+        self.assertEqual(execute.name, 'db.execute')
+        self.assertEqual(execute.attributes, {
+            'db.alias': 'default', 'db.statement.fingerprint': 'SELECT "A" FROM "T" WHERE "ID" = ?',
+            'db.params': 1, 'db.rowcount': 3,
+        })
+        self.assertTrue(execute.ended)
+        self.assertEqual(len(cursor.fetchmany(2)), 2)
+        fetch = self.tracer.spans[1]
+        self.assertFalse(fetch.ended)
+        cursor.fetchmany(2)
+        self.assertEqual(len(self.tracer.spans), 2)
+        self.assertEqual(fetch.name, 'db.fetch')
+        self.assertEqual(fetch.attributes['db.statement.fingerprint'], 'SELECT "A" FROM "T" WHERE "ID" = ?')
+        self.assertEqual((fetch.attributes['db.rows'], fetch.attributes['db.batches'],
+                          fetch.attributes['db.batch_size']), (3, 2, 2))
+        self.assertTrue(fetch.ended)
+
+    def test_executemany(self):
+        cursor = use_connection(self, FakeConnection()).cursor()
+        cursor.executemany('INSERT INTO "T" ("A") VALUES (%s)', [(1,), (2,), (3,)])
+        [span] = self.tracer.spans
+        self.assertEqual(span.name, 'db.executemany')
+        self.assertEqual(span.attributes['db.rows'], 3)
+        self.assertEqual(span.attributes['db.statement.fingerprint'], 'INSERT INTO "T" ("A") VALUES (?)')
+        self.assertTrue(span.ended)
+
+    def test_execute_error(self):
+        from django.db import utils
+        cursor = use_connection(self, FailingConnection()).cursor()
+        self.assertRaises(utils.DatabaseError, cursor.execute, self.SQL, [1])
+        [span] = self.tracer.spans
+        self.assertIs(span.attributes['error'], True)
+        self.assertEqual(span.attributes['error.type'], 'ProgrammingError')
+        self.assertEqual(len(span.exceptions), 1)
+        self.assertNotIn('db.rowcount', span.attributes)
+        self.assertTrue(span.ended)
+
+    def test_no_tracer(self):
+        from django_pyodbc import base
+        tracing.set_tracer(None)
+
+        def start_span(*args):
+            self.fail("a span was started without a tracer")
+        original, base.start_span = base.start_span, start_span
+        self.addCleanup(setattr, base, 'start_span', original)
+        self.wrapper(FakeConnection).get_new_connection()
+        raw = FakeConnection()
+        raw.results['SELECT "A" FROM "T" WHERE "ID" = ?'] = [(1,)]
+        cursor = use_connection(self, raw).cursor()
+        cursor.execute(self.SQL, [1])
+        cursor.fetchall()
+        cursor.executemany('INSERT INTO "T" ("A") VALUES (%s)', [(1,)])
+        self.assertIsNone(cursor.fetch_span)
+        self.assertEqual(self.tracer.spans, [])